@@ -0,0 +1,35 @@
+"""
+scb_client - delad kod för SCB-uppslag
+
+- client: synkron HamtaForetag-klient (keep-alive, retry, hooks) som
+  alla SCB-skript går igenom
+- config: gemensam läsning av config.ini ([SCB])
+- local_register: lokal kopia av SCB:s bulk-register (SQLite + FTS5 trigram)
+  med samma svarsformat som API:ets HamtaForetag
+- api_cache: persistent cache för API-svar (SQLite, TTL, negativ cache)
+- async_client: asynkron HamtaForetag-klient (aiohttp), single-flight per fråga
+- rate_control: adaptiv takt (AIMD) som delas av alla SCB-anrop i processen
+- query_planner: frågeplanering för variantsökningar (unika frågor,
+  delsträngstäckning, svar delas ut per variant)
+- variant_stats: inlärd träffandel per variantsort (styr sökordningen)
+- run_journal: körjournal per företag, så avbrutna körningar kan återupptas
+- match_writer: buffrad skrivning av matchningar (scb_matches + scb_enrichment)
+"""
+
+from .api_cache import ResponseCache, open_response_cache
+from .async_client import AsyncSCBClient, search_all
+from .client import ApiResult, SCBClient, build_orgnr_payload, build_search_payload, open_client
+from .config import SCBConfig, load_config
+from .local_register import LocalRegister, open_local_register
+from .match_writer import MatchWriter
+from .query_planner import QueryPlanner
+from .rate_control import RateController, get_rate_controller
+from .run_journal import RunJournal, open_run_journal
+from .variant_stats import VariantStats, open_variant_stats
+
+__all__ = [
+    'ApiResult', 'AsyncSCBClient', 'LocalRegister', 'MatchWriter', 'QueryPlanner', 'RateController',
+    'ResponseCache', 'RunJournal', 'SCBClient', 'SCBConfig', 'VariantStats', 'build_orgnr_payload',
+    'build_search_payload', 'get_rate_controller', 'load_config', 'open_client', 'open_local_register',
+    'open_response_cache', 'open_run_journal', 'open_variant_stats', 'search_all',
+]
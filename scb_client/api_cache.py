@@ -0,0 +1,157 @@
+"""
+Persistent cache för SCB API-svar (HamtaForetag) i SQLite
+
+Alla SCB-skript delar samma cache-databas (standard databases/scb_api_cache.db),
+så att omkörningar, retry-pass och interaktiva sessioner inte skickar samma
+POST igen. Nyckeln är den normaliserade payloaden (operator, variabel, värde,
+status-filter, MaxRowLimit) – inte skriptets egen namn-normalisering.
+
+- Träffar med rader lever ttl_days, tomma svar (negativ cache) negative_ttl_days
+- Endast lyckade svar (HTTP 200 med en lista) sparas
+- ResponseCache.stats räknar träffar/missar för körningen, och varje rad
+  räknar hur många gånger den återanvänts
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parents[1] / 'databases' / 'scb_api_cache.db'
+DEFAULT_TTL_DAYS = 30           # Företagsdata ändras sällan
+DEFAULT_NEGATIVE_TTL_DAYS = 7   # Nya företag kan dyka upp, så tomma svar lever kortare
+
+_DAY = 24 * 60 * 60
+
+
+def _normalize_value(value):
+    """Värden jämförs skiftlägesokänsligt och med enkla blanksteg (som API:ets sökning)."""
+    return ' '.join(str(value or '').split()).casefold()
+
+
+def cache_key(payload):
+    """Normaliserad HamtaForetag-payload som JSON-sträng (samma fråga -> samma nyckel)."""
+    variables = sorted(
+        (
+            variable.get('Variabel', ''),
+            variable.get('Operator', ''),
+            _normalize_value(variable.get('Varde1')),
+            _normalize_value(variable.get('Varde2')),
+        )
+        for variable in payload.get('variabler', [])
+    )
+    query = {
+        'variabler': variables,
+        'status': str(payload.get('Företagsstatus', '')),
+        'registrering': str(payload.get('Registreringsstatus', '')),
+        'max_rows': payload.get('MaxRowLimit'),
+    }
+    return json.dumps(query, ensure_ascii=False, sort_keys=True)
+
+
+def response_key(payload):
+    """Radnyckel i cache-tabellen (hash av cache_key) – används även av körjournalen."""
+    return hashlib.blake2b(cache_key(payload).encode('utf-8'), digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-cache för API-svar. Säker att dela mellan processer (WAL)."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_days=DEFAULT_TTL_DAYS,
+                 negative_ttl_days=DEFAULT_NEGATIVE_TTL_DAYS):
+        self.path = str(path)
+        self.ttl = ttl_days * _DAY
+        self.negative_ttl = negative_ttl_days * _DAY
+        self.stats = {'hits': 0, 'negative_hits': 0, 'misses': 0, 'expired': 0, 'stores': 0}
+
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                response TEXT NOT NULL,
+                row_count INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self.conn.commit()
+
+    def get(self, payload):
+        """Cachade rader för payloaden (tom lista = negativ träff), eller None vid miss."""
+        key = response_key(payload)
+        row = self.conn.execute(
+            'SELECT response, row_count, fetched_at FROM responses WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            self.stats['misses'] += 1
+            return None
+
+        response, row_count, fetched_at = row
+        ttl = self.ttl if row_count else self.negative_ttl
+        if time.time() - fetched_at > ttl:
+            self.stats['expired'] += 1
+            self.stats['misses'] += 1
+            return None
+
+        self.conn.execute('UPDATE responses SET hits = hits + 1 WHERE key = ?', (key,))
+        self.conn.commit()
+        self.stats['hits' if row_count else 'negative_hits'] += 1
+        return json.loads(response)
+
+    def put(self, payload, rows):
+        """Spara API:ets svar (lista av dicts) för payloaden."""
+        query = cache_key(payload)
+        self.conn.execute(
+            'INSERT OR REPLACE INTO responses (key, query, response, row_count, fetched_at, hits) '
+            'VALUES (?, ?, ?, ?, ?, 0)',
+            (response_key(payload), query, json.dumps(rows, ensure_ascii=False), len(rows), time.time())
+        )
+        self.conn.commit()
+        self.stats['stores'] += 1
+
+    def purge_expired(self):
+        """Ta bort utgångna svar. Returnerar antal borttagna rader."""
+        now = time.time()
+        cursor = self.conn.execute(
+            'DELETE FROM responses WHERE (row_count > 0 AND fetched_at < ?) OR (row_count = 0 AND fetched_at < ?)',
+            (now - self.ttl, now - self.negative_ttl)
+        )
+        self.conn.commit()
+        return cursor.rowcount
+
+    def summary(self):
+        """En rad med körningens cache-statistik."""
+        s = self.stats
+        lookups = s['hits'] + s['negative_hits'] + s['misses']
+        rate = 100 * (s['hits'] + s['negative_hits']) / lookups if lookups else 0
+        return (f"API-cache: {s['hits']} träffar, {s['negative_hits']} tomma träffar, "
+                f"{s['misses']} missar ({s['expired']} utgångna), {s['stores']} sparade – "
+                f"{rate:.0f}% besvarade lokalt")
+
+    def close(self):
+        self.conn.close()
+
+
+def open_response_cache(path=None, ttl_days=DEFAULT_TTL_DAYS, negative_ttl_days=DEFAULT_NEGATIVE_TTL_DAYS):
+    """
+    Öppna cachen (path=None -> DEFAULT_CACHE_PATH). ttl_days <= 0 stänger av
+    cachen och ger None, så anropare kan skriva `if RESPONSE_CACHE is not None`.
+    """
+    if ttl_days <= 0:
+        return None
+    return ResponseCache(path or DEFAULT_CACHE_PATH, ttl_days, negative_ttl_days)
+
+
+def settings_from_config(config, section='SCB'):
+    """Cache-inställningar (kwargs till open_response_cache) från en ConfigParser."""
+    return {
+        'path': config.get(section, 'api_cache_path', fallback=None),
+        'ttl_days': config.getfloat(section, 'api_cache_ttl_days', fallback=DEFAULT_TTL_DAYS),
+        'negative_ttl_days': config.getfloat(section, 'api_cache_negative_ttl_days',
+                                             fallback=DEFAULT_NEGATIVE_TTL_DAYS),
+    }
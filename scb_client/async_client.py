@@ -0,0 +1,190 @@
+"""
+Asynkron SCB API-klient (aiohttp) med adaptiv takt
+
+Många HamtaForetag-sökningar körs samtidigt i stället för en i taget med
+sleep emellan, så en hel körning begränsas av tillåten takt (anrop/s) och
+inte av svarstiden:
+
+- Takten styrs av en RateController (scb_client.rate_control, AIMD); via
+  SCBClient.prefetch() är det samma som den synkrona klientens
+- max_in_flight: högst så många samtidiga anrop
+- Klientcertifikatet (mTLS) laddas en gång i en SSL-kontext som delas av
+  alla anslutningar (keep-alive)
+- 429: Retry-After respekteras och takten sänks direkt för resten av körningen
+- Single-flight: medan en fråga (normaliserad payload, api_cache.cache_key) är
+  på väg väntar senare sökningar på samma fråga in samma svar i stället för att
+  skicka en egen POST ("Sana" från både "Sana Labs" och "Sana AI")
+
+Kräver aiohttp (pip install aiohttp).
+"""
+
+import asyncio
+import ssl
+import time
+from dataclasses import dataclass, field, replace
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional
+
+from .api_cache import cache_key
+from .rate_control import DEFAULT_RATE, RateController
+
+API_URL = "https://privateapi.scb.se/nv0101/v1/sokpavar/api/je/HamtaForetag"
+TIMEOUT_SEC = 30
+MAX_TOTAL_RETRIES = 5
+DEFAULT_MAX_IN_FLIGHT = 4
+
+
+@dataclass
+class SearchResult:
+    ok: bool
+    data: List[dict] = field(default_factory=list)
+    status_code: int = 0
+    error: Optional[str] = None
+
+
+def load_ssl_context(cert):
+    """SSL-kontext med klientcertifikat: 'cert.pem' eller ('cert.pem', 'key.pem')."""
+    context = ssl.create_default_context()
+    if isinstance(cert, (tuple, list)):
+        context.load_cert_chain(cert[0], cert[1])
+    elif cert:
+        context.load_cert_chain(cert)
+    return context
+
+
+def parse_retry_after(value, default=1.0):
+    """Retry-After i sekunder (anges som sekunder eller HTTP-datum)."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+class AsyncSCBClient:
+    """
+    Asynkron klient för HamtaForetag. Används som async context manager:
+
+        async with AsyncSCBClient(cert, rate=2.0, max_in_flight=4) as client:
+            results = await client.search_many(payloads)
+
+    Med cache (scb_client.api_cache.ResponseCache) besvaras cachade
+    payloads utan anrop och lyckade svar sparas. Utan rate_control får
+    klienten en egen RateController som startar på `rate` anrop/s.
+    """
+
+    def __init__(self, cert, rate=DEFAULT_RATE, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                 api_url=API_URL, timeout=TIMEOUT_SEC, max_retries=MAX_TOTAL_RETRIES, cache=None,
+                 rate_control=None):
+        self.cert = cert
+        self.rate_control = rate_control or RateController(rate)
+        self.max_in_flight = max_in_flight
+        self.api_url = api_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.cache = cache
+        self.stats = {'requests': 0, 'rate_limited': 0, 'errors': 0, 'coalesced': 0}
+        self.session = None
+        self._in_flight = None
+        self._pace = None           # En väntande i taget bokar nästa anropsplats
+        self._flights: Dict[str, asyncio.Future] = {}     # cache_key -> pågående sökning
+
+    async def __aenter__(self):
+        try:
+            import aiohttp
+        except ImportError as e:
+            raise SystemExit("Saknar 'aiohttp'. Installera: pip install aiohttp") from e
+
+        self._pace = asyncio.Lock()
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        connector = aiohttp.TCPConnector(ssl=load_ssl_context(self.cert), limit=self.max_in_flight)
+        self.session = aiohttp.ClientSession(
+            connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def search(self, payload) -> SearchResult:
+        """
+        En HamtaForetag-sökning med retry. Returnerar SearchResult.
+        Pågår redan samma fråga delas dess svar (ingen ny POST).
+        """
+        key = cache_key(payload)
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(self._search(payload))
+            self._flights[key] = flight
+            flight.add_done_callback(lambda _: self._flights.pop(key, None))
+            # shield: avbryts en väntande sökning fortsätter de andras
+            return await asyncio.shield(flight)
+
+        self.stats['coalesced'] += 1
+        result = await asyncio.shield(flight)
+        return replace(result, data=list(result.data))
+
+    async def _search(self, payload) -> SearchResult:
+        import aiohttp
+
+        if self.cache is not None:
+            cached = self.cache.get(payload)
+            if cached is not None:
+                return SearchResult(True, cached, 200)
+
+        for attempt in range(self.max_retries):
+            # Platsen bokas när den är nästa på tur, så en ändrad takt gäller direkt
+            async with self._pace:
+                await asyncio.sleep(self.rate_control.reserve())
+            async with self._in_flight:
+                self.stats['requests'] += 1
+                start = time.monotonic()
+                try:
+                    async with self.session.post(self.api_url, json=payload) as resp:
+                        status = resp.status
+                        retry_after = parse_retry_after(resp.headers.get('Retry-After'))
+                        data = await resp.json(content_type=None) if status == 200 else None
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    self.stats['errors'] += 1
+                    self.rate_control.on_error()
+                    if attempt + 1 == self.max_retries:
+                        return SearchResult(False, [], 599, str(e))
+                    continue
+                elapsed = time.monotonic() - start
+
+            if status == 429:
+                self.stats['rate_limited'] += 1
+                self.rate_control.on_throttle(retry_after)
+                continue
+            if status >= 500:
+                self.stats['errors'] += 1
+                self.rate_control.on_error()
+                continue
+            if status != 200:
+                return SearchResult(False, [], status, f"HTTP {status}")
+            self.rate_control.on_success(elapsed)
+
+            # SCB returnerar direkt en lista, inte {"value": [...]}
+            rows = data if isinstance(data, list) else (data or {}).get('value', [])
+            if self.cache is not None:
+                self.cache.put(payload, rows)
+            return SearchResult(True, rows, status)
+
+        return SearchResult(False, [], 599, "Max retries exceeded")
+
+    async def search_many(self, payloads) -> List[SearchResult]:
+        """Kör alla sökningar samtidigt (inom takt/max_in_flight). Resultat i samma ordning."""
+        return await asyncio.gather(*(self.search(payload) for payload in payloads))
+
+
+def search_all(payloads, cert, rate=DEFAULT_RATE, max_in_flight=DEFAULT_MAX_IN_FLIGHT, **kwargs):
+    """Synkront skal: kör search_many() i en egen event loop. Returnerar (resultat, stats)."""
+    async def run():
+        async with AsyncSCBClient(cert, rate=rate, max_in_flight=max_in_flight, **kwargs) as client:
+            return await client.search_many(payloads), dict(client.stats, rate=client.rate_control.rate)
+    return asyncio.run(run())
@@ -0,0 +1,361 @@
+"""
+Gemensam synkron SCB API-klient (HamtaForetag)
+
+Ersätter de kopierade search_scb/scb_search_api-funktionerna i skripten:
+
+- En requests.Session med keep-alive och klientcertifikatet satt en gång,
+  så TLS-handskakningen görs bara vid ny anslutning
+- Enhetlig retry: nätverksfel och 5xx försöker igen, 429 respekterar Retry-After
+- Uppslag utan API-anrop i ordningen: processens minne, lokalt register
+  (scb_client.local_register), persistent API-cache (scb_client.api_cache)
+- Takten styrs av processens gemensamma RateController (scb_client.rate_control,
+  AIMD): den höjs medan svaren är snabba och sänks vid 429/5xx, och gäller
+  bara faktiska API-anrop
+- Hooks för instrumentering: on('request' | 'response' | 'cache_hit' | 'error', fn)
+- prefetch(): många sökningar samtidigt via scb_client.async_client; samma
+  normaliserade fråga skickas bara en gång (dubbletter i batchen och frågor
+  som redan är på väg delar svar)
+- Lokala registret har bara bulk-filens ~15 fält. Det används för att hitta
+  kandidater (namnsökning); full_record() hämtar hela API-posten på org.nr
+  innan en lokal träff sparas
+- lookup_orgnr() / prefetch_orgnrs(): exakt uppslag på org.nr (API-cache,
+  annars API:et) med fullständiga poster
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .api_cache import cache_key, response_key
+from .async_client import API_URL, parse_retry_after
+from .local_register import MAX_ROWS, is_local_record
+from .rate_control import get_rate_controller
+
+TIMEOUT_SEC = 30
+MAX_TOTAL_RETRIES = 5
+POOL_SIZE = 8
+
+HOOK_EVENTS = ('request', 'response', 'cache_hit', 'error')
+
+
+@dataclass
+class ApiResult:
+    ok: bool
+    data: List[dict] = field(default_factory=list)
+    status_code: int = 0
+    error: Optional[str] = None
+    source: str = 'api'     # api | memory | local | cache
+
+
+def build_search_payload(name, max_rows=None, active_only=True):
+    """HamtaForetag-payload för en "innehåller"-sökning på namn."""
+    payload = {
+        "Företagsstatus": "1" if active_only else "",       # Verksamma företag
+        "Registreringsstatus": "1" if active_only else "",  # Registrerade företag
+        "variabler": [
+            {
+                "Varde1": name,
+                "Varde2": "",
+                "Operator": "Innehaller",  # Innehåller namnet
+                "Variabel": "Namn"
+            }
+        ]
+    }
+    if max_rows:
+        payload["MaxRowLimit"] = max_rows
+    return payload
+
+
+def search_key(name, max_rows=None, active_only=True):
+    """API-cachens nyckel för en namnsökning (sparas i körjournalen)."""
+    return response_key(build_search_payload(name, max_rows, active_only))
+
+
+def normalize_orgnr(orgnr):
+    """Org.nr som 10 siffror utan bindestreck (sekelsiffran 16 tas bort), eller None om ogiltigt."""
+    digits = ''.join(ch for ch in str(orgnr or '') if ch.isdigit())
+    if len(digits) == 12 and digits.startswith('16'):
+        digits = digits[2:]
+    return digits if len(digits) == 10 else None
+
+
+def build_orgnr_payload(orgnr):
+    """HamtaForetag-payload för exakt uppslag på org.nr (alla statusar, så avregistrerade syns)."""
+    return {
+        "Företagsstatus": "",
+        "Registreringsstatus": "",
+        "variabler": [
+            {
+                "Varde1": orgnr,
+                "Varde2": "",
+                "Operator": "ArLikaMed",  # Exakt org.nr
+                "Variabel": "OrgNr (10 siffror)"
+            }
+        ]
+    }
+
+
+def orgnr_key(orgnr):
+    """API-cachens nyckel för ett org.nr-uppslag (sparas i körjournalen)."""
+    return response_key(build_orgnr_payload(orgnr))
+
+
+def make_session(cert=None, pool_size=POOL_SIZE):
+    """Session med keep-alive-pool och klientcertifikat ('cert.pem' eller ('cert.pem', 'key.pem'))."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.cert = cert
+    return session
+
+
+class SCBClient:
+    """Synkron HamtaForetag-klient som delas av alla SCB-skript."""
+
+    def __init__(self, cert=None, api_url=API_URL, timeout=TIMEOUT_SEC, max_retries=MAX_TOTAL_RETRIES,
+                 cache=None, local_register=None, rate_control=None):
+        self.api_url = api_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.rate_control = rate_control or get_rate_controller()
+        self.cache = cache
+        self.local_register = local_register
+        self.session = make_session(cert)
+        self.memory: Dict[str, List[dict]] = {}
+        self.hooks: Dict[str, List[Callable]] = {event: [] for event in HOOK_EVENTS}
+        self.stats = {'requests': 0, 'retries': 0, 'rate_limited': 0, 'errors': 0,
+                      'memory_hits': 0, 'local_hits': 0, 'cache_hits': 0, 'coalesced': 0}
+
+    @property
+    def cert(self):
+        return self.session.cert
+
+    @cert.setter
+    def cert(self, cert):
+        self.session.cert = cert
+
+    def on(self, event, fn):
+        """Registrera en hook. fn(**info) anropas vid varje event."""
+        self.hooks[event].append(fn)
+        return fn
+
+    def _emit(self, event, **info):
+        for fn in self.hooks[event]:
+            fn(**info)
+
+    def _remember(self, payload, rows):
+        self.memory[cache_key(payload)] = rows
+
+    def lookup(self, payload, name=None, max_rows=None, active_only=True) -> Optional[ApiResult]:
+        """Svar utan API-anrop (minne, lokalt register för namnsökningar, API-cache), eller None."""
+        key = cache_key(payload)
+        if key in self.memory:
+            self.stats['memory_hits'] += 1
+            self._emit('cache_hit', payload=payload, source='memory')
+            return ApiResult(True, self.memory[key], 200, source='memory')
+
+        # Lokalt register först (se tools/import_scb_register.py), API:et bara vid miss
+        if self.local_register is not None and name:
+            rows = self.local_register.search(name, limit=max_rows or MAX_ROWS, active_only=active_only)
+            if rows:
+                self.stats['local_hits'] += 1
+                self.memory[key] = rows
+                self._emit('cache_hit', payload=payload, source='local')
+                return ApiResult(True, rows, 200, source='local')
+
+        if self.cache is not None:
+            rows = self.cache.get(payload)
+            if rows is not None:
+                self.stats['cache_hits'] += 1
+                self.memory[key] = rows
+                self._emit('cache_hit', payload=payload, source='cache')
+                return ApiResult(True, rows, 200, source='cache')
+        return None
+
+    def post(self, payload) -> ApiResult:
+        """Skicka payloaden till API:et med retry. Takten följer rate_control. Lyckade svar cachas."""
+        for attempt in range(self.max_retries):
+            if attempt:
+                self.stats['retries'] += 1
+            time.sleep(self.rate_control.reserve())
+            self.stats['requests'] += 1
+            self._emit('request', payload=payload, attempt=attempt)
+            start = time.time()
+            try:
+                resp = self.session.post(self.api_url, json=payload, timeout=self.timeout)
+            except requests.RequestException as e:
+                self.stats['errors'] += 1
+                self._emit('error', payload=payload, error=e, attempt=attempt)
+                self.rate_control.on_error()
+                continue
+            elapsed = time.time() - start
+            self._emit('response', payload=payload, status=resp.status_code, elapsed=elapsed)
+
+            # Hantera rate limiting: takten sänks och alla anrop väntar ut Retry-After
+            if resp.status_code == 429:
+                self.stats['rate_limited'] += 1
+                self.rate_control.on_throttle(parse_retry_after(resp.headers.get("Retry-After")))
+                continue
+
+            # Hantera server errors
+            if resp.status_code >= 500:
+                self.stats['errors'] += 1
+                self.rate_control.on_error()
+                continue
+
+            if resp.status_code != 200:
+                return ApiResult(False, [], resp.status_code, f"HTTP {resp.status_code}: {resp.text[:200]}")
+
+            try:
+                data = resp.json()
+            except ValueError:
+                return ApiResult(False, [], resp.status_code, "Non-JSON response")
+
+            # SCB returnerar direkt en lista, inte {"value": [...]}
+            if isinstance(data, list):
+                rows = [row for row in data if isinstance(row, dict)]
+            elif isinstance(data, dict):
+                rows = data.get('value', [])     # Fallback om de ändrar format
+            else:
+                return ApiResult(False, [], resp.status_code, f"Unexpected format: {type(data).__name__}")
+
+            self.rate_control.on_success(elapsed)
+            self._remember(payload, rows)
+            if self.cache is not None:
+                self.cache.put(payload, rows)
+            return ApiResult(True, rows, resp.status_code)
+
+        return ApiResult(False, [], 599, "Max retries exceeded")
+
+    def search(self, name, max_rows=None, active_only=True) -> ApiResult:
+        """Namnsökning: lokalt/cachat om möjligt, annars API:et. max_rows begränsar svaret."""
+        payload = build_search_payload(name, max_rows, active_only)
+        result = self.lookup(payload, name, max_rows, active_only) or self.post(payload)
+        if max_rows and len(result.data) > max_rows:
+            result.data = result.data[:max_rows]
+        return result
+
+    def prefetch(self, names, concurrency, max_rows=None, active_only=True):
+        """
+        Hämta alla namn som inte kan besvaras lokalt samtidigt (asyncio, i
+        rate_control:s takt, högst `concurrency` samtidiga). Svaren hamnar
+        i minnet/API-cachen så att efterföljande search() inte väntar på nätet.
+        Returnerar (antal hämtade, antal misslyckade, async-statistik).
+        """
+        pending = {}
+        for name in names:
+            payload = build_search_payload(name, max_rows, active_only)
+            key = cache_key(payload)
+            if key in pending:
+                self.stats['coalesced'] += 1      # Samma normaliserade fråga som ett annat namn
+            elif self.lookup(payload, name, max_rows, active_only) is None:
+                pending[key] = payload
+        return self._fetch_all(pending, concurrency)
+
+    def lookup_orgnr(self, orgnr) -> ApiResult:
+        """
+        Exakt uppslag på org.nr: minne/API-cache om möjligt, annars API:et.
+        Går inte via det lokala registret, så svaret är alltid hela API-posten.
+        """
+        payload = build_orgnr_payload(orgnr)
+        return self.lookup(payload) or self.post(payload)
+
+    def full_record(self, record) -> ApiResult:
+        """
+        Hela API-posten för en kandidat. Träffar från det lokala registret
+        saknar de flesta fält (kommun, storleksklass, telefon ...) och hämtas
+        om på org.nr innan de sparas; API-poster returneras som de är.
+        ApiResult.data är [post], eller tom lista om org.nr inte finns i API:et.
+        """
+        if not is_local_record(record):
+            return ApiResult(True, [record], 200)
+        result = self.lookup_orgnr(record.get('OrgNr', ''))
+        if result.ok:
+            orgnr = normalize_orgnr(record.get('OrgNr', ''))
+            result.data = [row for row in result.data if normalize_orgnr(row.get('OrgNr', '')) == orgnr][:1]
+        return result
+
+    def prefetch_orgnrs(self, orgnrs, concurrency):
+        """Som prefetch() men för org.nr: alla som inte finns i minnet/API-cachen hämtas samtidigt."""
+        pending = {}
+        for orgnr in orgnrs:
+            payload = build_orgnr_payload(orgnr)
+            key = cache_key(payload)
+            if key in pending:
+                self.stats['coalesced'] += 1
+            elif self.lookup(payload) is None:
+                pending[key] = payload
+        return self._fetch_all(pending, concurrency)
+
+    def _fetch_all(self, pending, concurrency):
+        """Hämta payloads (cache-nyckel -> payload) via async-klienten och spara svaren."""
+        from .async_client import search_all
+
+        if not pending:
+            return 0, 0, {}
+
+        results, stats = search_all(
+            list(pending.values()), self.cert, max_in_flight=concurrency, rate_control=self.rate_control,
+            api_url=self.api_url, timeout=self.timeout, max_retries=self.max_retries,
+        )
+        failed = 0
+        for payload, result in zip(pending.values(), results):
+            if not result.ok:
+                failed += 1
+                continue
+            self._remember(payload, result.data)
+            if self.cache is not None:
+                self.cache.put(payload, result.data)
+        self.stats['requests'] += stats['requests']
+        self.stats['rate_limited'] += stats['rate_limited']
+        self.stats['coalesced'] += stats['coalesced']
+        return len(pending), failed, stats
+
+    def summary(self):
+        """En rad med körningens statistik."""
+        s = self.stats
+        line = (f"SCB-klient: {s['requests']} API-anrop ({s['retries']} omförsök, {s['rate_limited']} rate-limited, "
+                f"{s['errors']} fel), {s['memory_hits'] + s['local_hits'] + s['cache_hits']} svar utan anrop "
+                f"(minne {s['memory_hits']}, lokalt {s['local_hits']}, cache {s['cache_hits']})")
+        if s['coalesced']:
+            line += f", {s['coalesced']} dubblettfrågor sammanslagna"
+        if s['requests']:
+            line += f"\n{self.rate_control.summary()}"
+        if self.cache is not None:
+            line += f"\n{self.cache.summary()}"
+        return line
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+
+def open_client(config, cert=None, **kwargs):
+    """
+    SCBClient från en SCBConfig (scb_client.config): API-adress, takt, lokalt
+    register och API-cache enligt config.ini. Mot en annan api_url än SCB:s
+    (t.ex. tools/scb_stub_server.py) används API-cachen bara om
+    api_cache_path är satt – annars hamnar stubbens svar i SCB-cachen.
+    """
+    from .api_cache import open_response_cache
+    from .local_register import open_local_register
+
+    if cert is None and config.requires_cert:
+        cert = config.cert_path
+    kwargs.setdefault('api_url', config.api_url or API_URL)
+    kwargs.setdefault('rate_control', get_rate_controller(**config.rate))
+    if kwargs['api_url'] != API_URL and not config.api_cache.get('path'):
+        cache = None
+    else:
+        cache = open_response_cache(**config.api_cache)
+    return SCBClient(
+        cert=cert,
+        cache=cache,
+        local_register=open_local_register(config.register_db),
+        **kwargs,
+    )
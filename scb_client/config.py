@@ -0,0 +1,60 @@
+"""
+Gemensam läsning av config.ini ([SCB]-sektionen) för SCB-skripten
+
+Varje skript anger var config.ini kan ligga och sina egna standardvärden.
+Med base_dir tolkas relativa sökvägar från den katalogen (skriptets katalog),
+annars från arbetskatalogen som tidigare.
+"""
+
+import configparser
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from .api_cache import settings_from_config as cache_settings
+from .rate_control import settings_from_config as rate_settings
+
+
+@dataclass
+class SCBConfig:
+    db_path: Optional[str]
+    cert_path: Optional[str]
+    register_db: Optional[str] = None
+    api_cache: dict = field(default_factory=dict)
+    journal_path: Optional[str] = None      # None = databases/scb_runs.db
+    config_path: Optional[Path] = None      # None = ingen config.ini hittades
+    api_url: Optional[str] = None           # None = SCB:s API (tools/scb_stub_server.py för lokal test)
+    rate: dict = field(default_factory=dict)  # kwargs till rate_control.get_rate_controller
+
+    @property
+    def requires_cert(self):
+        """Klientcertifikat krävs mot SCB (https), inte mot en lokal stand-in över http."""
+        return not self.api_url or self.api_url.lower().startswith('https://')
+
+
+def load_config(config_paths, default_db=None, default_cert=None, base_dir=None):
+    """Läs första config.ini som finns i config_paths, med standardvärden som fallback."""
+    config = configparser.ConfigParser()
+    found = None
+    for path in config_paths:
+        if Path(path).exists():
+            config.read(path)
+            found = Path(path)
+            break
+
+    db_path = config.get('SCB', 'database_path', fallback=default_db)
+    cert_path = config.get('SCB', 'cert_path', fallback=default_cert)
+    register_db = config.get('SCB', 'register_db_path', fallback=None)
+    api_cache = cache_settings(config)
+    rate = rate_settings(config)
+    journal_path = config.get('SCB', 'run_journal_path', fallback=None)
+    api_url = config.get('SCB', 'api_url', fallback=None) or None
+
+    if base_dir is not None:
+        def resolve(path):
+            return str((Path(base_dir) / path).resolve()) if path else path
+        db_path, cert_path, register_db = resolve(db_path), resolve(cert_path), resolve(register_db)
+        journal_path = resolve(journal_path)
+        api_cache['path'] = resolve(api_cache['path'])
+
+    return SCBConfig(db_path, cert_path, register_db, api_cache, journal_path, found, api_url, rate)
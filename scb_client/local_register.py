@@ -0,0 +1,153 @@
+"""
+Lokalt SCB-register i SQLite
+
+Bulk-registret (1.8M företag) importeras med tools/import_scb_register.py till
+en egen databas med:
+- unikt index på 10-siffrigt org.nr
+- FTS5-index (trigram) på normaliserat namn -> "innehåller"-sökning som i API:et
+
+LocalRegister.search() / lookup_orgnr() returnerar API:ets
+nyckelnamn (lista av dicts med 'OrgNr', 'Företagsnamn', 'PostOrt' ...), så att
+skripten kan söka kandidater lokalt först och bara gå mot API:et vid miss.
+
+Bulk-filen har bara API_FIELDS – inte kommun, storleksklass, telefon, e-post
+med mera som en API-post har. Lokala poster märks med 'Källa' (is_local_record)
+och ska inte sparas som de är: SCBClient.full_record() hämtar hela posten
+på org.nr först.
+"""
+
+import sqlite3
+from pathlib import Path
+
+SCHEMA_VERSION = 1
+MAX_ROWS = 2000             # Samma radgräns som SCB API
+
+# Kolumner i register-tabellen (samma namn som i bulk-filen, gemener)
+REGISTER_COLUMNS = [
+    'peorgnr', 'namn', 'foretagsnamn', 'ftgstat', 'jestat', 'jurform',
+    'gatuadress', 'postnr', 'postort', 'coadress', 'regdatktid',
+    'ng1', 'ng2', 'ng3', 'ng4', 'ng5', 'reklamsparrtyp'
+]
+
+# API-nyckel -> kolumn i register-tabellen
+API_FIELDS = {
+    'OrgNr': 'orgnr',
+    'Företagsnamn': 'name',
+    'PostAdress': 'gatuadress',
+    'PostNr': 'postnr',
+    'PostOrt': 'postort',
+    'COAdress': 'coadress',
+    'Företagsstatus, kod': 'ftgstat',
+    'Juridisk form, kod': 'jurform',
+    'Registreringsdatum': 'regdatktid',
+    'Bransch_1, kod': 'ng1',
+    'Bransch_2, kod': 'ng2',
+    'Bransch_3, kod': 'ng3',
+    'Bransch_4, kod': 'ng4',
+    'Bransch_5, kod': 'ng5',
+}
+
+SOURCE_LABEL = 'SCB bulk (lokalt)'
+
+
+def normalize_name(name):
+    """Normaliserat namn för FTS-indexet: versaler, enkla blanksteg."""
+    return ' '.join((name or '').upper().split())
+
+
+def create_schema(conn):
+    """Skapa tabeller för en tom register-databas."""
+    columns = ',\n            '.join(f'{column} TEXT' for column in REGISTER_COLUMNS)
+    conn.executescript(f"""
+        CREATE TABLE register (
+            orgnr TEXT NOT NULL,
+            name TEXT NOT NULL,
+            name_norm TEXT NOT NULL,
+            {columns}
+        );
+        CREATE UNIQUE INDEX idx_register_orgnr ON register(orgnr);
+        CREATE VIRTUAL TABLE register_fts USING fts5(
+            name_norm, content='register', content_rowid='rowid', tokenize='trigram'
+        );
+        CREATE TABLE meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """)
+
+
+def rebuild_fts(conn):
+    """Bygg FTS-indexet från register-tabellen (efter bulk-insättning)."""
+    conn.execute("INSERT INTO register_fts(register_fts) VALUES ('rebuild')")
+
+
+class LocalRegister:
+    """Läsåtkomst till en importerad register-databas."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.meta = dict(self.conn.execute('SELECT key, value FROM meta'))
+
+    def __len__(self):
+        return int(self.meta.get('row_count', 0))
+
+    def search(self, name, limit=MAX_ROWS, active_only=True):
+        """
+        Företag vars namn innehåller söktermen (som API:ets Operator "Innehaller").
+        Termer med minst 3 tecken går via trigram-indexet, kortare via LIKE.
+        """
+        term = normalize_name(name)
+        if not term:
+            return []
+        status = " AND r.ftgstat = '1'" if active_only else ''
+
+        if len(term) >= 3:
+            phrase = '"' + term.replace('"', '""') + '"'
+            rows = self.conn.execute(f"""
+                SELECT r.* FROM register_fts f
+                JOIN register r ON r.rowid = f.rowid
+                WHERE register_fts MATCH ?{status}
+                LIMIT ?
+            """, (phrase, limit))
+        else:
+            pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            rows = self.conn.execute(f"""
+                SELECT r.* FROM register r
+                WHERE r.name_norm LIKE ? ESCAPE '\\'{status}
+                LIMIT ?
+            """, (pattern, limit))
+        return [to_api_record(row) for row in rows]
+
+    def lookup_orgnr(self, orgnr):
+        """Företaget med ett org.nr (10 siffror, bindestreck tillåtet) som en lista med 0-1 träffar."""
+        orgnr = (orgnr or '').replace('-', '').strip()
+        row = self.conn.execute('SELECT * FROM register WHERE orgnr = ?', (orgnr,)).fetchone()
+        return [to_api_record(row)] if row else []
+
+    def close(self):
+        self.conn.close()
+
+
+def to_api_record(row):
+    """En register-rad i samma form som ett resultat från SCB API:et."""
+    record = {key: row[column] or '' for key, column in API_FIELDS.items()}
+    record['Källa'] = SOURCE_LABEL
+    return record
+
+
+def is_local_record(record):
+    """True för en post från det lokala registret (ofullständig jämfört med API:et)."""
+    return record.get('Källa') == SOURCE_LABEL
+
+
+def open_local_register(path):
+    """LocalRegister om databasen finns, annars None (skripten faller då tillbaka på API:et)."""
+    if not path:
+        return None
+    path = Path(path).expanduser()
+    if not path.exists():
+        print(f"⚠️  Lokalt SCB-register saknas: {path} (använder SCB API)")
+        return None
+    return LocalRegister(path)
@@ -0,0 +1,228 @@
+"""
+Buffrad skrivning av SCB-matchningar (scb_matches + scb_enrichment)
+
+Tidigare öppnade save_scb_match() en ny SQLite-anslutning per företag,
+körde CREATE TABLE, SELECT och INSERT och committade – en fsync per match.
+MatchWriter håller en anslutning i WAL-läge, buffrar matchningarna och
+skriver dem i en transaktion per batch:
+
+- scb_matches: upsert per company_id (en rad per företag)
+- scb_enrichment: SCB-fälten utplattade i samma transaktion (samma kolumner
+  som fas1_snabba_vinster.py byggde i efterhand); en befintlig rad för
+  företaget uppdateras på plats, annars id = scb_matches.id om det är ledigt
+- companies.location_city sätts från PostOrt om den saknas
+- refresh(): ny SCB-data för ett redan matchat företag (batch_scb_by_orgnr.py
+  --orgnr); score behålls och fält som saknas i det nya svaret (t.ex. från det
+  lokala registret) behåller sina tidigare värden
+
+Buffern töms var batch_size:e match eller efter max_delay sekunder, och
+alltid i flush()/close() (även vid avbrott, se with-blocket). on_written
+anropas först när matchningens transaktion är committad – skriptens
+körjournal markerar ett företag som klart där, så en krasch med matchningar
+kvar i buffern gör dem om vid --resume i stället för att tappa dem.
+"""
+
+import json
+import sqlite3
+import time
+
+BATCH_SIZE = 50
+MAX_DELAY_SEC = 5.0
+
+# scb_enrichment-kolumn -> fält i SCB:s svar
+ENRICHMENT_FIELDS = {
+    'organization_number': 'OrgNr',
+    'scb_company_name': 'Företagsnamn',
+    'co_address': 'COAdress',
+    'post_address': 'PostAdress',
+    'post_code': 'PostNr',
+    'post_city': 'PostOrt',
+    'municipality_code': 'Säteskommun, kod',
+    'municipality': 'Säteskommun',
+    'county_code': 'Säteslän, kod',
+    'county': 'Säteslän',
+    'num_workplaces': 'Antal arbetsställen',
+    'employee_size_code': 'Stkl, kod',
+    'employee_size': 'Storleksklass',
+    'company_status_code': 'Företagsstatus, kod',
+    'company_status': 'Företagsstatus',
+    'legal_form_code': 'Juridisk form, kod',
+    'legal_form': 'Juridisk form',
+    'start_date': 'Startdatum',
+    'registration_date': 'Registreringsdatum',
+    'industry_1_code': 'Bransch_1, kod',
+    'industry_1': 'Bransch_1',
+    'industry_2_code': 'Bransch_2, kod',
+    'industry_2': 'Bransch_2',
+    'revenue_year': 'Omsättning, år',
+    'revenue_size_code': 'Stkl, oms, kod',
+    'revenue_size': 'Storleksklass, oms',
+    'phone': 'Telefon',
+    'email': 'E-post',
+    'employer_status_code': 'Arbetsgivarstatus, kod',
+    'employer_status': 'Arbetsgivarstatus',
+    'vat_status_code': 'Momsstatus, kod',
+    'vat_status': 'Momsstatus',
+    'export_import': 'Export/Importmarkering',
+}
+
+_CREATE_MATCHES = """
+    CREATE TABLE IF NOT EXISTS scb_matches (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        company_id INTEGER NOT NULL,
+        matched INTEGER NOT NULL,
+        score INTEGER,
+        city TEXT,
+        payload TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+_CREATE_ENRICHMENT = f"""
+    CREATE TABLE IF NOT EXISTS scb_enrichment (
+        id INTEGER PRIMARY KEY,
+        company_id INTEGER NOT NULL,
+        {', '.join(f'{column} TEXT' for column in ENRICHMENT_FIELDS)},
+        FOREIGN KEY (company_id) REFERENCES companies(id)
+    )
+"""
+
+
+def enrichment_row(scb_data):
+    """SCB-svaret utplattat till scb_enrichment-kolumner (tomma strängar blir NULL)."""
+    row = {}
+    for column, key in ENRICHMENT_FIELDS.items():
+        value = scb_data.get(key)
+        if isinstance(value, str):
+            value = value.strip() or None
+        row[column] = value
+    return row
+
+
+class MatchWriter:
+    """
+    En anslutning, buffrade upserts. Används helst som context manager:
+
+        with MatchWriter(db_path) as writer:
+            writer.add(company_id, True, score, scb_data)
+    """
+
+    def __init__(self, db_path, batch_size=BATCH_SIZE, max_delay=MAX_DELAY_SEC):
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.pending = []
+        self.last_flush = time.monotonic()
+        self.stats = {'written': 0, 'batches': 0}
+
+        self.conn = sqlite3.connect(str(db_path), timeout=30)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        with self.conn:
+            self.conn.execute(_CREATE_MATCHES)
+            self.conn.execute(_CREATE_ENRICHMENT)
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_scb_matches_company_id ON scb_matches(company_id)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_scb_enrichment_company_id ON scb_enrichment(company_id)')
+
+    def add(self, company_id, matched, score, scb_data, on_written=None):
+        """
+        Buffra en matchning. Skrivs vid full batch eller efter max_delay sekunder;
+        on_written() anropas när den är committad.
+        """
+        self.pending.append((company_id, bool(matched), None if score is None else int(score), scb_data, on_written))
+        if len(self.pending) >= self.batch_size or time.monotonic() - self.last_flush >= self.max_delay:
+            self.flush()
+
+    def refresh(self, company_id, scb_data, on_written=None):
+        """Buffra ny SCB-data för ett matchat företag (score och saknade fält behålls)."""
+        self.add(company_id, True, None, scb_data, on_written)
+
+    def flush(self):
+        """Skriv alla buffrade matchningar i en transaktion, sedan deras on_written()."""
+        if self.pending:
+            with self.conn:
+                for company_id, matched, score, scb_data, _ in self.pending:
+                    self._upsert(company_id, matched, score, scb_data)
+            callbacks = [on_written for *_, on_written in self.pending if on_written is not None]
+            self.stats['written'] += len(self.pending)
+            self.stats['batches'] += 1
+            self.pending = []
+            for on_written in callbacks:
+                on_written()
+        self.last_flush = time.monotonic()
+
+    def _upsert(self, company_id, matched, score, scb_data):
+        if score is None:
+            # refresh(): fält som inte finns i det nya svaret behåller sina tidigare värden
+            scb_data = {**self._previous_data(company_id), **scb_data}
+        city = scb_data.get('PostOrt') or None
+        payload = json.dumps(scb_data, ensure_ascii=False)
+        cur = self.conn.execute(
+            'UPDATE scb_matches SET matched = ?, score = COALESCE(?, score), city = ?, payload = ?, '
+            'created_at = CURRENT_TIMESTAMP '
+            'WHERE company_id = ?',
+            (int(matched), score, city, payload, company_id)
+        )
+        if cur.rowcount:
+            match_id = self.conn.execute(
+                'SELECT MIN(id) FROM scb_matches WHERE company_id = ?', (company_id,)
+            ).fetchone()[0]
+        else:
+            match_id = self.conn.execute(
+                'INSERT INTO scb_matches (company_id, matched, score, city, payload) VALUES (?, ?, ?, ?, ?)',
+                (company_id, int(matched), score, city, payload)
+            ).lastrowid
+
+        if not matched:
+            return
+        row = enrichment_row(scb_data)
+        enrichment_id = self.conn.execute(
+            'SELECT MIN(id) FROM scb_enrichment WHERE company_id = ?', (company_id,)
+        ).fetchone()[0]
+        if enrichment_id is not None:
+            # Befintlig rad uppdateras på plats (manuellt importerade rader har egna id:n)
+            self.conn.execute('DELETE FROM scb_enrichment WHERE company_id = ? AND id != ?', (company_id, enrichment_id))
+            self.conn.execute(
+                f"UPDATE scb_enrichment SET {', '.join(f'{column} = ?' for column in row)} WHERE id = ?",
+                (*row.values(), enrichment_id)
+            )
+        else:
+            taken = self.conn.execute('SELECT 1 FROM scb_enrichment WHERE id = ?', (match_id,)).fetchone()
+            self.conn.execute(
+                f"INSERT INTO scb_enrichment (id, company_id, {', '.join(row)}) "
+                f"VALUES (?, ?, {', '.join('?' * len(row))})",
+                (None if taken else match_id, company_id, *row.values())
+            )
+        if row['post_city']:
+            self.conn.execute(
+                "UPDATE companies SET location_city = ? "
+                "WHERE id = ? AND (location_city IS NULL OR TRIM(location_city) = '')",
+                (row['post_city'], company_id)
+            )
+
+    def _previous_data(self, company_id):
+        """Företagets nuvarande SCB-data: scb_enrichment-raden, överlagrad med scb_matches.payload."""
+        previous = {}
+        cur = self.conn.execute('SELECT * FROM scb_enrichment WHERE company_id = ? ORDER BY id LIMIT 1', (company_id,))
+        row = cur.fetchone()
+        if row:
+            columns = [d[0] for d in cur.description]
+            previous.update((ENRICHMENT_FIELDS[column], value) for column, value in zip(columns, row)
+                            if column in ENRICHMENT_FIELDS and value not in (None, ''))
+        row = self.conn.execute(
+            'SELECT payload FROM scb_matches WHERE company_id = ? ORDER BY id LIMIT 1', (company_id,)
+        ).fetchone()
+        try:
+            previous.update(json.loads(row[0]) if row and row[0] else {})
+        except ValueError:
+            pass
+        return previous
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
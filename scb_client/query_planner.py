@@ -0,0 +1,157 @@
+"""
+Frågeplanering för variantsökningar mot SCB (HamtaForetag, Operator "Innehaller")
+
+Retry-skripten söker varje företag med många namnvarianter ("X", "X AB",
+"X Aktiebolag", första ordet ...). Samma variant förekommer ofta hos flera
+företag, och eftersom "Innehaller" är en delsträngssökning innehåller svaret
+på "X" redan allt som "X AB" skulle ge.
+
+QueryPlanner samlar alla varianter för hela körningen och:
+- slår ihop varianter som är lika efter normalisering (skiftläge, blanksteg)
+- ställer bara "rot"-frågor: en variant som innehåller en annan rot som
+  delsträng härleds genom att filtrera rotens svar lokalt
+- om en rots svar är ofullständigt (radgränsen nådd) eller misslyckades
+  ställs de varianter den täckte själva i nästa runda
+- misslyckade svar (API-fel) sparas inte, så samma fråga kan ställas igen
+  av en senare variant eller ett senare företag
+
+Varje unik fråga ställs alltså högst en gång, och svaren delas ut till
+alla företag som behöver dem via get(). resolve() gör samma sak för en
+variant i taget (när varianterna prövas tills en match hittas): svaret
+härleds ur en redan hämtad bredare fråga om det går, annars söks varianten.
+"""
+
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .client import ApiResult
+from .local_register import MAX_ROWS
+
+MIN_COVER_LENGTH = 3        # Kortare rötter ger nästan alltid för många träffar
+
+
+def query_key(value):
+    """Normaliserad söksträng (samma normalisering som API-cachen)."""
+    return ' '.join(str(value or '').split()).casefold()
+
+
+def derive_rows(rows, key, field='Företagsnamn'):
+    """Rader ur en bredare sökning vars namn innehåller söksträngen `key`."""
+    return [row for row in rows if key in query_key(row.get(field, ''))]
+
+
+class QueryPlanner:
+    """
+    Planera och kör variantsökningar för en hel batch.
+
+        planner = QueryPlanner(alla_varianter)
+        planner.execute(search)      # search(namn) -> ApiResult
+        planner.get("X AB")          # ApiResult för varianten
+    """
+
+    def __init__(self, variants: Iterable[str], row_limit=MAX_ROWS, min_cover_length=MIN_COVER_LENGTH):
+        self.row_limit = row_limit
+        self.min_cover_length = min_cover_length
+        self.queries: Dict[str, str] = {}       # nyckel -> första stavningen
+        requested = 0
+        for variant in variants:
+            requested += 1
+            key = query_key(variant)
+            if key:
+                self.queries.setdefault(key, variant)
+        self.results: Dict[str, ApiResult] = {}
+        self.covers = set()     # Hämtade rötter med fullständigt svar
+        self.stats = {'requested': requested, 'unique': len(self.queries),
+                      'issued': 0, 'derived': 0, 'failed': 0, 'rounds': 0}
+
+    def plan(self, keys: Iterable[str], blocked=frozenset()) -> Dict[str, Optional[str]]:
+        """
+        Nyckel -> täckande rot (None = nyckeln är själv en rot). Kortast först,
+        så varje rot är den kortaste frågan i sin delsträngskedja. Rötter i
+        `blocked` (ofullständiga svar) får inte täcka andra frågor.
+        """
+        roots = set()
+        cover: Dict[str, Optional[str]] = {}
+        for key in sorted(keys, key=lambda k: (len(k), k)):
+            cover[key] = self._find_cover(key, roots)
+            if cover[key] is None and key not in blocked:
+                roots.add(key)
+        return cover
+
+    def _find_cover(self, key, roots):
+        """Längsta rot som är en delsträng av key (minst tätt filtrerad kandidatmängd)."""
+        n = len(key)
+        for length in range(n - 1, self.min_cover_length - 1, -1):
+            for start in range(n - length + 1):
+                if key[start:start + length] in roots:
+                    return key[start:start + length]
+        return None
+
+    def execute(self, search: Callable[[str], ApiResult],
+                prefetch: Optional[Callable[[List[str]], None]] = None) -> Dict[str, ApiResult]:
+        """
+        Kör planen i rundor tills alla varianter har ett svar. search() anropas
+        en gång per rot; prefetch(namn) (valfri) får varje rundas rötter i förväg.
+        """
+        pending = set(self.queries) - set(self.results)
+        blocked = set()
+        while pending:
+            self.stats['rounds'] += 1
+            cover = self.plan(pending, blocked)
+            roots = [key for key in cover if cover[key] is None]
+            if prefetch is not None:
+                prefetch([self.queries[key] for key in roots])
+            for key in roots:
+                self._search(key, search)
+                if key not in self.covers:
+                    blocked.add(key)
+                pending.discard(key)
+
+            for key, root in cover.items():
+                if root is None or root in blocked:
+                    continue
+                rows = derive_rows(self.results[root].data, key)
+                self.results[key] = ApiResult(True, rows, 200, source='plan')
+                self.stats['derived'] += 1
+                pending.discard(key)
+        return self.results
+
+    def _search(self, key, search):
+        """
+        Sök nyckeln. Lyckade svar sparas (fullständiga blir rötter som kan
+        täcka andra frågor); misslyckade sparas inte utan kan sökas igen.
+        """
+        result = search(self.queries[key])
+        self.stats['issued'] += 1
+        if not result.ok:
+            self.stats['failed'] += 1
+            return result
+        self.results[key] = result
+        if len(result.data) < self.row_limit:
+            self.covers.add(key)
+        return result
+
+    def resolve(self, variant, search: Callable[[str], ApiResult]) -> ApiResult:
+        """Svaret för en variant: redan hämtat, härlett ur en hämtad rot, eller sökt nu."""
+        key = query_key(variant)
+        if key not in self.queries:
+            self.queries[key] = variant
+            self.stats['requested'] += 1
+            self.stats['unique'] += 1
+        if key not in self.results:
+            root = self._find_cover(key, self.covers)
+            if root is not None:
+                self.results[key] = ApiResult(True, derive_rows(self.results[root].data, key), 200, source='plan')
+                self.stats['derived'] += 1
+            else:
+                return self._search(key, search)
+        return self.results[key]
+
+    def get(self, variant) -> Optional[ApiResult]:
+        """Svaret för en variant (efter execute()), None om sökningen misslyckades."""
+        return self.results.get(query_key(variant))
+
+    def summary(self):
+        s = self.stats
+        return (f"Frågeplan: {s['requested']} varianter → {s['unique']} unika → "
+                f"{s['issued']} sökningar ({s['derived']} härledda lokalt, {s['failed']} misslyckade, "
+                f"{s['rounds']} rundor)")
@@ -0,0 +1,126 @@
+"""
+Adaptiv takt (AIMD) för alla SCB-anrop i processen
+
+Tidigare hade varje skript en fast RATE_LIMIT_DELAY = 0.5 och backoffen
+växte bara inom ett anrop – nästa företag började om från 0.5 s. Nu delar
+den synkrona klienten (scb_client.client) och async-klienten
+(scb_client.async_client) en RateController per process:
+
+- Additiv ökning: snabba lyckade svar höjer takten med `increase` anrop/s per
+  sekund (ungefär), upp till max_rate
+- Multiplikativ sänkning: 429, 5xx och nätverksfel multiplicerar takten med
+  `decrease`, ned till min_rate
+- Retry-After: alla anrop pausas tills tiden gått ut
+- Långsamma svar (över slow_latency sekunder) håller takten oförändrad
+- history: (tidpunkt, takt, händelse) – skrivs till körjournalen (tabell
+  rate_samples, RunJournal.record_rates) och sammanfattas i summary()
+
+Inställningar i config.ini: api_rate, api_min_rate, api_max_rate.
+"""
+
+import threading
+import time
+
+DEFAULT_RATE = 2.0          # Anrop/s vid start (motsvarar tidigare 0.5 s mellan anrop)
+MIN_RATE = 0.1              # Lägsta takt efter upprepade 429
+MAX_RATE = 2.0              # SCB:s rekommenderade tak (ca 2 anrop/s); höj bara uttryckligen med api_max_rate
+INCREASE = 0.25             # Anrop/s per sekund med lyckade svar
+DECREASE = 0.5              # Faktor vid 429/5xx/nätverksfel
+SLOW_LATENCY_SEC = 2.0      # Svar långsammare än så höjer inte takten
+SAMPLE_STEP = 0.1           # Ökningar loggas i history först när takten ändrats 10 %
+
+
+class RateController:
+    """Trådsäker AIMD-takt. reserve() ger väntetiden före nästa anrop."""
+
+    def __init__(self, rate=DEFAULT_RATE, min_rate=MIN_RATE, max_rate=MAX_RATE,
+                 increase=INCREASE, decrease=DECREASE, slow_latency=SLOW_LATENCY_SEC):
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, min_rate)
+        self.rate = min(max(rate, self.min_rate), self.max_rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.slow_latency = slow_latency
+        self.next_slot = 0.0            # monotonic: tidigaste start för nästa anrop
+        self.history = [(time.time(), self.rate, 'start')]
+        self.stats = {'increases': 0, 'decreases': 0, 'retry_after_sec': 0.0}
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate, event='set'):
+        """Sätt takten direkt (t.ex. --rate vid start)."""
+        with self._lock:
+            self.rate = min(max(rate, self.min_rate), self.max_rate)
+            self._sample(event)
+
+    def reserve(self):
+        """Boka nästa anropsplats. Returnerar hur många sekunder anroparen ska vänta."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self.next_slot)
+            self.next_slot = start + 1 / self.rate
+            return start - now
+
+    def on_success(self, latency):
+        """Lyckat svar: additiv ökning om svaret var snabbt."""
+        if latency > self.slow_latency:
+            return
+        with self._lock:
+            if self.rate >= self.max_rate:
+                return
+            # +increase per sekund: varje svar står för 1/rate sekunder
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+            self.stats['increases'] += 1
+            if abs(self.rate - self.history[-1][1]) >= SAMPLE_STEP * self.history[-1][1] or self.rate == self.max_rate:
+                self._sample('increase')
+
+    def on_throttle(self, retry_after=0.0):
+        """429: sänk takten och pausa alla anrop i retry_after sekunder."""
+        with self._lock:
+            self._decrease('429')
+            self.stats['retry_after_sec'] += retry_after
+            self.next_slot = max(self.next_slot, time.monotonic() + retry_after)
+
+    def on_error(self):
+        """5xx eller nätverksfel: sänk takten (nästa anrop väntar en hel ny period)."""
+        with self._lock:
+            self._decrease('error')
+            self.next_slot = max(self.next_slot, time.monotonic() + 1 / self.rate)
+
+    def _decrease(self, event):
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self.stats['decreases'] += 1
+        self._sample(event)
+
+    def _sample(self, event):
+        self.history.append((time.time(), round(self.rate, 3), event))
+
+    def summary(self):
+        """En rad: takt nu, spann och antal sänkningar."""
+        rates = [rate for _, rate, _ in self.history] + [self.rate]
+        return (f"Takt: {self.rate:.2f} anrop/s (start {rates[0]:g}, min {min(rates):.2f}, max {max(rates):.2f}), "
+                f"{self.stats['decreases']} sänkningar, {self.stats['retry_after_sec']:.1f}s Retry-After")
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_rate_controller(**settings):
+    """
+    Processens gemensamma RateController. Skapas vid första anropet med
+    `settings` (rate, min_rate, max_rate ...); senare anrop får samma objekt.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = RateController(**{key: value for key, value in settings.items() if value is not None})
+        return _shared
+
+
+def settings_from_config(config, section='SCB'):
+    """Takt-inställningar (kwargs till get_rate_controller) från en ConfigParser."""
+    return {
+        'rate': config.getfloat(section, 'api_rate', fallback=DEFAULT_RATE),
+        'min_rate': config.getfloat(section, 'api_min_rate', fallback=MIN_RATE),
+        'max_rate': config.getfloat(section, 'api_max_rate', fallback=MAX_RATE),
+    }
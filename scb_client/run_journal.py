@@ -0,0 +1,174 @@
+"""
+Körjournal för SCB-berikning i SQLite (avbrutna körningar kan återupptas)
+
+scb_integration_v2.py, retry_scb_search.py och batch_scb_by_orgnr.py skriver
+varje behandlat företag till journalen direkt: id, utfall, nyckeln till
+API-svaret i cachen (scb_client.api_cache.response_key) och raden som ska
+hamna i resultat-CSV:n. Avbryts en körning (nätverksfel, Ctrl-C) fortsätter
+`--resume <run-id>` där den slutade, och CSV:erna byggs om från journalen så
+att de innehåller hela körningen.
+
+- Standardfil databases/scb_runs.db (run_journal_path i config.ini)
+- Körnings-id: skript + tidsstämpel + slumpsuffix (parallella starter krockar inte)
+- resume() med match_keys vägrar återuppta med andra argument (indata,
+  min-score ...) än körningen startades med
+- Utfall i RETRY_OUTCOMES (API-fel) räknas inte som klara och görs om vid resume
+- rate_samples: API-taktens förlopp under körningen (scb_client.rate_control)
+"""
+
+import json
+import secrets
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+
+DEFAULT_JOURNAL_PATH = Path(__file__).resolve().parents[1] / 'databases' / 'scb_runs.db'
+RETRY_OUTCOMES = ('api_error',)
+
+
+class RunJournal:
+    """En körning i journalen. Skapas med start() eller resume()."""
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH):
+        self.path = str(path)
+        self.run_id = None
+        self.args = {}
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                script TEXT NOT NULL,
+                args TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                finished_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id TEXT NOT NULL,
+                item_key TEXT NOT NULL,
+                outcome TEXT NOT NULL,
+                cache_key TEXT,
+                record TEXT,
+                updated_at REAL NOT NULL,
+                UNIQUE (run_id, item_key)
+            );
+            CREATE TABLE IF NOT EXISTS rate_samples (
+                run_id TEXT NOT NULL,
+                at REAL NOT NULL,
+                rate REAL NOT NULL,
+                event TEXT NOT NULL
+            );
+        """)
+        self.conn.commit()
+
+    def start(self, script, args):
+        """Ny körning. Returnerar körnings-id (skript + tidsstämpel + slumpsuffix)."""
+        self.run_id = f"{script}-{datetime.now().strftime('%Y%m%d_%H%M%S')}-{secrets.token_hex(3)}"
+        self.args = dict(args)
+        self.conn.execute(
+            'INSERT INTO runs (run_id, script, args, started_at) VALUES (?, ?, ?, ?)',
+            (self.run_id, script, json.dumps(self.args, ensure_ascii=False, default=str), time.time())
+        )
+        self.conn.commit()
+        return self.run_id
+
+    def resume(self, run_id, script, args=None, match_keys=()):
+        """
+        Återuppta en tidigare körning av samma skript. ValueError om den inte
+        finns, eller om args skiljer sig från körningens sparade argument i
+        någon av match_keys (annars blandas resultat från olika indata).
+        """
+        row = self.conn.execute('SELECT script, args FROM runs WHERE run_id = ?', (run_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"Körningen '{run_id}' finns inte i {self.path}")
+        if row[0] != script:
+            raise ValueError(f"Körningen '{run_id}' gjordes av {row[0]}, inte {script}")
+        stored = json.loads(row[1])
+        if args is not None:
+            mismatched = [key for key in match_keys if stored.get(key) != args.get(key)]
+            if mismatched:
+                details = ', '.join(f"{key}={stored.get(key)!r} (nu {args.get(key)!r})" for key in mismatched)
+                raise ValueError(f"Körningen '{run_id}' startades med andra argument: {details}. "
+                                 f"Kör --resume med samma argument, eller starta en ny körning.")
+        self.run_id = run_id
+        self.args = stored
+        self.conn.execute('UPDATE runs SET finished_at = NULL WHERE run_id = ?', (run_id,))
+        self.conn.commit()
+        return self.run_id
+
+    def completed(self):
+        """Nycklar som redan är klara i körningen (API-fel räknas inte)."""
+        placeholders = ', '.join('?' * len(RETRY_OUTCOMES))
+        rows = self.conn.execute(
+            f'SELECT item_key FROM entries WHERE run_id = ? AND outcome NOT IN ({placeholders})',
+            (self.run_id, *RETRY_OUTCOMES)
+        )
+        return {item_key for item_key, in rows}
+
+    def record(self, item_key, outcome, cache_key=None, record=None):
+        """Skriv (eller skriv över) utfallet för ett företag. Committas direkt."""
+        self.conn.execute(
+            'INSERT INTO entries (run_id, item_key, outcome, cache_key, record, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT(run_id, item_key) DO UPDATE SET outcome = excluded.outcome, '
+            'cache_key = excluded.cache_key, record = excluded.record, updated_at = excluded.updated_at',
+            (self.run_id, str(item_key), outcome, cache_key,
+             json.dumps(record, ensure_ascii=False, default=str) if record is not None else None, time.time())
+        )
+        self.conn.commit()
+
+    def entries(self, outcomes=None):
+        """Körningens poster i behandlingsordning: dicts med item_key, outcome, cache_key, record."""
+        rows = self.conn.execute(
+            'SELECT item_key, outcome, cache_key, record FROM entries WHERE run_id = ? ORDER BY seq',
+            (self.run_id,)
+        )
+        return [
+            {'item_key': item_key, 'outcome': outcome, 'cache_key': cache_key,
+             'record': json.loads(record) if record else None}
+            for item_key, outcome, cache_key, record in rows
+            if outcomes is None or outcome in outcomes
+        ]
+
+    def counts(self):
+        """Antal poster per utfall."""
+        rows = self.conn.execute(
+            'SELECT outcome, COUNT(*) FROM entries WHERE run_id = ? GROUP BY outcome', (self.run_id,)
+        )
+        return dict(rows.fetchall())
+
+    def record_rates(self, history):
+        """Spara taktens förlopp (RateController.history: tidpunkt, takt, händelse) för körningen."""
+        self.conn.executemany(
+            'INSERT INTO rate_samples (run_id, at, rate, event) VALUES (?, ?, ?, ?)',
+            [(self.run_id, at, rate, event) for at, rate, event in history]
+        )
+        self.conn.commit()
+
+    def finish(self):
+        self.conn.execute('UPDATE runs SET finished_at = ? WHERE run_id = ?', (time.time(), self.run_id))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def open_run_journal(script, args, resume=None, path=None, match_keys=()):
+    """
+    Starta en ny körning, eller återuppta `resume` (körnings-id). match_keys:
+    argument som måste vara samma som när körningen startades.
+    """
+    journal = RunJournal(path or DEFAULT_JOURNAL_PATH)
+    if resume:
+        try:
+            journal.resume(resume, script, args, match_keys)
+        except ValueError:
+            journal.close()
+            raise
+    else:
+        journal.start(script, args)
+    return journal
@@ -0,0 +1,118 @@
+"""
+Träffstatistik per variantsort för SCB-variantsökningar
+
+Retry-skripten prövar namnvarianter ("X AB", "X Aktiebolag", första ordet,
+utan bindestreck ...) tills en kandidat når tröskeln. Vilka sorters varianter
+som faktiskt ger matchningar lärs in över körningar och sparas i samma
+SQLite-fil som API-cachen (tabell variant_stats), så nästa körning prövar
+de mest lönsamma varianterna först och API-budgeten räcker längre.
+
+- variant_kind(namn, variant): vilken sorts variant det är
+- VariantStats.order(namn, varianter): varianterna sorterade efter
+  träffandel (hits + 1) / (tries + 2); lika träffandel behåller
+  ursprungsordningen, så originalnamnet prövas först tills annat är inlärt
+- VariantStats.record(sort, träff): uppdatera statistiken efter en sökning
+"""
+
+import re
+import sqlite3
+import time
+from pathlib import Path
+
+from .api_cache import DEFAULT_CACHE_PATH
+from .query_planner import query_key
+
+_COMPANY_FORM = re.compile(r'\s+(ab|aktiebolag|\(publ\))$')
+_DOMAIN = re.compile(r'\.(com|se|io|ai|org|net)\b')
+
+
+def _strip_form(value):
+    stripped = _COMPANY_FORM.sub('', value).strip()
+    return stripped if stripped == value else _strip_form(stripped)
+
+
+def variant_kind(name, variant, correct_scb_name=None):
+    """Variantens sort i förhållande till originalnamnet (se retry_no_candidates.generate_search_variants)."""
+    n, v = query_key(name), query_key(variant)
+    if v == n:
+        return 'original'
+    if correct_scb_name and v == query_key(correct_scb_name):
+        return 'korrekt_namn'
+    base_n, base_v = _strip_form(n), _strip_form(v)
+    if base_v == base_n:
+        return 'utan_bolagsform' if v == base_v else 'med_bolagsform'
+
+    words = base_n.split()
+    if len(words) >= 2 and base_v == words[0]:
+        return 'forsta_ordet'
+    if '-' in base_n and base_v in (base_n.replace('-', ' '), base_n.replace('-', '')):
+        return 'utan_bindestreck'
+    if '(' in base_n and base_v == ' '.join(re.sub(r'\([^)]*\)', ' ', base_n).split()):
+        return 'utan_parentes'
+    if _DOMAIN.search(base_n) and not _DOMAIN.search(base_v):
+        return 'utan_doman'
+    if variant.isupper() and ' ' not in base_v and len(base_v) <= 6:
+        return 'akronym'
+    if base_v == ' '.join(re.sub(r'[^\w\s]', ' ', base_n).split()):
+        return 'rensad'
+    return 'ovrig'
+
+
+class VariantStats:
+    """Träffstatistik per variantsort (tabell variant_stats bredvid API-cachens svar)."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS variant_stats (
+                kind TEXT PRIMARY KEY,
+                tries INTEGER NOT NULL DEFAULT 0,
+                hits INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+        self.counts = {kind: (tries, hits) for kind, tries, hits in
+                       self.conn.execute('SELECT kind, tries, hits FROM variant_stats')}
+
+    def hit_rate(self, kind):
+        """Utjämnad träffandel (okända sorter får 0.5)."""
+        tries, hits = self.counts.get(kind, (0, 0))
+        return (hits + 1) / (tries + 2)
+
+    def order(self, name, variants, correct_scb_name=None):
+        """Varianterna i den ordning de bör prövas (högst träffandel först)."""
+        rates = [self.hit_rate(variant_kind(name, variant, correct_scb_name)) for variant in variants]
+        ranked = sorted(range(len(variants)), key=lambda i: -rates[i])
+        return [variants[i] for i in ranked]
+
+    def record(self, kind, hit):
+        """Räkna en sökning av sorten `kind` (hit = gav en kandidat över tröskeln)."""
+        tries, hits = self.counts.get(kind, (0, 0))
+        self.counts[kind] = (tries + 1, hits + int(bool(hit)))
+        self.conn.execute(
+            'INSERT INTO variant_stats (kind, tries, hits, updated_at) VALUES (?, 1, ?, ?) '
+            'ON CONFLICT(kind) DO UPDATE SET tries = tries + 1, hits = hits + excluded.hits, '
+            'updated_at = excluded.updated_at',
+            (kind, int(bool(hit)), time.time())
+        )
+        self.conn.commit()
+
+    def summary(self):
+        """En rad per sort, högst träffandel först."""
+        kinds = sorted(self.counts, key=lambda kind: -self.hit_rate(kind))
+        return '\n'.join(f"  {kind:<18} {self.counts[kind][1]:>5}/{self.counts[kind][0]:<5} "
+                         f"({100 * self.hit_rate(kind):.0f}%)" for kind in kinds)
+
+    def close(self):
+        self.conn.close()
+
+
+def open_variant_stats(cache):
+    """VariantStats i samma fil som API-cachen (ResponseCache), eller None om cachen är avstängd."""
+    if cache is None:
+        return None
+    return VariantStats(cache.path)
@@ -4,12 +4,9 @@ Analysera specifika företag från PRAKTIKJAKT-databasen
 Används för att testa om specifika IDs eller kategorie av företag
 """
 
-import configparser
 import json
-import requests
 import sqlite3
 import sys
-import time
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional, Union
 
@@ -18,35 +15,21 @@ try:
 except ImportError as e:
     raise SystemExit("Saknar 'fuzzywuzzy'. Installera: pip install fuzzywuzzy python-Levenshtein") from e
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from scb_client.client import open_client
+from scb_client.config import load_config
+
 # =============================================================================
 # KONFIGURATION
 # =============================================================================
 
-API_URL = 'https://privateapi.scb.se/nv0101/v1/sokpavar/api/je/HamtaForetag'
-
-def load_config():
-    """Load configuration from config.ini or use defaults"""
-    config = configparser.ConfigParser()
-    config_path = Path(__file__).parent.parent / "config.ini"
-
-    # Defaults (relativa paths från scripts/database_management/)
-    default_db = "../../databases/ai_companies.db"
-    default_cert = "../../../SCB/certifikat/Certifikat_SokPaVar_A00592_2025-10-29_09-27-36Z.pem"
-
-    if config_path.exists():
-        config.read(config_path)
-        db_path = config.get('SCB', 'database_path', fallback=default_db)
-        cert_path = config.get('SCB', 'cert_path', fallback=default_cert)
-    else:
-        db_path = default_db
-        cert_path = default_cert
-
-    # Konvertera till absoluta paths
-    script_dir = Path(__file__).parent
-    db_path = (script_dir / db_path).resolve()
-    cert_path = (script_dir / cert_path).resolve()
-
-    return str(db_path), str(cert_path)
+# Defaults (relativa paths från scripts/database_management/)
+CONFIG = load_config(
+    [Path(__file__).parent.parent / "config.ini"],
+    default_db="../../databases/ai_companies.db",
+    default_cert="../../../SCB/certifikat/Certifikat_SokPaVar_A00592_2025-10-29_09-27-36Z.pem",
+    base_dir=Path(__file__).parent,
+)
 
 def validate_paths(db_path: str, cert_path: str):
     """Validera att databas och certifikat finns"""
@@ -56,49 +39,33 @@ def validate_paths(db_path: str, cert_path: str):
     if not db.exists():
         raise FileNotFoundError(f"Databas hittades inte: {db}")
 
-    if not cert.exists():
+    if CONFIG.requires_cert and not cert.exists():     # Ej mot lokal stand-in (api_url över http)
         raise FileNotFoundError(f"Certifikat hittades inte: {cert}")
 
 # Ladda konfiguration
-DB_PATH, CERT_PATH = load_config()
+DB_PATH, CERT_PATH = CONFIG.db_path, CONFIG.cert_path
+SCB = open_client(CONFIG)   # Takten anpassas efter SCB:s svar (scb_client.rate_control)
 
 # =============================================================================
 # SCB API-FUNKTIONER
 # =============================================================================
 
 def search_scb(company_name: str, verbose: bool = True) -> List[Dict]:
-    """Sök företag i SCB"""
-    payload = {
-        "Företagsstatus": "1",
-        "Registreringsstatus": "1",
-        "variabler": [
-            {
-                "Varde1": company_name,
-                "Varde2": "",
-                "Operator": "Innehaller",
-                "Variabel": "Namn"
-            }
-        ]
-    }
-    
-    try:
-        response = requests.post(API_URL, json=payload, cert=CERT_PATH, timeout=30)
-        response.raise_for_status()
-        results = response.json()
-        
-        if verbose:
-            print(f"  API Status: {response.status_code}")
-            print(f"  Träffar: {len(results)}")
-            
-            if len(results) > 100:
-                print(f"  ⚠️  MÅNGA TRÄFFAR! ({len(results)}) - Risk för 2000-radgräns")
-        
-        return results
-    
-    except Exception as e:
-        print(f"  ✗ API-fel: {e}")
+    """Sök företag i SCB via den delade klienten (scb_client)"""
+    result = SCB.search(company_name)
+    if not result.ok:
+        print(f"  ✗ API-fel: {result.error}")
         return []
 
+    if verbose:
+        print(f"  Källa: {result.source} (status {result.status_code})")
+        print(f"  Träffar: {len(result.data)}")
+
+        if len(result.data) > 100:
+            print(f"  ⚠️  MÅNGA TRÄFFAR! ({len(result.data)}) - Risk för 2000-radgräns")
+
+    return result.data
+
 def normalize_name(name: str) -> str:
     """Normalisera företagsnamn för fuzzy matching"""
     if not name:
@@ -295,7 +262,7 @@ def analyze_company(company_id: int, name: str, verbose: bool = True):
         'total_results': len(results)
     }
 
-def analyze_batch(companies: List[Tuple], rate_limit: float = 0.5):
+def analyze_batch(companies: List[Tuple]):
     """Analysera en batch av företag"""
     print(f"\n{'='*70}")
     print(f"BATCH-ANALYS: {len(companies)} företag")
@@ -312,10 +279,6 @@ def analyze_batch(companies: List[Tuple], rate_limit: float = 0.5):
         
         if result:
             results.append(result)
-        
-        # Rate limiting
-        if i < len(companies):
-            time.sleep(rate_limit)
     
     # Sammanfattning
     print(f"\n{'='*70}")
@@ -338,6 +301,8 @@ def analyze_batch(companies: List[Tuple], rate_limit: float = 0.5):
         for r in many_hits:
             print(f"  - {r['name']}: {r['total_results']} träffar")
     
+    print(f"\n{SCB.summary()}")
+    
     return results
 
 # =============================================================================
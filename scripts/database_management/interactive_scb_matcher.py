@@ -15,13 +15,10 @@ CSV-format (input.csv):
     789
 """
 
-import configparser
 import csv
 import json
-import requests
 import sqlite3
 import sys
-import time
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 
@@ -30,35 +27,21 @@ try:
 except ImportError as e:
     raise SystemExit("Saknar 'fuzzywuzzy'. Installera: pip install fuzzywuzzy python-Levenshtein") from e
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from scb_client.client import open_client
+from scb_client.config import load_config
+
 # =============================================================================
 # KONFIGURATION
 # =============================================================================
 
-API_URL = 'https://privateapi.scb.se/nv0101/v1/sokpavar/api/je/HamtaForetag'
-
-def load_config():
-    """Load configuration from config.ini or use defaults"""
-    config = configparser.ConfigParser()
-    config_path = Path(__file__).parent.parent / "config.ini"
-
-    # Defaults (relativa paths från scripts/database_management/)
-    default_db = "../../databases/ai_companies.db"
-    default_cert = "../../../SCB/certifikat/Certifikat_SokPaVar_A00592_2025-10-29_09-27-36Z.pem"
-
-    if config_path.exists():
-        config.read(config_path)
-        db_path = config.get('SCB', 'database_path', fallback=default_db)
-        cert_path = config.get('SCB', 'cert_path', fallback=default_cert)
-    else:
-        db_path = default_db
-        cert_path = default_cert
-
-    # Konvertera till absoluta paths
-    script_dir = Path(__file__).parent
-    db_path = (script_dir / db_path).resolve()
-    cert_path = (script_dir / cert_path).resolve()
-
-    return str(db_path), str(cert_path)
+# Defaults (relativa paths från scripts/database_management/)
+CONFIG = load_config(
+    [Path(__file__).parent.parent / "config.ini"],
+    default_db="../../databases/ai_companies.db",
+    default_cert="../../../SCB/certifikat/Certifikat_SokPaVar_A00592_2025-10-29_09-27-36Z.pem",
+    base_dir=Path(__file__).parent,
+)
 
 def validate_paths(db_path: str, cert_path: str):
     """Validera att databas och certifikat finns"""
@@ -68,11 +51,12 @@ def validate_paths(db_path: str, cert_path: str):
     if not db.exists():
         raise FileNotFoundError(f"Databas hittades inte: {db}")
 
-    if not cert.exists():
+    if CONFIG.requires_cert and not cert.exists():     # Ej mot lokal stand-in (api_url över http)
         raise FileNotFoundError(f"Certifikat hittades inte: {cert}")
 
 # Ladda konfiguration
-DB_PATH, CERT_PATH = load_config()
+DB_PATH, CERT_PATH = CONFIG.db_path, CONFIG.cert_path
+SCB = open_client(CONFIG)
 
 # =============================================================================
 # SCB API
@@ -85,53 +69,10 @@ def search_scb(search_term: str) -> List[Dict]:
     VIKTIGT: SCB API har en 2000-radgräns. Vi begränsar till 5 träffar
     för att inte överbelasta API:et och hålla sökningarna snabba.
     """
-    payload = {
-        "Företagsstatus": "1",
-        "Registreringsstatus": "1",
-        "MaxRowLimit": 5,  # Begränsa till max 5 resultat från SCB
-        "variabler": [
-            {
-                "Varde1": search_term,
-                "Varde2": "",
-                "Operator": "Innehaller",
-                "Variabel": "Namn"
-            }
-        ]
-    }
-
-    try:
-        response = requests.post(API_URL, json=payload, cert=CERT_PATH, timeout=30)
-        response.raise_for_status()
-        results = response.json()
-
-        # Validera att results är en lista
-        if not isinstance(results, list):
-            print(f"  ⚠️  SCB returnerade oväntat format: {type(results)}")
-            return []
-
-        # Validera att varje item är ett dictionary
-        valid_results = []
-        for item in results:
-            if isinstance(item, dict):
-                valid_results.append(item)
-            else:
-                print(f"  ⚠️  Ogiltigt resultat-format, hoppar över: {type(item)}")
-
-        # Extra säkerhetscheck: ta max 5 även om SCB returnerar fler
-        if len(valid_results) > 5:
-            print(f"  ⚠️  SCB returnerade {len(valid_results)} resultat trots MaxRowLimit, tar första 5")
-            valid_results = valid_results[:5]
-
-        return valid_results
-    except requests.exceptions.RequestException as e:
-        print(f"  ❌ Nätverksfel: {e}")
-        return []
-    except ValueError as e:
-        print(f"  ❌ JSON-parsningsfel: {e}")
-        return []
-    except Exception as e:
-        print(f"  ❌ Oväntat fel: {e}")
-        return []
+    result = SCB.search(search_term, max_rows=5)
+    if not result.ok:
+        print(f"  ❌ SCB-fel: {result.error}")
+    return result.data
 
 def normalize_name(name: str) -> str:
     """Normalisera företagsnamn för fuzzy matching"""
@@ -462,6 +403,13 @@ def process_company(company: Dict, confirmed_matches: List[Dict], output_path: s
             selected = candidates[choice_num - 1]
             scb_company, score = selected
 
+            # Lokala registret har bara bulk-fälten: hämta hela posten på org.nr
+            full = SCB.full_record(scb_company)
+            if not full.ok or not full.data:
+                print(f"\n❌ Kunde inte hämta hela posten från SCB ({full.error or 'org.nr saknas i API:et'}) - välj igen")
+                continue
+            scb_company = full.data[0]
+
             # Platta ut SCB-data
             scb_flat = flatten_scb_result(scb_company)
 
@@ -596,10 +544,6 @@ Output:
             # Användaren valde quit
             break
 
-        # Rate limiting mellan företag
-        if i < len(company_ids):
-            time.sleep(0.5)
-
     # Final save (även om det redan är auto-sparat)
     if confirmed_matches:
         save_matches_to_csv(confirmed_matches, output_path)
@@ -613,6 +557,8 @@ Output:
     else:
         print("\n⚠️  Inga matcher bekräftades")
 
+    print(SCB.summary())
+
     print("\n✅ Klart!")
 
 if __name__ == "__main__":
@@ -6,8 +6,17 @@ Batch SCB Matcher - Automatisk version av interactive_scb_matcher
 Läser CSV med företagsnamn och hämtar automatiskt SCB-data för varje företag.
 Tar första (bästa) matchningen baserat på fuzzy score.
 
+Med --orgnr görs i stället exakta uppslag på kända organisationsnummer (från
+CSV:ns organization_number-kolumn, eller alla matchade företag i
+scb_enrichment): API-cachen först, API:et bara för resten, och
+scb_enrichment uppdateras i batchar. Periodisk omberikning av redan matchade
+företag blir då ett snabbt batchjobb i stället för en fuzzy namnsökning.
+
 Usage:
     python3 batch_scb_by_orgnr.py input.csv
+    python3 batch_scb_by_orgnr.py --orgnr                 # alla matchade företag i databasen
+    python3 batch_scb_by_orgnr.py --orgnr orgnr.csv       # organization_number-kolumn
+    python3 batch_scb_by_orgnr.py --resume RUN_ID         # fortsätt en avbruten körning
 
 Input CSV-format:
     company_name
@@ -20,13 +29,14 @@ Output:
     - scb_failed_TIMESTAMP.csv: Alla misslyckade matcher med felmeddelanden
 """
 
-import configparser
+import argparse
 import csv
 import json
-import requests
+import sqlite3
 import sys
 import time
 from datetime import datetime
+from functools import partial
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 
@@ -35,39 +45,25 @@ try:
 except ImportError as e:
     raise SystemExit("Saknar 'fuzzywuzzy'. Installera: pip install fuzzywuzzy python-Levenshtein") from e
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from scb_client.client import normalize_orgnr, open_client, orgnr_key, search_key
+from scb_client.config import load_config
+from scb_client.match_writer import MatchWriter
+from scb_client.run_journal import open_run_journal
+
 # =============================================================================
 # KONFIGURATION
 # =============================================================================
 
-API_URL = 'https://privateapi.scb.se/nv0101/v1/sokpavar/api/je/HamtaForetag'
-RATE_LIMIT_DELAY = 0.5  # Sekunder mellan anrop
 FUZZY_THRESHOLD = 85  # Minsta fuzzy score för automatisk matchning
 
-def load_config():
-    """Load configuration from config.ini or use defaults"""
-    config = configparser.ConfigParser()
-
-    # Leta efter config.ini i olika platser
-    possible_paths = [
-        Path(__file__).parent.parent / "config.ini",
-        Path(__file__).parent / "config.ini",
-    ]
-
-    # Default cert path
-    default_cert = "../../../SCB/certifikat/Certifikat_SokPaVar_A00592_2025-10-29_09-27-36Z.pem"
-    cert_path = default_cert
-
-    for config_path in possible_paths:
-        if config_path.exists():
-            config.read(config_path)
-            cert_path = config.get('SCB', 'cert_path', fallback=default_cert)
-            break
-
-    # Konvertera till absolut path
-    script_dir = Path(__file__).parent
-    cert_path = (script_dir / cert_path).resolve()
-
-    return str(cert_path)
+# Leta efter config.ini i olika platser; relativa paths från skriptets katalog
+CONFIG = load_config(
+    [Path(__file__).parent.parent / "config.ini", Path(__file__).parent / "config.ini"],
+    default_db="../../databases/ai_companies.db",
+    default_cert="../../../SCB/certifikat/Certifikat_SokPaVar_A00592_2025-10-29_09-27-36Z.pem",
+    base_dir=Path(__file__).parent,
+)
 
 def validate_cert_path(cert_path: str):
     """Validera att certifikat finns"""
@@ -76,49 +72,20 @@ def validate_cert_path(cert_path: str):
         raise FileNotFoundError(f"Certifikat hittades inte: {cert}")
 
 # Ladda konfiguration
-CERT_PATH = load_config()
+CERT_PATH = CONFIG.cert_path
+SCB = open_client(CONFIG)   # Takten anpassas efter SCB:s svar (scb_client.rate_control)
 
 # =============================================================================
-# SCB API (kopierat från interactive_scb_matcher.py)
+# SCB API (delad klient i scb_client: lokalt register, API-cache, retry)
 # =============================================================================
 
-def search_scb(search_term: str) -> List[Dict]:
-    """
-    Sök företag i SCB
-    Exakt samma som i interactive_scb_matcher.py
-    """
-    payload = {
-        "Företagsstatus": "1",
-        "Registreringsstatus": "1",
-        "variabler": [
-            {
-                "Varde1": search_term,
-                "Varde2": "",
-                "Operator": "Innehaller",
-                "Variabel": "Namn"
-            }
-        ]
-    }
-
-    try:
-        response = requests.post(API_URL, json=payload, cert=CERT_PATH, timeout=30)
-        response.raise_for_status()
-        results = response.json()
-
-        if not isinstance(results, list):
-            print(f"  ⚠️  SCB returnerade oväntat format: {type(results)}")
-            return []
-
-        return results
-    except requests.exceptions.RequestException as e:
-        print(f"  ❌ Nätverksfel: {e}")
-        return []
-    except ValueError as e:
-        print(f"  ❌ JSON-parsningsfel: {e}")
-        return []
-    except Exception as e:
-        print(f"  ❌ Oväntat fel: {e}")
-        return []
+def search_scb(search_term: str) -> Optional[List[Dict]]:
+    """Sök företag i SCB. None vid fel (felet skrivs ut)."""
+    result = SCB.search(search_term)
+    if not result.ok:
+        print(f"  ❌ SCB-fel: {result.error}")
+        return None
+    return result.data
 
 def normalize_name(name: str) -> str:
     """
@@ -229,6 +196,67 @@ def read_company_names(csv_path: str) -> List[str]:
                 sys.exit(1)
     return names
 
+def read_orgnr_rows(csv_path: str) -> List[Dict]:
+    """Läs org.nr (kolumn organization_number, valfritt company_name/company_id) från CSV"""
+    rows = []
+    with open(csv_path, 'r', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        if 'organization_number' not in (reader.fieldnames or []):
+            print(f"⚠️  CSV måste ha kolumnen 'organization_number'. Hittade: {reader.fieldnames}")
+            sys.exit(1)
+        for row in reader:
+            orgnr = (row.get('organization_number') or '').strip()
+            if orgnr:
+                company_id = (row.get('company_id') or '').strip()
+                rows.append({
+                    'orgnr': orgnr,
+                    'company_name': (row.get('company_name') or '').strip(),
+                    'company_ids': [int(company_id)] if company_id.isdigit() else [],
+                })
+    return rows
+
+def load_known_orgnrs(db_path: str) -> List[Dict]:
+    """Alla matchade företag med org.nr i scb_enrichment (ett företag per rad)"""
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("""
+            SELECT e.organization_number, COALESCE(c.name, e.scb_company_name, ''), e.company_id
+            FROM scb_enrichment e
+            LEFT JOIN companies c ON c.id = e.company_id
+            WHERE e.organization_number IS NOT NULL AND TRIM(e.organization_number) != ''
+            ORDER BY e.company_id
+        """).fetchall()
+    except sqlite3.OperationalError:
+        rows = []       # Ingen scb_enrichment ännu
+    finally:
+        conn.close()
+    return [{'orgnr': orgnr, 'company_name': name, 'company_ids': [company_id]} for orgnr, name, company_id in rows]
+
+def group_by_orgnr(rows: List[Dict], db_path: Optional[str]) -> Tuple[Dict[str, Dict], List[Dict]]:
+    """
+    Slå ihop rader per normaliserat org.nr och koppla på company_id från
+    scb_enrichment (om databasen finns). Returnerar (org.nr -> post, ogiltiga rader).
+    """
+    known = {}
+    if db_path and Path(db_path).exists():
+        for row in load_known_orgnrs(db_path):
+            orgnr = normalize_orgnr(row['orgnr'])
+            if orgnr:
+                known.setdefault(orgnr, []).extend(row['company_ids'])
+
+    items, invalid = {}, []
+    for row in rows:
+        orgnr = normalize_orgnr(row['orgnr'])
+        if orgnr is None:
+            invalid.append(row)
+            continue
+        item = items.setdefault(orgnr, {'company_name': row['company_name'], 'company_ids': []})
+        item['company_name'] = item['company_name'] or row['company_name']
+        for company_id in row['company_ids'] + known.get(orgnr, []):
+            if company_id not in item['company_ids']:
+                item['company_ids'].append(company_id)
+    return items, invalid
+
 def save_success_to_csv(success_data: List[Dict], output_path: str):
     """Spara lyckade matcher till CSV (samma format som interactive_scb_matcher)"""
     if not success_data:
@@ -300,20 +328,11 @@ def save_failed_to_csv(failed_data: List[Dict], output_path: str):
 # MAIN
 # =============================================================================
 
-def main():
-    # Validera certifikat
-    try:
-        validate_cert_path(CERT_PATH)
-    except FileNotFoundError as e:
-        print(f"❌ Fel: {e}")
-        print(f"\nFörväntad certifikat-path: {CERT_PATH}")
-        sys.exit(1)
-
-    # Kolla argument
-    if len(sys.argv) < 2:
-        print("""
+USAGE = """
 Användning:
     python3 batch_scb_by_orgnr.py input.csv
+    python3 batch_scb_by_orgnr.py --orgnr [orgnr.csv] [--concurrency 4 --rate 2] [--dry-run]
+    python3 batch_scb_by_orgnr.py --resume RUN_ID
 
 Input CSV-format:
     company_name
@@ -326,10 +345,72 @@ Output:
     - scb_failed_TIMESTAMP.csv: Misslyckade matcher med felmeddelanden
 
 Observera: Tar automatiskt första (bästa) matchningen med fuzzy score >= 85
-""")
-        sys.exit(0)
 
-    csv_path = sys.argv[1]
+Org.nr-läge (--orgnr):
+    Utan CSV: alla företag med org.nr i scb_enrichment (omberikning)
+    Med CSV: kolumnen organization_number (valfritt company_name, company_id)
+    API-cachen först, API:et för resten; scb_enrichment uppdateras
+    för kända företag (inte med --dry-run) och samma CSV:er skrivs
+"""
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Batch SCB matcher",
+                                     epilog=USAGE, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv_path", nargs="?",
+                        help="CSV with a company_name column (organization_number with --orgnr)")
+    parser.add_argument("--resume", metavar="RUN_ID", default=None,
+                        help="Continue an interrupted run from the run journal (skips completed companies)")
+    parser.add_argument("--orgnr", action="store_true",
+                        help="Exact lookup by organization number instead of fuzzy name search; "
+                             "without csv_path, refreshes every company in scb_enrichment")
+    parser.add_argument("--db", default=CONFIG.db_path, help="SQLite database for --orgnr (scb_enrichment)")
+    parser.add_argument("--dry-run", action="store_true", help="With --orgnr: don't write to the database")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="With --orgnr: concurrent API requests for lookups missing from the API cache")
+    parser.add_argument("--rate", type=float, default=SCB.rate_control.rate,
+                        help="Starting API requests per second; adapts to SCB's responses (api_rate in config.ini)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.rate != SCB.rate_control.rate:
+        SCB.rate_control.set_rate(args.rate)
+
+    # Validera certifikat
+    try:
+        if CONFIG.requires_cert:
+            validate_cert_path(CERT_PATH)
+    except FileNotFoundError as e:
+        print(f"❌ Fel: {e}")
+        print(f"\nFörväntad certifikat-path: {CERT_PATH}")
+        sys.exit(1)
+
+    # Körjournal: varje företag skrivs direkt, så en avbruten körning kan
+    # fortsätta med --resume. Input- och output-filer följer med körningen.
+    if args.resume:
+        try:
+            journal = open_run_journal("batch_scb_by_orgnr", {}, resume=args.resume, path=CONFIG.journal_path)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        if journal.args.get('mode') == 'orgnr':
+            run_orgnr_batch(args, journal)
+            return
+        csv_path, success_path, failed_path = (
+            journal.args['csv_path'], journal.args['success_path'], journal.args['failed_path']
+        )
+    elif args.orgnr:
+        run_orgnr_batch(args)
+        return
+    elif args.csv_path:
+        csv_path = args.csv_path
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        success_path = f"scb_success_{timestamp}.csv"
+        failed_path = f"scb_failed_{timestamp}.csv"
+        journal = None
+    else:
+        print(USAGE)
+        sys.exit(0)
 
     # Läs företagsnamn
     if not Path(csv_path).exists():
@@ -345,24 +426,36 @@ Observera: Tar automatiskt första (bästa) matchningen med fuzzy score >= 85
 
     print(f"✅ Hittade {len(company_names)} företag att processa")
 
-    # Skapa output-filer
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    success_path = f"scb_success_{timestamp}.csv"
-    failed_path = f"scb_failed_{timestamp}.csv"
-
     print(f"\n💾 Lyckade matcher sparas till: {success_path}")
     print(f"💾 Misslyckade matcher sparas till: {failed_path}")
     print(f"🎯 Fuzzy threshold: {FUZZY_THRESHOLD}% (tar automatiskt bästa matchningen)")
 
+    done = journal.completed() if journal else set()
+    remaining = [name for name in company_names if name not in done]
+    if done:
+        print(f"🔁 Återupptar {journal.run_id}: {len(company_names) - len(remaining)} klara, {len(remaining)} kvar")
+
     # Bekräfta start
-    response = input(f"\nVill du börja hämta data för {len(company_names)} företag? (y/n): ").strip().lower()
+    response = input(f"\nVill du börja hämta data för {len(remaining)} företag? (y/n): ").strip().lower()
     if response != 'y':
         print("Avbryter...")
         sys.exit(0)
 
-    # Listor för resultat
-    success_data = []
-    failed_data = []
+    if journal is None:
+        journal = open_run_journal(
+            "batch_scb_by_orgnr",
+            {'csv_path': str(Path(csv_path).resolve()), 'success_path': str(Path(success_path).resolve()),
+             'failed_path': str(Path(failed_path).resolve())},
+            path=CONFIG.journal_path,
+        )
+    print(f"🧾 Körnings-id: {journal.run_id} (fortsätt en avbruten körning med --resume {journal.run_id})")
+
+    def record_failure(company_name, reason, outcome='failed'):
+        journal.record(company_name, outcome, search_key(company_name), {
+            'company_name': company_name,
+            'reason': reason,
+            'timestamp': datetime.now().isoformat()
+        })
 
     # Processa varje företag
     print(f"\n{'='*70}")
@@ -370,77 +463,88 @@ Observera: Tar automatiskt första (bästa) matchningen med fuzzy score >= 85
     print('='*70)
 
     start_time = time.time()
+    interrupted = False
 
-    for i, company_name in enumerate(company_names, 1):
-        print(f"\n[{i}/{len(company_names)}] {company_name}")
-
-        # Sök i SCB
-        scb_results = search_scb(company_name)
-
-        if not scb_results:
-            failed_data.append({
-                'company_name': company_name,
-                'reason': 'Inga resultat från SCB',
-                'timestamp': datetime.now().isoformat()
-            })
-            print(f"  ❌ Inga resultat från SCB")
-            if i < len(company_names):
-                time.sleep(RATE_LIMIT_DELAY)
-            continue
-
-        # Ranka kandidater
-        candidates = rank_candidates(company_name, scb_results)
-
-        if not candidates:
-            failed_data.append({
-                'company_name': company_name,
-                'reason': 'Kunde inte ranka resultat',
-                'timestamp': datetime.now().isoformat()
-            })
-            print(f"  ❌ Kunde inte ranka resultat")
-            if i < len(company_names):
-                time.sleep(RATE_LIMIT_DELAY)
-            continue
-
-        # Ta första (bästa) matchningen
-        best_match, score = candidates[0]
-
-        # Kontrollera om score är över threshold
-        if score < FUZZY_THRESHOLD:
-            failed_data.append({
+    try:
+        for i, company_name in enumerate(remaining, 1):
+            print(f"\n[{i}/{len(remaining)}] {company_name}")
+
+            # Sök i SCB
+            scb_results = search_scb(company_name)
+
+            # API-fel görs om vid --resume
+            if scb_results is None:
+                record_failure(company_name, 'SCB API-fel', outcome='api_error')
+                continue
+
+            if not scb_results:
+                record_failure(company_name, 'Inga resultat från SCB')
+                print(f"  ❌ Inga resultat från SCB")
+                continue
+
+            # Ranka kandidater
+            candidates = rank_candidates(company_name, scb_results)
+
+            if not candidates:
+                record_failure(company_name, 'Kunde inte ranka resultat')
+                print(f"  ❌ Kunde inte ranka resultat")
+                continue
+
+            # Ta första (bästa) matchningen
+            best_match, score = candidates[0]
+
+            # Kontrollera om score är över threshold
+            if score < FUZZY_THRESHOLD:
+                record_failure(
+                    company_name,
+                    f'Låg fuzzy score: {score} < {FUZZY_THRESHOLD}. Bästa kandidat: {best_match.get("Företagsnamn", "N/A")}'
+                )
+                print(f"  ⚠️  Låg score: {score} < {FUZZY_THRESHOLD}")
+                print(f"      Bästa kandidat: {best_match.get('Företagsnamn', 'N/A')}")
+                continue
+
+            # Lokala registret har bara bulk-fälten: hämta hela posten på org.nr
+            full = SCB.full_record(best_match)
+            if not full.ok:
+                record_failure(company_name, 'SCB API-fel', outcome='api_error')
+                print(f"  ❌ SCB-fel: {full.error}")
+                continue
+            if not full.data:
+                record_failure(company_name, f'Org.nr {best_match.get("OrgNr", "")} finns inte i SCB API')
+                print(f"  ❌ Org.nr {best_match.get('OrgNr', '')} finns inte i SCB API")
+                continue
+            best_match = full.data[0]
+
+            # Platta ut SCB-data
+            scb_flat = flatten_scb_result(best_match)
+
+            # Skapa matchad rad
+            match = {
                 'company_name': company_name,
-                'reason': f'Låg fuzzy score: {score} < {FUZZY_THRESHOLD}. Bästa kandidat: {best_match.get("Företagsnamn", "N/A")}',
-                'timestamp': datetime.now().isoformat()
-            })
-            print(f"  ⚠️  Låg score: {score} < {FUZZY_THRESHOLD}")
-            print(f"      Bästa kandidat: {best_match.get('Företagsnamn', 'N/A')}")
-            if i < len(company_names):
-                time.sleep(RATE_LIMIT_DELAY)
-            continue
-
-        # Platta ut SCB-data
-        scb_flat = flatten_scb_result(best_match)
-
-        # Skapa matchad rad
-        match = {
-            'company_name': company_name,
-            'fuzzy_score': score,
-            **scb_flat
-        }
-
-        success_data.append(match)
+                'fuzzy_score': score,
+                **scb_flat
+            }
 
-        scb_name = best_match.get('Företagsnamn', 'N/A')
-        city = best_match.get('PostOrt', 'N/A')
-        print(f"  ✅ {scb_name} - {city} (score: {score})")
+            journal.record(company_name, 'success', search_key(company_name), match)
 
-        # Rate limiting
-        if i < len(company_names):
-            time.sleep(RATE_LIMIT_DELAY)
+            scb_name = best_match.get('Företagsnamn', 'N/A')
+            city = best_match.get('PostOrt', 'N/A')
+            print(f"  ✅ {scb_name} - {city} (score: {score})")
+    except KeyboardInterrupt:
+        interrupted = True
+        print(f"\n⏸️  Avbruten – fortsätt med: python3 batch_scb_by_orgnr.py --resume {journal.run_id}")
 
     end_time = time.time()
     duration = end_time - start_time
 
+    # Resultat byggs från journalen (hela körningen, även före --resume)
+    success_data = [entry['record'] for entry in journal.entries(outcomes=('success',))]
+    failed_data = [entry['record'] for entry in journal.entries(outcomes=('failed', 'api_error'))]
+    if not interrupted:
+        journal.finish()
+    journal.record_rates(SCB.rate_control.history)
+    journal.close()
+
     # Spara resultat
     print(f"\n{'='*70}")
     print("SPARAR RESULTAT")
@@ -450,6 +554,7 @@ Observera: Tar automatiskt första (bästa) matchningen med fuzzy score >= 85
     save_failed_to_csv(failed_data, failed_path)
 
     # Statistik
+    processed = max(len(remaining), 1)
     print(f"\n{'='*70}")
     print("SAMMANFATTNING")
     print('='*70)
@@ -457,8 +562,163 @@ Observera: Tar automatiskt första (bästa) matchningen med fuzzy score >= 85
     print(f"Lyckade matcher: {len(success_data)} ({len(success_data)/len(company_names)*100:.1f}%)")
     print(f"Misslyckade matcher: {len(failed_data)} ({len(failed_data)/len(company_names)*100:.1f}%)")
     print(f"Körtid: {duration:.1f} sekunder ({duration/60:.1f} minuter)")
-    print(f"Genomsnittlig tid per request: {duration/len(company_names):.2f} sekunder")
-    print(f"\n✅ Klart!")
+    print(f"Genomsnittlig tid per request: {duration/processed:.2f} sekunder")
+    print(SCB.summary())
+    if not interrupted:
+        print(f"\n✅ Klart!")
+
+# =============================================================================
+# ORG.NR-LÄGE
+# =============================================================================
+
+def run_orgnr_batch(args, journal=None):
+    """Exakta org.nr-uppslag (API-cachen först) och bulk-uppdatering av scb_enrichment"""
+    if journal is not None:
+        csv_path, db_path, dry_run = journal.args['csv_path'], journal.args['db_path'], journal.args['dry_run']
+        success_path, failed_path = journal.args['success_path'], journal.args['failed_path']
+    else:
+        csv_path, db_path, dry_run = args.csv_path, args.db, args.dry_run
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        success_path = f"scb_success_orgnr_{timestamp}.csv"
+        failed_path = f"scb_failed_orgnr_{timestamp}.csv"
+
+    db_exists = bool(db_path) and Path(db_path).exists()
+    if csv_path:
+        if not Path(csv_path).exists():
+            print(f"❌ Filen hittades inte: {csv_path}")
+            sys.exit(1)
+        print(f"📖 Läser org.nr från: {csv_path}")
+        rows = read_orgnr_rows(csv_path)
+    elif db_exists:
+        print(f"📖 Läser org.nr för matchade företag från: {db_path}")
+        rows = load_known_orgnrs(db_path)
+    else:
+        print(f"❌ Databasen hittades inte: {db_path}")
+        sys.exit(1)
+
+    items, invalid = group_by_orgnr(rows, db_path)
+    if not items:
+        print("❌ Inga giltiga org.nr hittades")
+        sys.exit(1)
+    print(f"✅ {len(items)} unika org.nr ({sum(len(item['company_ids']) for item in items.values())} kända företag)")
+    if invalid:
+        print(f"⚠️  {len(invalid)} ogiltiga org.nr hoppas över")
+    if not db_exists and not dry_run:
+        print("⚠️  Ingen databas – bara CSV:er skrivs")
+        dry_run = True
+
+    print(f"\n💾 Lyckade uppslag sparas till: {success_path}")
+    print(f"💾 Misslyckade uppslag sparas till: {failed_path}")
+    print(f"🗄️  Uppdatera scb_enrichment: {'nej (dry-run)' if dry_run else 'ja'}")
+
+    done = journal.completed() if journal else set()
+    remaining = [orgnr for orgnr in items if orgnr not in done]
+    if done:
+        print(f"🔁 Återupptar {journal.run_id}: {len(items) - len(remaining)} klara, {len(remaining)} kvar")
+
+    response = input(f"\nVill du slå upp {len(remaining)} org.nr? (y/n): ").strip().lower()
+    if response != 'y':
+        print("Avbryter...")
+        sys.exit(0)
+
+    if journal is None:
+        journal = open_run_journal(
+            "batch_scb_by_orgnr",
+            {'mode': 'orgnr', 'csv_path': str(Path(csv_path).resolve()) if csv_path else None,
+             'db_path': str(Path(db_path).resolve()) if db_path else None, 'dry_run': dry_run,
+             'success_path': str(Path(success_path).resolve()), 'failed_path': str(Path(failed_path).resolve())},
+            path=CONFIG.journal_path,
+        )
+        for row in invalid:
+            journal.record(row['orgnr'], 'failed', None, {
+                'company_name': row['company_name'] or row['orgnr'],
+                'reason': f"Ogiltigt org.nr: {row['orgnr']}",
+                'timestamp': datetime.now().isoformat()
+            })
+    print(f"🧾 Körnings-id: {journal.run_id} (fortsätt en avbruten körning med --resume {journal.run_id})")
+
+    print(f"\n{'='*70}")
+    print("STARTAR ORG.NR-KÖRNING")
+    print('='*70)
+
+    start_time = time.time()
+    interrupted = False
+    writer = None if dry_run else MatchWriter(db_path)
+
+    try:
+        # Parallellt mot API:et vid --concurrency > 1 (API-cachen först)
+        if args.concurrency > 1:
+            fetched, failed, _ = SCB.prefetch_orgnrs(remaining, args.concurrency)
+            if fetched:
+                print(f"⚡ Hämtade {fetched} org.nr parallellt ({failed} misslyckade)")
+
+        for i, orgnr in enumerate(remaining, 1):
+            item = items[orgnr]
+            label = item['company_name'] or orgnr
+            result = SCB.lookup_orgnr(orgnr)
+            record = {'company_name': label, 'timestamp': datetime.now().isoformat()}
+
+            # API-fel görs om vid --resume
+            if not result.ok:
+                print(f"[{i}/{len(remaining)}] {orgnr} ❌ SCB-fel: {result.error}")
+                journal.record(orgnr, 'api_error', orgnr_key(orgnr), {**record, 'reason': 'SCB API-fel'})
+                continue
+            if not result.data:
+                print(f"[{i}/{len(remaining)}] {orgnr} ❌ Finns inte i SCB")
+                journal.record(orgnr, 'failed', orgnr_key(orgnr), {**record, 'reason': f'Org.nr {orgnr} finns inte i SCB'})
+                continue
+
+            scb_company = result.data[0]
+            # Journalen markerar org.nr klart först när alla dess företag är skrivna
+            mark_done = partial(journal.record, orgnr, 'success', orgnr_key(orgnr), {
+                'company_name': label,
+                'fuzzy_score': 100,     # Exakt org.nr
+                **flatten_scb_result(scb_company)
+            })
+            if writer is not None and item['company_ids']:
+                *others, last = item['company_ids']
+                for company_id in others:
+                    writer.refresh(company_id, scb_company)
+                writer.refresh(last, scb_company, on_written=mark_done)
+            else:
+                mark_done()
+            if i % 100 == 0 or i == len(remaining):
+                print(f"[{i}/{len(remaining)}] {scb_company.get('Företagsnamn', 'N/A')} ✅")
+    except KeyboardInterrupt:
+        interrupted = True
+        print(f"\n⏸️  Avbruten – fortsätt med: python3 batch_scb_by_orgnr.py --resume {journal.run_id}")
+    finally:
+        if writer is not None:
+            writer.close()
+
+    duration = time.time() - start_time
+
+    success_data = [entry['record'] for entry in journal.entries(outcomes=('success',))]
+    failed_data = [entry['record'] for entry in journal.entries(outcomes=('failed', 'api_error'))]
+    if not interrupted:
+        journal.finish()
+    journal.record_rates(SCB.rate_control.history)
+    journal.close()
+
+    print(f"\n{'='*70}")
+    print("SPARAR RESULTAT")
+    print('='*70)
+
+    save_success_to_csv(success_data, success_path)
+    save_failed_to_csv(failed_data, failed_path)
+
+    print(f"\n{'='*70}")
+    print("SAMMANFATTNING")
+    print('='*70)
+    print(f"Unika org.nr: {len(items)}")
+    print(f"Hittade i SCB: {len(success_data)}")
+    print(f"Misslyckade: {len(failed_data)}")
+    if writer is not None:
+        print(f"Uppdaterade företag i scb_enrichment: {writer.stats['written']} ({writer.stats['batches']} batchar)")
+    print(f"Körtid: {duration:.1f} sekunder")
+    print(SCB.summary())
+    if not interrupted:
+        print(f"\n✅ Klart!")
 
 if __name__ == "__main__":
     main()
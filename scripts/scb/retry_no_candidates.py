@@ -162,8 +162,8 @@ def generate_search_variants(company_name: str) -> List[str]:
         variants.append(no_dash_compact)
         variants.append(f"{no_dash_compact} AB")
 
-    # Ta bort dubbletter och returnera
-    return list(set([v for v in variants if v and len(v) > 1]))
+    # Ta bort dubbletter (ordningen behålls, så originalnamnet kommer först)
+    return list(dict.fromkeys(v for v in variants if v and len(v) > 1))
 
 def categorize_no_candidates(df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
     """
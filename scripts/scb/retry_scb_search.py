@@ -7,23 +7,17 @@ Använder samma API-metod som scb_integration_v2.py
 from __future__ import annotations
 
 import argparse
-import configparser
 import csv
-import json
 import logging
 import os
 import re
-import sqlite3
 import sys
 import time
-from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
 import pandas as pd
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 
 try:
     from fuzzywuzzy import fuzz
@@ -35,6 +29,14 @@ try:
 except ImportError:
     pass  # ast is in stdlib
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from scb_client.client import ApiResult, open_client, search_key
+from scb_client.config import load_config
+from scb_client.match_writer import MatchWriter
+from scb_client.query_planner import QueryPlanner
+from scb_client.run_journal import open_run_journal
+from scb_client.variant_stats import VariantStats, open_variant_stats, variant_kind
+
 
 # ============================================================================
 # KONFIGURATION (SAMMA SOM scb_integration_v2.py)
@@ -47,35 +49,21 @@ handler.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(message)
 logger.addHandler(handler)
 logger.setLevel(logging.INFO)
 
-def load_config():
-    """Load configuration from config.ini or use defaults"""
-    config = configparser.ConfigParser()
-    config_path = Path(__file__).parent.parent / "config.ini"
-
-    # Defaults (used if config.ini doesn't exist)
-    default_db = "../ai_companies.db"
-    default_cert = "../../SCB/certifikat/Certifikat_SokPaVar_A00592_2025-10-29_09-27-36Z.pem"
+CONFIG_PATH = Path(__file__).parent.parent / "config.ini"
+CONFIG = load_config(
+    [CONFIG_PATH],
+    default_db="../ai_companies.db",
+    default_cert="../../SCB/certifikat/Certifikat_SokPaVar_A00592_2025-10-29_09-27-36Z.pem",
+)
+if CONFIG.config_path is None:
+    logger.warning(f"Config file not found at {CONFIG_PATH}, using defaults")
 
-    if config_path.exists():
-        config.read(config_path)
-        db_path = config.get('SCB', 'database_path', fallback=default_db)
-        cert_path = config.get('SCB', 'cert_path', fallback=default_cert)
-    else:
-        logger.warning(f"Config file not found at {config_path}, using defaults")
-        db_path = default_db
-        cert_path = default_cert
-
-    return db_path, cert_path
-
-DEFAULT_DB, DEFAULT_CERT = load_config()
-API_URL = "https://privateapi.scb.se/nv0101/v1/sokpavar/api/je/HamtaForetag"
-TIMEOUT_SEC = 30
-RATE_LIMIT_DELAY = 0.5
-MAX_TOTAL_RETRIES = 5
-BACKOFF_FACTOR = 0.5
-STATUS_FORCELIST = (429, 500, 502, 503, 504)
+DEFAULT_DB, DEFAULT_CERT = CONFIG.db_path, CONFIG.cert_path
 BASE_FUZZY_THRESHOLD = 85
 
+# Argument som måste vara samma vid --resume (annars blandas resultat från olika körningar)
+RESUME_MATCH_KEYS = ('db', 'input', 'limit', 'min_score', 'dry_run', 'all_variants')
+
 
 # ============================================================================
 # PATH VALIDATION (SAMMA SOM scb_integration_v2.py)
@@ -105,24 +93,12 @@ def validate_cert(cert: Optional[str | Tuple[str,str]]) -> Optional[str | Tuple[
 
 
 # ============================================================================
-# SESSION MED RETRY-LOGIK (SAMMA SOM scb_integration_v2.py)
+# SCB-KLIENT (scb_client: keep-alive, retry/backoff, lokalt register, API-cache)
 # ============================================================================
 
-def make_session() -> requests.Session:
-    s = requests.Session()
-    retry = Retry(
-        total=MAX_TOTAL_RETRIES,
-        backoff_factor=BACKOFF_FACTOR,
-        status_forcelist=STATUS_FORCELIST,
-        respect_retry_after_header=True,
-        raise_on_status=False,
-    )
-    s.mount("https://", HTTPAdapter(max_retries=retry))
-    s.mount("http://", HTTPAdapter(max_retries=retry))
-    return s
-
-SESSION = make_session()
-_query_cache: Dict[str, List[dict]] = {}
+SCB = open_client(CONFIG)   # Certifikatet från --cert sätts i main()
+SCB.on('response', lambda payload, status, elapsed:
+       logger.debug(f"API {status} på {elapsed:.2f}s: {payload['variabler'][0]['Varde1']}"))
 
 
 # ============================================================================
@@ -186,96 +162,34 @@ def dynamic_threshold(raw_name: str, base: int = BASE_FUZZY_THRESHOLD) -> int:
 # API-KOMMUNIKATION (SAMMA SOM scb_integration_v2.py)
 # ============================================================================
 
-@dataclass
-class ApiResult:
-    ok: bool
-    data: List[dict]
-    status_code: int
-    error: Optional[str] = None
-
-def scb_search_api(company_name: str, cert) -> ApiResult:
-    """Sök företag i SCB API med robust error handling"""
-
-    # Cache-nyckel
-    cache_key = normalize_company_name(company_name)
-    if cache_key in _query_cache:
-        logger.debug(f"Cache hit för '{company_name}'")
-        return ApiResult(True, _query_cache[cache_key], 200)
-
-    # SCB:s faktiska payload-format
-    payload = {
-        "Företagsstatus": "1",  # Verksamma företag
-        "Registreringsstatus": "1",  # Registrerade företag
-        "variabler": [
-            {
-                "Varde1": company_name,
-                "Varde2": "",
-                "Operator": "Innehaller",  # Innehåller namnet
-                "Variabel": "Namn"
-            }
-        ]
-    }
-
-    logger.debug(f"API Request: {API_URL}")
-    logger.debug(f"Payload: {payload}")
-    logger.debug(f"Cert: {cert}")
-
-    delay = RATE_LIMIT_DELAY
-
-    for attempt in range(MAX_TOTAL_RETRIES):
-        try:
-            resp = SESSION.post(
-                API_URL,
-                json=payload,
-                cert=cert,
-                timeout=TIMEOUT_SEC
-            )
-            logger.debug(f"Response status: {resp.status_code}")
-            if resp.status_code != 200:
-                logger.debug(f"Response headers: {dict(resp.headers)}")
-                logger.debug(f"Response body (first 500 chars): {resp.text[:500]}")
-        except requests.RequestException as e:
-            logger.warning(f"Nätverksfel (försök {attempt+1}/{MAX_TOTAL_RETRIES}): {e}")
-            time.sleep(delay)
-            delay *= (1.5 + BACKOFF_FACTOR)
-            continue
+def scb_search_api(company_name: str) -> ApiResult:
+    """Sök företag i SCB (minne, lokalt register, API-cache, sist API:et)"""
+    return SCB.search(company_name)
 
-        # Hantera rate limiting
-        if resp.status_code == 429:
-            retry_after = float(resp.headers.get("Retry-After", "1.0"))
-            wait = max(delay, retry_after)
-            logger.info(f"Rate-limited (429). Väntar {wait:.2f}s...")
-            time.sleep(wait)
-            delay *= (1.5 + BACKOFF_FACTOR)
-            continue
-
-        # Hantera server errors
-        if resp.status_code >= 500:
-            logger.warning(f"Serverfel {resp.status_code} (försök {attempt+1})")
-            time.sleep(delay)
-            delay *= (1.5 + BACKOFF_FACTOR)
-            continue
-
-        # Parse response
-        try:
-            data = resp.json()
-        except ValueError:
-            logger.error("Icke-JSON svar från API")
-            return ApiResult(False, [], resp.status_code, "Non-JSON response")
-
-        # SCB returnerar direkt en lista, inte {"value": [...]}
-        result_data = []
-        if isinstance(data, list):
-            result_data = data
-        elif isinstance(data, dict):
-            # Fallback om de ändrar format
-            result_data = data.get('value', [])
-
-        _query_cache[cache_key] = result_data
-        time.sleep(RATE_LIMIT_DELAY)
-        return ApiResult(True, result_data, resp.status_code)
-
-    return ApiResult(False, [], 599, "Max retries exceeded")
+def prefetch_searches(names: List[str], concurrency: int) -> None:
+    """
+    Hämta alla sökningar som inte kan besvaras lokalt samtidigt (asyncio,
+    adaptiv takt, högst `concurrency` samtidiga), så att huvudloopen sedan
+    inte väntar på nätet. Misslyckade sökningar görs om sekventiellt.
+    """
+    start = time.time()
+    fetched, failed, stats = SCB.prefetch(names, concurrency)
+    if fetched:
+        logger.info(f"Förhämtade {fetched} sökningar på {time.time() - start:.1f}s "
+                    f"(max {concurrency} samtidiga): {stats['rate_limited']} rate-limited "
+                    f"(takt nu {stats['rate']:.2f}/s), {failed} misslyckade")
+
+def plan_variant_searches(variants: List[str], concurrency: int) -> QueryPlanner:
+    """
+    Sök varianterna för hela batchen via frågeplaneraren: varje unik fråga
+    ställs en gång, och varianter som innehåller en annan fråga ("X AB" när
+    "X" redan söks) filtreras fram ur det bredare svaret i stället för att
+    skickas till API:et. Övriga varianter löses senare med planner.resolve().
+    """
+    planner = QueryPlanner(variants)
+    prefetch = (lambda names: prefetch_searches(names, concurrency)) if concurrency > 1 else None
+    planner.execute(scb_search_api, prefetch=prefetch)
+    return planner
 
 
 # ============================================================================
@@ -300,58 +214,104 @@ def find_best_match(our_name: str, scb_rows: List[dict]) -> Tuple[Optional[dict]
     return best, best_score
 
 
+def find_correct_name_match(correct_scb_name: str, scb_rows: List[dict]) -> Tuple[Optional[dict], int]:
+    """Första kandidat som är exact/near-exact match mot correct_scb_name (score >= 90)"""
+    correct_normalized = normalize_company_name(correct_scb_name)
+    for candidate in scb_rows:
+        scb_normalized = normalize_company_name(candidate.get("Företagsnamn", ""))
+
+        # Exact match eller mycket hög likhet
+        exact_score = score_names(correct_normalized, scb_normalized)
+        if exact_score >= 90:  # Mycket hög match mot correct_scb_name
+            return candidate, exact_score
+    return None, 0
+
+
+def ordered_variants(
+    name: str,
+    search_variants: List[str],
+    correct_scb_name: Optional[str] = None,
+    variant_stats: Optional[VariantStats] = None
+) -> List[str]:
+    """Originalnamnet och search_variants i den ordning de ska prövas (inlärd träffandel per variantsort)"""
+    variants = [name] + [v for v in search_variants if v != name]
+    if variant_stats is not None:
+        variants = variant_stats.order(name, variants, correct_scb_name)
+    return variants
+
+
 def search_with_variants(
     company_id: int,
     name: str,
     search_variants: List[str],
-    cert,
     min_score: int,
-    correct_scb_name: Optional[str] = None
-) -> Tuple[Optional[dict], int, str]:
+    correct_scb_name: Optional[str] = None,
+    planner: Optional[QueryPlanner] = None,
+    variant_stats: Optional[VariantStats] = None,
+    early_stop: bool = True
+) -> Tuple[Optional[dict], int, str, bool]:
     """
-    Sök med originalnamn först, sedan prova alla search_variants
-    Returnerar (best_match, score, variant_used)
-
-    Om correct_scb_name finns, prioritera exact match mot det namnet.
+    Sök med varianterna (originalnamn + search_variants) i inlärd ordning
+    Returnerar (best_match, score, variant_used, api_error)
+
+    api_error är True när ingen variant fick ett svar från API:et (alla
+    anrop misslyckades) – företaget är då inte sökt och ska göras om.
+
+    Med early_stop avbryts sökningen så fort en kandidat når företagets
+    dynamic_threshold (eller matchar correct_scb_name), så resterande
+    varianter inte kostar API-anrop. Om correct_scb_name finns, prioritera
+    exact match mot det namnet. Med planner (plan_variant_searches) delas
+    svaren med resten av batchen. Med variant_stats räknas träffar per
+    variantsort, vilket styr ordningen i kommande körningar.
     """
     all_candidates = []
-    variants_to_try = [name] + [v for v in search_variants if v != name]
+    answered = False
+    variants_to_try = ordered_variants(name, search_variants, correct_scb_name, variant_stats)
+    threshold = max(min_score, dynamic_threshold(name, base=min_score))
 
     logger.info(f"  Söker med {len(variants_to_try)} varianter för '{name}'")
 
-    for variant in variants_to_try:
-        api_result = scb_search_api(variant, cert=cert)
+    for tried, variant in enumerate(variants_to_try, 1):
+        api_result = planner.resolve(variant, scb_search_api) if planner is not None else scb_search_api(variant)
 
         if not api_result.ok:
             logger.debug(f"    API-fel för variant '{variant}'")
             continue
-
-        if api_result.data:
-            logger.debug(f"    '{variant}' gav {len(api_result.data)} kandidater")
-            # Tagga varje kandidat med vilken variant som hittade den
-            for candidate in api_result.data:
-                candidate['_search_variant'] = variant
-            all_candidates.extend(api_result.data)
+        answered = True
+
+        # Tagga varje kandidat med vilken variant som hittade den (kopia,
+        # samma svar delas med andra företag och varianter)
+        candidates = [dict(candidate, _search_variant=variant) for candidate in api_result.data]
+        if candidates:
+            logger.debug(f"    '{variant}' gav {len(candidates)} kandidater")
+            all_candidates.extend(candidates)
         else:
             logger.debug(f"    '{variant}' gav inga resultat")
 
+        _, score = find_best_match(name, candidates)
+        if variant_stats is not None:
+            variant_stats.record(variant_kind(name, variant, correct_scb_name), score >= threshold)
+
+        if early_stop and tried < len(variants_to_try):
+            if score >= threshold or (correct_scb_name and find_correct_name_match(correct_scb_name, candidates)[0]):
+                logger.info(f"  Träff med '{variant}', hoppar över {len(variants_to_try) - tried} varianter")
+                break
+
+    if not answered:
+        logger.warning(f"  API-fel för alla {len(variants_to_try)} varianter")
+        return None, 0, "", True
+
     if not all_candidates:
         logger.info(f"  Inga kandidater hittades med någon variant")
-        return None, 0, ""
+        return None, 0, "", False
 
     # Om correct_scb_name finns, försök hitta exact/near-exact match först
     if correct_scb_name:
-        correct_normalized = normalize_company_name(correct_scb_name)
-        for candidate in all_candidates:
-            scb_name = candidate.get("Företagsnamn", "")
-            scb_normalized = normalize_company_name(scb_name)
-
-            # Exact match eller mycket hög likhet
-            exact_score = score_names(correct_normalized, scb_normalized)
-            if exact_score >= 90:  # Mycket hög match mot correct_scb_name
-                variant_used = candidate.get('_search_variant', name)
-                logger.info(f"  Exact match mot correct_scb_name: score={exact_score}, företag='{scb_name}'")
-                return candidate, exact_score, variant_used
+        candidate, exact_score = find_correct_name_match(correct_scb_name, all_candidates)
+        if candidate:
+            variant_used = candidate.get('_search_variant', name)
+            logger.info(f"  Exact match mot correct_scb_name: score={exact_score}, företag='{candidate.get('Företagsnamn', '')}'")
+            return candidate, exact_score, variant_used, False
 
     # Annars hitta bästa match över alla kandidater från alla varianter
     best_match, best_score = find_best_match(name, all_candidates)
@@ -359,9 +319,9 @@ def search_with_variants(
     if best_match:
         variant_used = best_match.get('_search_variant', name)
         logger.info(f"  Bästa match: score={best_score}, variant='{variant_used}', företag='{best_match.get('Företagsnamn', '')}'")
-        return best_match, best_score, variant_used
+        return best_match, best_score, variant_used, False
 
-    return None, 0, ""
+    return None, 0, "", False
 
 
 # ============================================================================
@@ -369,66 +329,27 @@ def search_with_variants(
 # ============================================================================
 
 def save_scb_match(
-    db_path: Path,
+    writer: Optional[MatchWriter],
     company_id: int,
     matched: bool,
     match_score: int,
     scb_data: dict,
-    dry_run: bool
+    dry_run: bool,
+    on_written: Optional[Callable[[], None]] = None
 ) -> None:
     """
-    Spara resultat i separat tabell scb_matches
-    Skapar tabellen om den inte finns
+    Spara resultat i scb_matches och scb_enrichment via MatchWriter
+    (en anslutning, buffrade upserts per company_id). on_written anropas
+    när raden är committad (direkt vid dry run).
     """
     if dry_run:
         city = scb_data.get("PostOrt") or scb_data.get("Postort") or "N/A"
         logger.info(f"DRY RUN: company_id={company_id} matched={matched} score={match_score} city={city}")
+        if on_written is not None:
+            on_written()
         return
 
-    conn = sqlite3.connect(str(db_path))
-    try:
-        cur = conn.cursor()
-
-        # Skapa tabell om den inte finns
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS scb_matches (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                company_id INTEGER NOT NULL,
-                matched INTEGER NOT NULL,
-                score INTEGER,
-                city TEXT,
-                payload TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        # Kolla om matchning redan finns
-        cur.execute("SELECT id FROM scb_matches WHERE company_id = ?", (company_id,))
-        existing = cur.fetchone()
-
-        if existing:
-            logger.info(f"Matchning finns redan för company_id={company_id}, skippar")
-            return
-
-        # Extrahera stad från SCB-data (PostOrt)
-        city = scb_data.get("PostOrt") or None
-
-        # Spara match
-        cur.execute(
-            """INSERT INTO scb_matches
-               (company_id, matched, score, city, payload)
-               VALUES (?, ?, ?, ?, ?)""",
-            (
-                company_id,
-                1 if matched else 0,
-                int(match_score),
-                city,
-                json.dumps(scb_data, ensure_ascii=False)
-            )
-        )
-        conn.commit()
-    finally:
-        conn.close()
+    writer.add(company_id, matched, match_score, scb_data, on_written)
 
 
 # ============================================================================
@@ -448,6 +369,53 @@ def export_issues(rows: List[Dict[str, str]], path: Path) -> None:
 # MAIN
 # ============================================================================
 
+def parse_input_row(row) -> Optional[Tuple[int, str, List[str], Optional[str]]]:
+    """(company_id, name, search_variants, correct_scb_name) från en CSV-rad, eller None"""
+    # Hantera både 'id' och 'original_id' kolumn
+    if 'id' in row:
+        company_id = int(row['id'])
+    elif 'original_id' in row:
+        company_id = int(row['original_id'])
+    else:
+        logger.error(f"Row saknar både 'id' och 'original_id': {row}")
+        return None
+
+    # Hantera både 'name' och 'original_name' kolumn
+    if 'name' in row:
+        name = row['name']
+    elif 'original_name' in row:
+        name = row['original_name']
+    else:
+        logger.error(f"Row saknar både 'name' och 'original_name': {row}")
+        return None
+
+    # Parsa search_variants från CSV (kan vara string eller redan lista)
+    search_variants = []
+    correct_scb_name = None
+
+    if 'search_variants' in row and pd.notna(row['search_variants']):
+        variants_raw = row['search_variants']
+        if isinstance(variants_raw, str):
+            try:
+                search_variants = ast.literal_eval(variants_raw)
+            except (ValueError, SyntaxError):
+                # retry_no_candidates.py skriver varianterna kommaseparerade
+                search_variants = [v.strip() for v in variants_raw.split(',') if v.strip()]
+                if not search_variants:
+                    logger.warning(f"Kunde inte parsa search_variants för id={company_id}")
+        elif isinstance(variants_raw, list):
+            search_variants = variants_raw
+
+    # Kolla om correct_scb_name finns (för exact matching)
+    if 'correct_scb_name' in row and pd.notna(row['correct_scb_name']):
+        correct_scb_name = row['correct_scb_name'].split('(')[0].strip()
+        # Om search_variants är tom, använd correct_scb_name
+        if not search_variants:
+            search_variants = [correct_scb_name]
+
+    return company_id, name, search_variants, correct_scb_name
+
+
 def main(argv: Optional[List[str]] = None) -> int:
     parser = argparse.ArgumentParser(description="Retry SCB-sökning för företag utan kandidater")
     parser.add_argument("--db", default=DEFAULT_DB, help="Sökväg till SQLite-databas")
@@ -458,6 +426,14 @@ def main(argv: Optional[List[str]] = None) -> int:
     parser.add_argument("--issues-csv", type=str, default="../results/retry_scb_issues.csv", help="Exportera problemfall")
     parser.add_argument("--verbose", action="store_true", help="Mer loggning")
     parser.add_argument("--limit", type=int, default=None, help="Max antal företag att köra")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Max samtidiga API-anrop (>1: asynkron förhämtning av första varianten per företag, kräver aiohttp)")
+    parser.add_argument("--rate", type=float, default=SCB.rate_control.rate,
+                        help="Start-takt i API-anrop per sekund (anpassas efter SCB:s svar; api_rate i config.ini)")
+    parser.add_argument("--all-variants", action="store_true",
+                        help="Try every variant before ranking instead of stopping at the first match above threshold")
+    parser.add_argument("--resume", metavar="RUN_ID", default=None,
+                        help="Continue an interrupted run from the run journal (skips completed companies)")
 
     args = parser.parse_args(argv)
 
@@ -466,12 +442,15 @@ def main(argv: Optional[List[str]] = None) -> int:
 
     # Validera cert
     cert = None
-    if args.cert:
+    if args.cert and CONFIG.requires_cert:     # Lokal stand-in över http (api_url) kräver inget cert
         if "," in args.cert:
             cert = tuple(s.strip() for s in args.cert.split(",", 1))
         else:
             cert = args.cert
         cert = validate_cert(cert)
+    SCB.cert = cert
+    if args.rate != SCB.rate_control.rate:
+        SCB.rate_control.set_rate(args.rate)
 
     # Validera DB
     db_path = validate_db_path(args.db)
@@ -486,94 +465,102 @@ def main(argv: Optional[List[str]] = None) -> int:
     logger.info(f"Startar körning på {len(df)} företag")
     logger.info(f"Dry-run: {args.dry_run}")
 
-    # Statistik
-    issues: List[Dict[str, str]] = []
-    updated, low_score, not_found, api_errors = 0, 0, 0, 0
-
-    for idx, row in df.iterrows():
-        # Hantera både 'id' och 'original_id' kolumn
-        if 'id' in row:
-            company_id = int(row['id'])
-        elif 'original_id' in row:
-            company_id = int(row['original_id'])
-        else:
-            logger.error(f"Row saknar både 'id' och 'original_id': {row}")
-            continue
+    rows = [(idx, parse_input_row(row)) for idx, row in df.iterrows()]
 
-        # Hantera både 'name' och 'original_name' kolumn
-        if 'name' in row:
-            name = row['name']
-        elif 'original_name' in row:
-            name = row['original_name']
-        else:
-            logger.error(f"Row saknar både 'name' och 'original_name': {row}")
-            continue
-
-        # Parsa search_variants från CSV (kan vara string eller redan lista)
-        search_variants = []
-        correct_scb_name = None
+    # Körjournal: varje företag skrivs direkt, så en avbruten körning kan
+    # fortsätta med --resume utan att göra om redan betalda API-anrop
+    try:
+        journal = open_run_journal("retry_scb_search", vars(args), resume=args.resume, path=CONFIG.journal_path,
+                                   match_keys=RESUME_MATCH_KEYS)
+    except ValueError as e:
+        logger.error(str(e))
+        return 1
+    done = journal.completed()
+    rows = [(idx, parsed) for idx, parsed in rows if parsed and str(parsed[0]) not in done]
+    if args.resume:
+        logger.info(f"Återupptar {journal.run_id}: {len(done)} klara, {len(rows)} kvar")
+    else:
+        logger.info(f"Körnings-id: {journal.run_id} (fortsätt en avbruten körning med --resume {journal.run_id})")
+
+    # Första varianten per företag (alla med --all-variants) planeras och söks
+    # i förväg för hela batchen (parallellt med --concurrency > 1). Resten söks
+    # bara för företag som ännu inte fått en match.
+    variant_stats = open_variant_stats(SCB.cache)
+    variants = []
+    for _, (_, name, search_variants, correct_scb_name) in rows:
+        ordered = ordered_variants(name, search_variants, correct_scb_name, variant_stats)
+        variants.extend(ordered if args.all_variants else ordered[:1])
+
+    # Matchningar buffras och skrivs i batchar (scb_matches + scb_enrichment)
+    writer = None if args.dry_run else MatchWriter(db_path)
+    planner, interrupted = None, False
+    try:
+        planner = plan_variant_searches(variants, args.concurrency)
+        for idx, parsed in rows:
+            company_id, name, search_variants, correct_scb_name = parsed
+
+            logger.info(f"\n[{idx+1}/{len(df)}] Söker: id={company_id} name='{name}'")
+            if correct_scb_name:
+                logger.info(f"  Correct SCB name: '{correct_scb_name}'")
+
+            # Sök med alla varianter
+            match, score, variant_used, api_error = search_with_variants(
+                company_id, name, search_variants, args.min_score, correct_scb_name,
+                planner, variant_stats, early_stop=not args.all_variants
+            )
 
-        if 'search_variants' in row and pd.notna(row['search_variants']):
-            variants_raw = row['search_variants']
-            if isinstance(variants_raw, str):
-                try:
-                    search_variants = ast.literal_eval(variants_raw)
-                except (ValueError, SyntaxError):
-                    logger.warning(f"Kunde inte parsa search_variants för id={company_id}")
-                    search_variants = []
-            elif isinstance(variants_raw, list):
-                search_variants = variants_raw
-
-        # Kolla om correct_scb_name finns (för exact matching)
-        if 'correct_scb_name' in row and pd.notna(row['correct_scb_name']):
-            correct_scb_name = row['correct_scb_name'].split('(')[0].strip()
-            # Om search_variants är tom, använd correct_scb_name
-            if not search_variants:
-                search_variants = [correct_scb_name]
-
-        logger.info(f"\n[{idx+1}/{len(df)}] Söker: id={company_id} name='{name}'")
-        if correct_scb_name:
-            logger.info(f"  Correct SCB name: '{correct_scb_name}'")
-
-        # Sök med alla varianter
-        match, score, variant_used = search_with_variants(
-            company_id, name, search_variants, cert, args.min_score, correct_scb_name
-        )
-
-        threshold = max(args.min_score, dynamic_threshold(name, base=args.min_score))
-
-        if match and score >= threshold:
-            updated += 1
-            matched_name = match.get("Företagsnamn", "")
-            city = match.get("PostOrt", "")
-            logger.info(f"✓ [MATCH] id={company_id} score={score} variant='{variant_used}' -> '{matched_name}' ({city})")
-            save_scb_match(db_path, company_id, True, score, match, dry_run=args.dry_run)
-        elif match:
-            low_score += 1
-            cand_name = match.get("Företagsnamn", "")
-            post_ort = match.get("PostOrt", "")
-            logger.info(f"⚠ [LOW SCORE] id={company_id} score={score} thresh={threshold} '{name}' best='{cand_name}'")
-            issues.append({
+            threshold = max(args.min_score, dynamic_threshold(name, base=args.min_score))
+            issue = {
                 "id": str(company_id),
                 "name": name,
-                "reason": "low_score",
-                "score": str(score),
-                "best_candidate": cand_name,
-                "PostOrt": post_ort,
+                "score": str(score) if match else "",
+                "best_candidate": (match or {}).get("Företagsnamn", ""),
+                "PostOrt": (match or {}).get("PostOrt", ""),
                 "variant_used": variant_used,
-            })
-        else:
-            not_found += 1
-            logger.info(f"✗ [NO CANDIDATES] id={company_id} name='{name}'")
-            issues.append({
-                "id": str(company_id),
-                "name": name,
-                "reason": "no_candidates",
-                "score": "",
-                "best_candidate": "",
-                "PostOrt": "",
-                "variant_used": "",
-            })
+            }
+
+            full = SCB.full_record(match) if match and score >= threshold else None
+            if full is not None and not full.ok:
+                # Lokala registrets post kunde inte kompletteras – görs om vid --resume
+                logger.info(f"✗ [API ERROR] id={company_id} full post för '{issue['best_candidate']}' status={full.status_code}")
+                issue["reason"] = "api_error"
+            elif full is not None and not full.data:
+                logger.info(f"✗ [NOT IN API] id={company_id} org.nr {match.get('OrgNr', '')} saknas i SCB API")
+                issue["reason"] = "not_in_api"
+            elif full is not None:
+                # Lokala registret har bara bulk-fälten: full_record() gav hela posten på org.nr
+                match = full.data[0]
+                logger.info(f"✓ [MATCH] id={company_id} score={score} variant='{variant_used}' -> '{issue['best_candidate']}' ({issue['PostOrt']})")
+                issue["reason"] = "match"
+                # Journalen markerar företaget klart först när matchningen är skriven
+                save_scb_match(writer, company_id, True, score, match, dry_run=args.dry_run,
+                               on_written=partial(journal.record, company_id, "match",
+                                                  search_key(variant_used or name), issue))
+                continue
+            elif match:
+                logger.info(f"⚠ [LOW SCORE] id={company_id} score={score} thresh={threshold} '{name}' best='{issue['best_candidate']}'")
+                issue["reason"] = "low_score"
+            elif api_error:
+                logger.info(f"✗ [API ERROR] id={company_id} name='{name}' (görs om vid --resume)")
+                issue["reason"] = "api_error"
+            else:
+                logger.info(f"✗ [NO CANDIDATES] id={company_id} name='{name}'")
+                issue["reason"] = "no_candidates"
+            journal.record(company_id, issue["reason"], search_key(variant_used or name), issue)
+    except KeyboardInterrupt:
+        interrupted = True
+        logger.warning(f"Avbruten – fortsätt med: --resume {journal.run_id}")
+    finally:
+        if writer is not None:
+            writer.close()
+
+    # Problemfall och statistik byggs från journalen (hela körningen, även före --resume)
+    issues = [entry["record"] for entry in journal.entries() if entry["outcome"] != "match"]
+    counts = journal.counts()
+    if not interrupted:
+        journal.finish()
+    journal.record_rates(SCB.rate_control.history)
+    journal.close()
 
     # Exportera problemfall
     issues_path = Path(args.issues_csv).expanduser().resolve()
@@ -583,13 +570,19 @@ def main(argv: Optional[List[str]] = None) -> int:
 
     logger.info(f"")
     logger.info(f"=== SLUTSTATISTIK ===")
-    logger.info(f"Uppdaterade: {updated}")
-    logger.info(f"Låg score: {low_score}")
-    logger.info(f"Inget resultat: {not_found}")
-    logger.info(f"API-fel: {api_errors}")
+    logger.info(f"Uppdaterade: {counts.get('match', 0)}")
+    logger.info(f"Låg score: {counts.get('low_score', 0)}")
+    logger.info(f"Inget resultat: {counts.get('no_candidates', 0)}")
+    logger.info(f"API-fel: {counts.get('api_error', 0)}")
     logger.info(f"Total: {len(df)}")
-
-    return 0
+    if planner is not None:
+        logger.info(planner.summary())
+    if variant_stats is not None:
+        logger.info(f"Träffandel per variantsort:\n{variant_stats.summary()}")
+        variant_stats.close()
+    logger.info(SCB.summary())
+
+    return 130 if interrupted else 0
 
 
 if __name__ == "__main__":
@@ -15,7 +15,6 @@ Förbättringar från V1:
 from __future__ import annotations
 
 import argparse
-import configparser
 import csv
 import json
 import logging
@@ -24,19 +23,22 @@ import re
 import sqlite3
 import sys
 import time
-from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 
 try:
     from fuzzywuzzy import fuzz
 except ImportError as e:
     raise SystemExit("Saknar 'fuzzywuzzy'. Installera: pip install fuzzywuzzy python-Levenshtein --break-system-packages") from e
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from scb_client.client import ApiResult, open_client, search_key
+from scb_client.config import load_config
+from scb_client.match_writer import MatchWriter
+from scb_client.run_journal import open_run_journal
+
 
 # ============================================================================
 # KONFIGURATION
@@ -49,35 +51,21 @@ handler.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(message)
 logger.addHandler(handler)
 logger.setLevel(logging.INFO)
 
-def load_config():
-    """Load configuration from config.ini or use defaults"""
-    config = configparser.ConfigParser()
-    config_path = Path(__file__).parent.parent / "config.ini"
-
-    # Defaults (used if config.ini doesn't exist)
-    default_db = "../ai_companies.db"
-    default_cert = "../../SCB/certifikat/Certifikat_SokPaVar_A00592_2025-10-29_09-27-36Z.pem"
+CONFIG_PATH = Path(__file__).parent.parent / "config.ini"
+CONFIG = load_config(
+    [CONFIG_PATH],
+    default_db="../ai_companies.db",
+    default_cert="../../SCB/certifikat/Certifikat_SokPaVar_A00592_2025-10-29_09-27-36Z.pem",
+)
+if CONFIG.config_path is None:
+    logger.warning(f"Config file not found at {CONFIG_PATH}, using defaults")
 
-    if config_path.exists():
-        config.read(config_path)
-        db_path = config.get('SCB', 'database_path', fallback=default_db)
-        cert_path = config.get('SCB', 'cert_path', fallback=default_cert)
-    else:
-        logger.warning(f"Config file not found at {config_path}, using defaults")
-        db_path = default_db
-        cert_path = default_cert
-
-    return db_path, cert_path
-
-DEFAULT_DB, DEFAULT_CERT = load_config()
-API_URL = "https://privateapi.scb.se/nv0101/v1/sokpavar/api/je/HamtaForetag"
-TIMEOUT_SEC = 30
-RATE_LIMIT_DELAY = 0.5
-MAX_TOTAL_RETRIES = 5
-BACKOFF_FACTOR = 0.5
-STATUS_FORCELIST = (429, 500, 502, 503, 504)
+DEFAULT_DB, DEFAULT_CERT = CONFIG.db_path, CONFIG.cert_path
 BASE_FUZZY_THRESHOLD = 85
 
+# Argument som måste vara samma vid --resume (annars blandas resultat från olika körningar)
+RESUME_MATCH_KEYS = ('db', 'limit', 'min_score', 'only_type', 'dry_run')
+
 
 # ============================================================================
 # PATH VALIDATION
@@ -107,24 +95,12 @@ def validate_cert(cert: Optional[str | Tuple[str,str]]) -> Optional[str | Tuple[
 
 
 # ============================================================================
-# SESSION MED RETRY-LOGIK
+# SCB-KLIENT (scb_client: keep-alive, retry/backoff, lokalt register, API-cache)
 # ============================================================================
 
-def make_session() -> requests.Session:
-    s = requests.Session()
-    retry = Retry(
-        total=MAX_TOTAL_RETRIES,
-        backoff_factor=BACKOFF_FACTOR,
-        status_forcelist=STATUS_FORCELIST,
-        respect_retry_after_header=True,
-        raise_on_status=False,
-    )
-    s.mount("https://", HTTPAdapter(max_retries=retry))
-    s.mount("http://", HTTPAdapter(max_retries=retry))
-    return s
-
-SESSION = make_session()
-_query_cache: Dict[str, List[dict]] = {}
+SCB = open_client(CONFIG)   # Certifikatet från --cert sätts i main()
+SCB.on('response', lambda payload, status, elapsed:
+       logger.debug(f"API {status} på {elapsed:.2f}s: {payload['variabler'][0]['Varde1']}"))
 
 
 # ============================================================================
@@ -188,96 +164,22 @@ def dynamic_threshold(raw_name: str, base: int = BASE_FUZZY_THRESHOLD) -> int:
 # API-KOMMUNIKATION
 # ============================================================================
 
-@dataclass
-class ApiResult:
-    ok: bool
-    data: List[dict]
-    status_code: int
-    error: Optional[str] = None
+def scb_search_api(company_name: str) -> ApiResult:
+    """Sök företag i SCB (minne, lokalt register, API-cache, sist API:et)"""
+    return SCB.search(company_name)
 
-def scb_search_api(company_name: str, cert) -> ApiResult:
-    """Sök företag i SCB API med robust error handling"""
-    
-    # Cache-nyckel
-    cache_key = normalize_company_name(company_name)
-    if cache_key in _query_cache:
-        logger.debug(f"Cache hit för '{company_name}'")
-        return ApiResult(True, _query_cache[cache_key], 200)
-    
-    # SCB:s faktiska payload-format
-    payload = {
-        "Företagsstatus": "1",  # Verksamma företag
-        "Registreringsstatus": "1",  # Registrerade företag
-        "variabler": [
-            {
-                "Varde1": company_name,
-                "Varde2": "",
-                "Operator": "Innehaller",  # Innehåller namnet
-                "Variabel": "Namn"
-            }
-        ]
-    }
-    
-    logger.debug(f"API Request: {API_URL}")
-    logger.debug(f"Payload: {payload}")
-    logger.debug(f"Cert: {cert}")
-    
-    delay = RATE_LIMIT_DELAY
-    
-    for attempt in range(MAX_TOTAL_RETRIES):
-        try:
-            resp = SESSION.post(
-                API_URL,
-                json=payload,
-                cert=cert,
-                timeout=TIMEOUT_SEC
-            )
-            logger.debug(f"Response status: {resp.status_code}")
-            if resp.status_code != 200:
-                logger.debug(f"Response headers: {dict(resp.headers)}")
-                logger.debug(f"Response body (first 500 chars): {resp.text[:500]}")
-        except requests.RequestException as e:
-            logger.warning(f"Nätverksfel (försök {attempt+1}/{MAX_TOTAL_RETRIES}): {e}")
-            time.sleep(delay)
-            delay *= (1.5 + BACKOFF_FACTOR)
-            continue
-        
-        # Hantera rate limiting
-        if resp.status_code == 429:
-            retry_after = float(resp.headers.get("Retry-After", "1.0"))
-            wait = max(delay, retry_after)
-            logger.info(f"Rate-limited (429). Väntar {wait:.2f}s...")
-            time.sleep(wait)
-            delay *= (1.5 + BACKOFF_FACTOR)
-            continue
-        
-        # Hantera server errors
-        if resp.status_code >= 500:
-            logger.warning(f"Serverfel {resp.status_code} (försök {attempt+1})")
-            time.sleep(delay)
-            delay *= (1.5 + BACKOFF_FACTOR)
-            continue
-        
-        # Parse response
-        try:
-            data = resp.json()
-        except ValueError:
-            logger.error("Icke-JSON svar från API")
-            return ApiResult(False, [], resp.status_code, "Non-JSON response")
-        
-        # SCB returnerar direkt en lista, inte {"value": [...]}
-        result_data = []
-        if isinstance(data, list):
-            result_data = data
-        elif isinstance(data, dict):
-            # Fallback om de ändrar format
-            result_data = data.get('value', [])
-        
-        _query_cache[cache_key] = result_data
-        time.sleep(RATE_LIMIT_DELAY)
-        return ApiResult(True, result_data, resp.status_code)
-    
-    return ApiResult(False, [], 599, "Max retries exceeded")
+def prefetch_searches(names: List[str], concurrency: int) -> None:
+    """
+    Hämta alla sökningar som inte kan besvaras lokalt samtidigt (asyncio,
+    adaptiv takt, högst `concurrency` samtidiga), så att huvudloopen sedan
+    inte väntar på nätet. Misslyckade sökningar görs om sekventiellt.
+    """
+    start = time.time()
+    fetched, failed, stats = SCB.prefetch(names, concurrency)
+    if fetched:
+        logger.info(f"Förhämtade {fetched} sökningar på {time.time() - start:.1f}s "
+                    f"(max {concurrency} samtidiga): {stats['rate_limited']} rate-limited "
+                    f"(takt nu {stats['rate']:.2f}/s), {failed} misslyckade")
 
 
 # ============================================================================
@@ -341,58 +243,27 @@ def get_companies_without_location(
         conn.close()
 
 def save_scb_match(
-    db_path: Path, 
-    company_id: int, 
-    matched: bool, 
-    match_score: int, 
-    scb_data: dict, 
-    dry_run: bool
+    writer: Optional[MatchWriter],
+    company_id: int,
+    matched: bool,
+    match_score: int,
+    scb_data: dict,
+    dry_run: bool,
+    on_written: Optional[Callable[[], None]] = None
 ) -> None:
     """
-    Spara resultat i separat tabell scb_matches
-    Skapar tabellen om den inte finns
+    Spara resultat i scb_matches och scb_enrichment via MatchWriter
+    (en anslutning, buffrade upserts per company_id). on_written anropas
+    när raden är committad (direkt vid dry run).
     """
     if dry_run:
         city = scb_data.get("PostOrt") or scb_data.get("Postort") or "N/A"
         logger.info(f"DRY RUN: company_id={company_id} matched={matched} score={match_score} city={city}")
+        if on_written is not None:
+            on_written()
         return
-    
-    conn = sqlite3.connect(str(db_path))
-    try:
-        cur = conn.cursor()
-        
-        # Skapa tabell om den inte finns
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS scb_matches (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                company_id INTEGER NOT NULL,
-                matched INTEGER NOT NULL,
-                score INTEGER,
-                city TEXT,
-                payload TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Extrahera stad från SCB-data (PostOrt)
-        city = scb_data.get("PostOrt") or None
-        
-        # Spara match
-        cur.execute(
-            """INSERT INTO scb_matches 
-               (company_id, matched, score, city, payload) 
-               VALUES (?, ?, ?, ?, ?)""",
-            (
-                company_id, 
-                1 if matched else 0, 
-                int(match_score),
-                city,
-                json.dumps(scb_data, ensure_ascii=False)
-            )
-        )
-        conn.commit()
-    finally:
-        conn.close()
+
+    writer.add(company_id, matched, match_score, scb_data, on_written)
 
 
 # ============================================================================
@@ -423,6 +294,12 @@ def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
     p.add_argument("--dry-run", action="store_true", help="Skriv inte till DB")
     p.add_argument("--issues-csv", type=str, default="scb_issues.csv", help="Exportera problemfall")
     p.add_argument("--verbose", action="store_true", help="Mer loggning")
+    p.add_argument("--concurrency", type=int, default=1,
+                   help="Max samtidiga API-anrop (>1: asynkron förhämtning, kräver aiohttp)")
+    p.add_argument("--rate", type=float, default=SCB.rate_control.rate,
+                   help="Start-takt i API-anrop per sekund (anpassas efter SCB:s svar; api_rate i config.ini)")
+    p.add_argument("--resume", metavar="RUN_ID", default=None,
+                   help="Continue an interrupted run from the run journal (skips completed companies)")
     return p.parse_args(argv)
 
 
@@ -438,12 +315,15 @@ def main(argv: Optional[List[str]] = None) -> int:
     
     # Validera cert
     cert = None
-    if args.cert:
+    if args.cert and CONFIG.requires_cert:     # Lokal stand-in över http (api_url) kräver inget cert
         if "," in args.cert:
             cert = tuple(s.strip() for s in args.cert.split(",", 1))
         else:
             cert = args.cert
         cert = validate_cert(cert)
+    SCB.cert = cert
+    if args.rate != SCB.rate_control.rate:
+        SCB.rate_control.set_rate(args.rate)
     
     # Validera DB
     db_path = validate_db_path(args.db)
@@ -456,63 +336,90 @@ def main(argv: Optional[List[str]] = None) -> int:
     logger.info(f"Dry-run: {args.dry_run}")
     logger.info(f"Typer: {only_types or 'alla'}")
     
-    # Statistik
-    issues: List[Dict[str, str]] = []
-    updated, low_score, not_found, api_errors = 0, 0, 0, 0
+    # Körjournal: varje företag skrivs direkt, så en avbruten körning kan
+    # fortsätta med --resume utan att göra om redan betalda API-anrop
+    try:
+        journal = open_run_journal("scb_integration_v2", vars(args), resume=args.resume, path=CONFIG.journal_path,
+                                   match_keys=RESUME_MATCH_KEYS)
+    except ValueError as e:
+        logger.error(str(e))
+        return 1
+    done = journal.completed()
+    total = len(companies)
+    companies = [(company_id, name) for company_id, name in companies if str(company_id) not in done]
+    if args.resume:
+        logger.info(f"Återupptar {journal.run_id}: {len(done)} klara, {len(companies)} kvar")
+    else:
+        logger.info(f"Körnings-id: {journal.run_id} (fortsätt en avbruten körning med --resume {journal.run_id})")
+    
+    # Alla sökningar hämtas parallellt i förväg (--concurrency > 1)
+    if args.concurrency > 1:
+        prefetch_searches([name for _, name in companies], args.concurrency)
     
-    for company_id, name in companies:
-        # Sök i SCB
-        api_result = scb_search_api(name, cert=cert)
-        
-        if not api_result.ok:
-            api_errors += 1
-            logger.error(f"[API ERROR] id={company_id} name='{name}' status={api_result.status_code}")
-            issues.append({
-                "id": str(company_id),
-                "name": name,
-                "reason": f"api_error_{api_result.status_code}",
-                "score": "",
-                "best_candidate": "",
-                "PostOrt": "",
-            })
-            continue
-        
-        if not api_result.data:
-            not_found += 1
-            logger.info(f"[NO DATA] id={company_id} name='{name}'")
-            issues.append({
-                "id": str(company_id),
-                "name": name,
-                "reason": "no_candidates",
-                "score": "",
-                "best_candidate": "",
-                "PostOrt": "",
-            })
-            continue
-        
-        # Hitta bästa match
-        match, score = find_best_match(name, api_result.data)
-        threshold = max(args.min_score, dynamic_threshold(name, base=args.min_score))
-        
-        if match and score >= threshold:
-            updated += 1
-            matched_name = match.get("Företagsnamn", "")
-            city = match.get("PostOrt", "")
-            logger.info(f"[MATCH] id={company_id} score={score} '{name}' -> '{matched_name}' ({city})")
-            save_scb_match(db_path, company_id, True, score, match, dry_run=args.dry_run)
-        else:
-            low_score += 1
-            cand_name = (match or {}).get("Företagsnamn", "")
-            post_ort = (match or {}).get("PostOrt", "")
-            logger.info(f"[LOW SCORE] id={company_id} score={score} thresh={threshold} '{name}' best='{cand_name}'")
-            issues.append({
-                "id": str(company_id),
-                "name": name,
-                "reason": "low_score",
-                "score": str(score),
-                "best_candidate": cand_name,
-                "PostOrt": post_ort,
-            })
+    # Matchningar buffras och skrivs i batchar (scb_matches + scb_enrichment)
+    writer = None if args.dry_run else MatchWriter(db_path)
+    interrupted = False
+    try:
+        for company_id, name in companies:
+            # Sök i SCB
+            api_result = scb_search_api(name)
+            issue = {"id": str(company_id), "name": name, "score": "", "best_candidate": "", "PostOrt": ""}
+            
+            if not api_result.ok:
+                logger.error(f"[API ERROR] id={company_id} name='{name}' status={api_result.status_code}")
+                issue["reason"] = f"api_error_{api_result.status_code}"
+                journal.record(company_id, "api_error", search_key(name), issue)
+                continue
+            
+            if not api_result.data:
+                logger.info(f"[NO DATA] id={company_id} name='{name}'")
+                issue["reason"] = "no_candidates"
+                journal.record(company_id, "no_candidates", search_key(name), issue)
+                continue
+            
+            # Hitta bästa match
+            match, score = find_best_match(name, api_result.data)
+            threshold = max(args.min_score, dynamic_threshold(name, base=args.min_score))
+            issue.update(score=str(score), best_candidate=(match or {}).get("Företagsnamn", ""),
+                         PostOrt=(match or {}).get("PostOrt", ""))
+            
+            if match and score >= threshold:
+                # Lokala registret har bara bulk-fälten: hämta hela posten på org.nr
+                full = SCB.full_record(match)
+                if not full.ok:
+                    logger.error(f"[API ERROR] id={company_id} name='{name}' status={full.status_code} (full post)")
+                    issue["reason"] = f"api_error_{full.status_code}"
+                    journal.record(company_id, "api_error", search_key(name), issue)
+                    continue
+                if not full.data:
+                    logger.warning(f"[NOT IN API] id={company_id} org.nr {match.get('OrgNr', '')} saknas i SCB API")
+                    issue["reason"] = "not_in_api"
+                    journal.record(company_id, "not_in_api", search_key(name), issue)
+                    continue
+                match = full.data[0]
+                logger.info(f"[MATCH] id={company_id} score={score} '{name}' -> '{issue['best_candidate']}' ({issue['PostOrt']})")
+                issue["reason"] = "match"
+                # Journalen markerar företaget klart först när matchningen är skriven
+                save_scb_match(writer, company_id, True, score, match, dry_run=args.dry_run,
+                               on_written=partial(journal.record, company_id, "match", search_key(name), issue))
+            else:
+                logger.info(f"[LOW SCORE] id={company_id} score={score} thresh={threshold} '{name}' best='{issue['best_candidate']}'")
+                issue["reason"] = "low_score"
+                journal.record(company_id, "low_score", search_key(name), issue)
+    except KeyboardInterrupt:
+        interrupted = True
+        logger.warning(f"Avbruten – fortsätt med: --resume {journal.run_id}")
+    finally:
+        if writer is not None:
+            writer.close()
+    
+    # Problemfall och statistik byggs från journalen (hela körningen, även före --resume)
+    issues = [entry["record"] for entry in journal.entries() if entry["outcome"] != "match"]
+    counts = journal.counts()
+    if not interrupted:
+        journal.finish()
+    journal.record_rates(SCB.rate_control.history)
+    journal.close()
     
     # Exportera problemfall
     issues_path = Path(args.issues_csv).expanduser().resolve()
@@ -522,13 +429,14 @@ def main(argv: Optional[List[str]] = None) -> int:
     
     logger.info(f"")
     logger.info(f"=== SLUTSTATISTIK ===")
-    logger.info(f"Uppdaterade: {updated}")
-    logger.info(f"Låg score: {low_score}")
-    logger.info(f"Inget resultat: {not_found}")
-    logger.info(f"API-fel: {api_errors}")
-    logger.info(f"Total: {len(companies)}")
+    logger.info(f"Uppdaterade: {counts.get('match', 0)}")
+    logger.info(f"Låg score: {counts.get('low_score', 0)}")
+    logger.info(f"Inget resultat: {counts.get('no_candidates', 0)}")
+    logger.info(f"API-fel: {counts.get('api_error', 0)}")
+    logger.info(f"Total: {total}")
+    logger.info(SCB.summary())
     
-    return 0
+    return 130 if interrupted else 0
 
 
 if __name__ == "__main__":
@@ -11,19 +11,39 @@ Användning:
     python3 scripts/scrape_company_websites.py
     python3 scripts/scrape_company_websites.py --limit 10  # Testa på 10 företag först
     python3 scripts/scrape_company_websites.py --missing-only  # Bara företag utan description
+    python3 scripts/scrape_company_websites.py --concurrency 32 --delay 2
+
+Hemsidorna hämtas parallellt (web_scraper.PoliteFetcher): --concurrency
+samtidiga hämtningar totalt, --delay sekunder mellan anrop till samma värd.
+Resultaten skrivs till CSV:n löpande, i den ordning de blir klara.
+
+Sidor som servern märker med ETag/Last-Modified sparas i en HTTP-cache
+(web_scraper.PageCache, standard databases/scrape_cache.db). Nästa körning
+frågar villkorligt och återanvänder sparad text när svaret är 304.
+
+Rå-HTML sparas zstd-komprimerad i ett innehållsadresserat lager
+(web_scraper.HtmlStore, standard databases/scrape_html.db). Med --reextract
+körs extraktionen om över lagret – parallellt på alla kärnor, utan nätverk:
+    python3 scripts/scrape_company_websites.py --reextract --max-chars 8000
 """
 
 import sqlite3
 import requests
 import csv
 from datetime import datetime
-from bs4 import BeautifulSoup
 import argparse
+import os
 import sys
 import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from urllib.parse import urlparse
-import re
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from web_scraper.fetcher import DEFAULT_CONCURRENCY, PoliteFetcher
+from web_scraper import html_store
+from web_scraper.extract import BACKENDS, MAX_TEXT_CHARS, extract_page, resolve_backend
+from web_scraper.http_cache import DEFAULT_CACHE_PATH, PageCache, open_page_cache
 
 # Timeout för HTTP requests
 HTTP_TIMEOUT = 15
@@ -40,70 +60,17 @@ HEADERS = {
 }
 
 
-def clean_text(text):
-    """
-    Rensa och normalisera text.
-    """
-    # Ta bort extra whitespace
-    text = re.sub(r'\s+', ' ', text)
-    # Ta bort extra newlines
-    text = re.sub(r'\n+', '\n', text)
-    return text.strip()
-
-
-def extract_meta_description(soup):
-    """
-    Försök hämta meta description från HTML.
-    """
-    meta_tags = [
-        soup.find('meta', attrs={'name': 'description'}),
-        soup.find('meta', attrs={'property': 'og:description'}),
-        soup.find('meta', attrs={'name': 'twitter:description'})
-    ]
-
-    for tag in meta_tags:
-        if tag and tag.get('content'):
-            return clean_text(tag.get('content'))
-
-    return None
-
-
-def extract_main_content(soup):
-    """
-    Extrahera huvudinnehåll från HTML.
-    Försöker hitta huvudtext och undvika navigation, footer, etc.
-    """
-    # Ta bort script, style, nav, footer
-    for tag in soup(['script', 'style', 'nav', 'footer', 'header', 'aside', 'iframe', 'noscript']):
-        tag.decompose()
-
-    # Prioritera main-taggar eller article-taggar
-    main_content = soup.find('main') or soup.find('article')
-
-    if main_content:
-        text = main_content.get_text(separator=' ', strip=True)
-    else:
-        # Fallback: ta allt från body
-        body = soup.find('body')
-        if body:
-            text = body.get_text(separator=' ', strip=True)
-        else:
-            text = soup.get_text(separator=' ', strip=True)
-
-    # Rensa texten
-    text = clean_text(text)
-
-    # Begränsa till rimlig längd (max 5000 tecken)
-    if len(text) > 5000:
-        text = text[:5000] + '...'
-
-    return text
-
-
-def scrape_website(url, company_name):
+def scrape_website(url, company_name, get=None, log=print, cache=None, store=None,
+                   max_chars=MAX_TEXT_CHARS, backend=None):
     """
     Skrapa text från en hemsida.
 
+    get: funktion (url, headers=...) -> response (t.ex. PoliteFetcher.get); None = requests.get
+    log: utskrifter (main samlar raderna per företag så trådarna inte blandas)
+    cache: PageCache – villkorlig GET, och sparad text återanvänds vid 304
+    store: HtmlStore – rå-HTML för lyckade svar sparas för --reextract
+    backend: HTML-parser för extraktionen (web_scraper.extract); None = snabbaste installerade
+
     Returns:
         dict: {
             'scraped_text': str,
@@ -112,7 +79,32 @@ def scrape_website(url, company_name):
             'status_code': int or None
         }
     """
-    print(f"\n🌐 Skrapar: {url}")
+    if get is None:
+        def get(target, headers=None):
+            return requests.get(target, headers={**HEADERS, **(headers or {})},
+                                timeout=HTTP_TIMEOUT, allow_redirects=True)
+
+    def fetch(target):
+        """GET, villkorlig om cachen har target. Ger (response, cachad post om servern svarade 304)."""
+        entry = cache.lookup(target) if cache is not None else None
+        if entry and store is not None and store.hash_for(target) is None:
+            entry = None    # Hämta hela sidan en gång så den hamnar i HTML-lagret
+        response = get(target, headers=PageCache.conditional_headers(entry))
+        if entry and response.status_code == 304:
+            cache.hit(target)
+            return response, entry
+        if cache is not None:
+            cache.miss(entry)
+        return response, None
+
+    def reuse(entry):
+        result['scraped_text'] = entry['scraped_text']
+        result['meta_description'] = entry['meta_description']
+        result['status'] = entry['status']
+        result['status_code'] = entry['status_code']    # Sidans ursprungliga kod, inte 304
+        log(f"   ✓ Oförändrad sedan förra körningen (304) – återanvänder sparad text")
+
+    log(f"🌐 Skrapar: {url}")
 
     # Säkerställ att URL har protokoll
     if not url.startswith(('http://', 'https://')):
@@ -127,87 +119,139 @@ def scrape_website(url, company_name):
 
     try:
         # Försök först med HTTPS
-        response = requests.get(
-            url,
-            headers=HEADERS,
-            timeout=HTTP_TIMEOUT,
-            allow_redirects=True
-        )
+        response, cached = fetch(url)
 
         result['status_code'] = response.status_code
 
-        if response.status_code == 200:
-            # Parse HTML
-            soup = BeautifulSoup(response.content, 'html.parser')
+        if cached:
+            reuse(cached)
 
-            # Hämta meta description
-            meta_desc = extract_meta_description(soup)
-            result['meta_description'] = meta_desc
+        elif response.status_code == 200:
+            if store is not None:
+                store.put(url, response.content, response.status_code, response.headers.get('Content-Type'))
 
-            # Hämta huvudinnehåll
-            main_text = extract_main_content(soup)
+            # Parse HTML: meta description och huvudinnehåll
+            meta_desc, main_text = extract_page(response.content, max_chars, backend)
+            result['meta_description'] = meta_desc
             result['scraped_text'] = main_text
 
             if main_text:
                 word_count = len(main_text.split())
-                print(f"   ✓ Lyckades! Skrapade {word_count} ord")
+                log(f"   ✓ Lyckades! Skrapade {word_count} ord")
                 if meta_desc:
-                    print(f"   ✓ Meta description: {meta_desc[:80]}...")
+                    log(f"   ✓ Meta description: {meta_desc[:80]}...")
                 result['status'] = 'success'
+                if cache is not None:
+                    cache.store(url, response, result)
             else:
-                print(f"   ⚠ Lyckades besöka men ingen text hittades")
+                log(f"   ⚠ Lyckades besöka men ingen text hittades")
                 result['status'] = 'no_content'
 
         elif response.status_code == 403:
-            print(f"   ✗ Åtkomst nekad (403 Forbidden)")
+            log(f"   ✗ Åtkomst nekad (403 Forbidden)")
             result['status'] = 'forbidden'
 
         elif response.status_code == 404:
-            print(f"   ✗ Sidan hittades inte (404)")
+            log(f"   ✗ Sidan hittades inte (404)")
             result['status'] = 'not_found'
 
         else:
-            print(f"   ✗ HTTP {response.status_code}")
+            log(f"   ✗ HTTP {response.status_code}")
             result['status'] = f'http_{response.status_code}'
 
     except requests.exceptions.SSLError as e:
-        print(f"   ✗ SSL-fel, försöker med HTTP...")
+        log(f"   ✗ SSL-fel, försöker med HTTP...")
         # Försök med HTTP istället
         try:
             http_url = url.replace('https://', 'http://')
-            response = requests.get(
-                http_url,
-                headers=HEADERS,
-                timeout=HTTP_TIMEOUT,
-                allow_redirects=True
-            )
-
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-                result['meta_description'] = extract_meta_description(soup)
-                result['scraped_text'] = extract_main_content(soup)
+            response, cached = fetch(http_url)
+
+            if cached:
+                reuse(cached)
+            elif response.status_code == 200:
+                if store is not None:
+                    store.put(http_url, response.content, response.status_code,
+                              response.headers.get('Content-Type'))
+                result['meta_description'], result['scraped_text'] = extract_page(response.content, max_chars,
+                                                                                  backend)
                 result['status'] = 'success_http'
-                print(f"   ✓ Lyckades med HTTP!")
+                log(f"   ✓ Lyckades med HTTP!")
+                if cache is not None:
+                    cache.store(http_url, response, result)
             else:
                 result['status'] = 'ssl_error_http_failed'
         except Exception:
             result['status'] = 'ssl_error'
 
     except requests.exceptions.Timeout:
-        print(f"   ✗ Timeout efter {HTTP_TIMEOUT}s")
+        log(f"   ✗ Timeout efter {HTTP_TIMEOUT}s")
         result['status'] = 'timeout'
 
     except requests.exceptions.ConnectionError:
-        print(f"   ✗ Anslutningsfel")
+        log(f"   ✗ Anslutningsfel")
         result['status'] = 'connection_error'
 
     except Exception as e:
-        print(f"   ✗ Fel: {type(e).__name__}")
+        log(f"   ✗ Fel: {type(e).__name__}")
         result['status'] = f'error_{type(e).__name__}'
 
     return result
 
 
+_worker_store = None
+
+
+def _init_worker(store_path):
+    """Körs en gång per process: egen läsanslutning till HTML-lagret."""
+    global _worker_store
+    _worker_store = html_store.HtmlStore(store_path, read_only=True)
+
+
+def _reextract_page(task):
+    """Extrahera en lagrad sida i en worker-process. task = (hash, status, status_code, max_chars, backend)."""
+    digest, status, status_code, max_chars, backend = task
+    result = {'scraped_text': '', 'meta_description': None, 'status': 'not_stored', 'status_code': None}
+    if digest is None:
+        return result, ["   ✗ Finns inte i HTML-lagret"]
+
+    result['meta_description'], result['scraped_text'] = extract_page(_worker_store.get_blob(digest), max_chars,
+                                                                      backend)
+    result['status_code'] = status_code
+    if result['scraped_text']:
+        result['status'] = status
+        return result, [f"   ✓ Extraherade {len(result['scraped_text'].split())} ord ur lagret"]
+    result['status'] = 'no_content'
+    return result, ["   ⚠ Ingen text i den lagrade sidan"]
+
+
+def reextract_pages(companies, store_path, workers, max_chars=MAX_TEXT_CHARS, backend=None):
+    """
+    Kör extraktionen igen över HTML-lagret, utan nätverk. Varje företags
+    URL slås upp som scrape_website() hämtade den (https först, sedan
+    http-fallback). Sidorna tolkas i `workers` processer; ger
+    (företag, (resultat, loggrader)) i ursprunglig ordning.
+    """
+    store = html_store.HtmlStore(store_path)
+    index = store.index()
+    store.close()
+
+    tasks = []
+    for company in companies:
+        url = company[2] if company[2].startswith(('http://', 'https://')) else 'https://' + company[2]
+        candidates = [(url, 'success')]
+        if url.startswith('https://'):
+            candidates.append((url.replace('https://', 'http://'), 'success_http'))
+        stored = next(((index[candidate], status) for candidate, status in candidates if candidate in index), None)
+        if stored:
+            (digest, _, status_code), status = stored
+            tasks.append((digest, status, status_code, max_chars, backend))
+        else:
+            tasks.append((None, None, None, max_chars, backend))
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(str(store_path),)) as pool:
+        yield from zip(companies, pool.map(_reextract_page, tasks, chunksize=8))
+
+
 def get_company_metadata(cursor, company_id):
     """
     Hämta metadata från databasen för ett företag.
@@ -260,9 +304,33 @@ def main():
     parser.add_argument('--limit', type=int, help='Begränsa antal företag att skrapa (för test)')
     parser.add_argument('--missing-only', action='store_true', help='Bara företag utan description')
     parser.add_argument('--output', default='results/scraped_websites.csv', help='Output CSV-fil')
-    parser.add_argument('--delay', type=float, default=1.0, help='Fördröjning mellan requests (sekunder)')
+    parser.add_argument('--delay', type=float, default=1.0, help='Fördröjning mellan requests till samma värd (sekunder)')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f'Antal samtidiga hämtningar totalt (default: {DEFAULT_CONCURRENCY})')
+    parser.add_argument('--cache-db', default=None,
+                        help=f'HTTP-cache för villkorlig GET (default: {DEFAULT_CACHE_PATH})')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Hämta alla sidor i sin helhet (ingen villkorlig GET)')
+    parser.add_argument('--store-db', default=None,
+                        help=f'Lager för rå-HTML (default: {html_store.DEFAULT_STORE_PATH})')
+    parser.add_argument('--no-store', action='store_true', help='Spara inte rå-HTML')
+    parser.add_argument('--reextract', action='store_true',
+                        help='Extrahera om från HTML-lagret utan nätverk (ingen hämtning)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Processer för --reextract (default: antal kärnor)')
+    parser.add_argument('--max-chars', type=int, default=MAX_TEXT_CHARS,
+                        help=f'Max antal tecken huvudtext per sida (default: {MAX_TEXT_CHARS})')
+    parser.add_argument('--parser', choices=['auto', *BACKENDS], default='auto',
+                        help='HTML-parser för extraktionen (default: auto = selectolax, lxml eller bs4)')
     args = parser.parse_args()
 
+    if args.reextract and args.no_store:
+        parser.error('--reextract läser HTML-lagret (ta bort --no-store)')
+    backend = resolve_backend(args.parser)
+    store_path = args.store_db or html_store.DEFAULT_STORE_PATH
+    if args.reextract and not Path(store_path).exists():
+        parser.error(f'HTML-lagret finns inte: {store_path} (kör skrapan utan --reextract först)')
+
     # Skapa results-mapp om den inte finns
     Path(args.output).parent.mkdir(parents=True, exist_ok=True)
 
@@ -307,77 +375,119 @@ def main():
     if args.limit:
         print(f"⚠ TESTLÄGE: Begränsat till {args.limit} företag")
 
-    print(f"⏱️  Fördröjning mellan requests: {args.delay}s")
+    print(f"🧩 HTML-parser: {backend}")
 
-    # Skrapa hemsidor
-    results = []
-    success_count = 0
+    # Metadata läses i huvudtråden (sqlite-anslutningen delas inte med trådarna)
+    metadata_by_id = {company_id: get_company_metadata(cursor, company_id)
+                      for company_id, _, _, _ in companies}
 
-    for i, (company_id, name, website, company_type) in enumerate(companies, 1):
-        print(f"\n[{i}/{len(companies)}] " + "=" * 60)
-        print(f"ID: {company_id} | {name}")
-        print(f"Typ: {company_type} | Website: {website}")
-
-        # Hämta metadata från databas
-        metadata = get_company_metadata(cursor, company_id)
-
-        if metadata['sectors'] or metadata['domains']:
-            print(f"📊 Metadata: {len(metadata['sectors'])} sectors, {len(metadata['domains'])} domains, {len(metadata['dimensions'])} dimensions")
-
-        # Skrapa hemsida
-        scrape_result = scrape_website(website, name)
-
-        results.append({
-            'id': company_id,
-            'name': name,
-            'website': website,
-            'type': company_type,
-            'scraped_text': scrape_result['scraped_text'],
-            'meta_description': scrape_result['meta_description'] or '',
-            'sectors': ', '.join(metadata['sectors']),
-            'domains': ', '.join(metadata['domains']),
-            'dimensions': ', '.join(metadata['dimensions']),
-            'ai_capabilities': ', '.join(metadata['ai_capabilities']),
-            'status': scrape_result['status'],
-            'status_code': scrape_result['status_code'] or ''
-        })
-
-        if scrape_result['status'] in ['success', 'success_http']:
-            success_count += 1
-
-        # Vänta lite mellan requests för att vara artig
-        if i < len(companies):
-            time.sleep(args.delay)
-
-    # Exportera resultat
-    print("\n" + "=" * 70)
-    print("📊 EXPORTERAR RESULTAT")
-    print("=" * 70)
+    fieldnames = ['id', 'name', 'website', 'type', 'scraped_text', 'meta_description',
+                  'sectors', 'domains', 'dimensions', 'ai_capabilities', 'status', 'status_code']
+
+    status_counts = {}
+    success_count = 0
+    done = 0
+    started = time.monotonic()
+    fetcher = page_cache = store = None
+
+    if args.reextract:
+        # Ingen hämtning: tolka om de lagrade sidorna parallellt på alla kärnor
+        print(f"📦 Extraherar om från HTML-lagret {store_path} med {args.workers} processer")
+        results = reextract_pages(companies, store_path, args.workers, args.max_chars, backend)
+    else:
+        print(f"⏱️  {args.concurrency} samtidiga hämtningar, {args.delay}s mellan requests till samma värd")
+
+        # Sparad text i HTTP-cachen är trunkerad till MAX_TEXT_CHARS – annan längd: --reextract.
+        # Poster från en annan HTML-backend räknas som saknade och hämtas om.
+        use_cache = not args.no_cache and args.max_chars == MAX_TEXT_CHARS
+        if not args.no_cache and not use_cache:
+            print(f"⚠ --max-chars {args.max_chars}: HTTP-cachen används inte (snabbare: --reextract)")
+        page_cache = open_page_cache(args.cache_db, enabled=use_cache, backend=backend)
+        if page_cache is not None:
+            print(f"🗄️  HTTP-cache: {page_cache.path}")
+        store = html_store.open_html_store(args.store_db, enabled=not args.no_store)
+        if store is not None:
+            print(f"📦 HTML-lager: {store.path}")
+
+        fetcher = PoliteFetcher(HEADERS, concurrency=args.concurrency, host_delay=args.delay)
+
+        def work(company):
+            lines = []
+            result = scrape_website(company[2], company[1], get=fetcher.get, log=lines.append,
+                                    cache=page_cache, store=store, max_chars=args.max_chars, backend=backend)
+            return result, lines
+
+        # Skrapa hemsidor parallellt; varje rad skrivs så fort företaget är klart
+        results = fetcher.run(companies, work)
 
     with open(args.output, 'w', newline='', encoding='utf-8') as f:
-        fieldnames = ['id', 'name', 'website', 'type', 'scraped_text', 'meta_description',
-                      'sectors', 'domains', 'dimensions', 'ai_capabilities', 'status', 'status_code']
         writer = csv.DictWriter(f, fieldnames=fieldnames)
         writer.writeheader()
-        writer.writerows(results)
+
+        try:
+            for (company_id, name, website, company_type), (scrape_result, lines) in results:
+                done += 1
+                metadata = metadata_by_id[company_id]
+
+                print(f"\n[{done}/{len(companies)}] ID: {company_id} | {name} | Typ: {company_type}")
+                for line in lines:
+                    print(line)
+                if metadata['sectors'] or metadata['domains']:
+                    print(f"   📊 Metadata: {len(metadata['sectors'])} sectors, {len(metadata['domains'])} domains, {len(metadata['dimensions'])} dimensions")
+
+                writer.writerow({
+                    'id': company_id,
+                    'name': name,
+                    'website': website,
+                    'type': company_type,
+                    'scraped_text': scrape_result['scraped_text'],
+                    'meta_description': scrape_result['meta_description'] or '',
+                    'sectors': ', '.join(metadata['sectors']),
+                    'domains': ', '.join(metadata['domains']),
+                    'dimensions': ', '.join(metadata['dimensions']),
+                    'ai_capabilities': ', '.join(metadata['ai_capabilities']),
+                    'status': scrape_result['status'],
+                    'status_code': scrape_result['status_code'] or ''
+                })
+                f.flush()
+
+                status_counts[scrape_result['status']] = status_counts.get(scrape_result['status'], 0) + 1
+                if scrape_result['status'] in ['success', 'success_http']:
+                    success_count += 1
+        except KeyboardInterrupt:
+            print(f"\n⚠ Avbruten – {done} företag hann skrivas till {args.output}")
+
+    elapsed = time.monotonic() - started
+    if fetcher is not None:
+        fetcher.close()
 
     # Statistik
-    failed = len(results) - success_count
-    success_rate = (success_count / len(results) * 100) if results else 0
+    print("\n" + "=" * 70)
+    print("📊 RESULTAT")
+    print("=" * 70)
+
+    failed = done - success_count
+    success_rate = (success_count / done * 100) if done else 0
 
     print(f"\n✅ Exporterat till: {args.output}")
     print(f"\n📈 RESULTAT:")
     print(f"   ✓ Lyckade skrapningar: {success_count}")
     print(f"   ✗ Misslyckade: {failed}")
-    print(f"   📊 Total: {len(results)}")
+    print(f"   📊 Total: {done}")
     print(f"   🎯 Framgångsgrad: {success_rate:.1f}%")
+    if fetcher is not None:
+        print(f"   ⏱️  Tid: {elapsed:.1f}s ({done / elapsed if elapsed else 0:.1f} företag/s), "
+              f"{fetcher.stats['requests']} requests, {fetcher.throttle.waited_sec:.1f}s väntan per värd totalt")
+    else:
+        print(f"   ⏱️  Tid: {elapsed:.1f}s ({done / elapsed if elapsed else 0:.1f} företag/s), inga requests")
+    if page_cache is not None:
+        print(f"   🗄️  {page_cache.summary()}")
+        page_cache.close()
+    if store is not None:
+        print(f"   📦 {store.summary()}")
+        store.close()
 
     # Status breakdown
-    status_counts = {}
-    for result in results:
-        status = result['status']
-        status_counts[status] = status_counts.get(status, 0) + 1
-
     if len(status_counts) > 1:
         print(f"\n📋 STATUS BREAKDOWN:")
         for status, count in sorted(status_counts.items(), key=lambda x: -x[1]):
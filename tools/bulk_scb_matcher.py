@@ -3,22 +3,55 @@
 Bulk SCB Matcher
 Matchar företag utan SCB-data mot SCB:s bulk-fil (1.8M företag)
 
+Första körningen kompileras bulk-filen till en snapshot (<bulk>.scbsnap) som
+minnesmappas vid efterföljande körningar. En ny bulk-fil (annan storlek/mtime/
+hash) ger automatiskt en ny kompilering.
+
 Usage:
     python3 bulk_scb_matcher.py --bulk /path/to/scb_bulk.txt --db ai_companies.db
+    python3 bulk_scb_matcher.py --bulk /path/to/scb_bulk.txt --compile-only
+    python3 bulk_scb_matcher.py --bulk /path/to/scb_bulk.txt --batch
+    python3 bulk_scb_matcher.py --bulk /path/to/scb_bulk.txt --workers 32
+    python3 bulk_scb_matcher.py --bulk /path/to/ny_scb_bulk.txt --delta --previous-snapshot old.scbsnap
 """
 
 import sqlite3
 import json
 import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from fuzzywuzzy import fuzz
 import sys
 
+import scb_register
+
+MIN_FUZZY_SCORE = 85        # Lägsta fuzz.ratio för en matchning
+MAX_CANDIDATES = 300        # Max antal trigram-kandidater som fuzzy-scoras per företag
+BATCH_TOP_K = 5             # Antal kandidater per företag i batch-matrisen
+BATCH_PAIRS = 1_000_000     # Max antal (företag, kandidat)-par per cpdist-anrop
+SHARDS_PER_WORKER = 4       # Fler shards än processer jämnar ut lasten
+
+# scb_enrichment-kolumn -> bulk-kolumn som jämförs vid --delta
+DRIFT_FIELDS = [
+    ('company_status_code', 'FtgStat'),
+    ('post_address', 'Gatuadress'),
+    ('post_code', 'PostNr'),
+    ('post_city', 'PostOrt'),
+]
+
 class BulkSCBMatcher:
-    def __init__(self, bulk_file_path, db_path):
+    def __init__(self, bulk_file_path, db_path, snapshot_path=None, use_snapshot=True,
+                 retrieval='trigram', max_candidates=MAX_CANDIDATES):
         self.bulk_file_path = bulk_file_path
         self.db_path = db_path
-        self.bulk_index = {}
+        self.retrieval = retrieval
+        self.max_candidates = max_candidates
+        self.snapshot_path = snapshot_path or scb_register.default_snapshot_path(bulk_file_path)
+        self.use_snapshot = use_snapshot
+        self.snapshot = None
+        self.store = None
+        self.score_workers = -1     # trådar för cpdist (-1 = alla kärnor)
         self.stats = {
             'total_companies': 0,
             'perfect_matches': 0,
@@ -27,88 +60,73 @@ class BulkSCBMatcher:
             'skipped': 0
         }
 
-    def load_bulk_file(self):
-        """Ladda bulk-filen och bygg en lookup-index."""
-        print(f"📂 Läser bulk-fil: {self.bulk_file_path}")
-        print("   Detta kan ta någon minut för 1.8M rader...")
-
-        # Två separata index för effektivare sökning
-        self.orgnr_index = {}  # org.nr -> company_data
-        self.name_index = {}   # first_3_chars -> [company_data]
-
-        with open(self.bulk_file_path, 'r', encoding='latin-1') as f:
-            # Läs header
-            header = f.readline().strip().split('\t')
-
-            # Hitta kolumn-index
-            col_idx = {}
-            for i, col_name in enumerate(header):
-                col_idx[col_name] = i
-
-            print(f"   Kolumner: {len(header)}")
-
-            # Läs alla rader och bygg index
-            line_count = 0
-            for line in f:
-                line_count += 1
-                if line_count % 100000 == 0:
-                    print(f"   Läst {line_count:,} rader...")
-
-                parts = line.strip().split('\t')
-                if len(parts) < len(header):
-                    continue
-
-                # Extrahera nyckeldata
-                peorgnr = parts[col_idx['PeOrgNr']]
-                namn = parts[col_idx['Namn']].strip()
-                foretagsnamn = parts[col_idx['Foretagsnamn']].strip()
-
-                # Skip om inget namn
-                if not namn and not foretagsnamn:
-                    continue
-
-                # Använd företagsnamn om det finns, annars namn
-                company_name = foretagsnamn if foretagsnamn else namn
-
-                # Skapa företagsobjekt
-                company_data = {
-                    'PeOrgNr': peorgnr,
-                    'Namn': namn,
-                    'Foretagsnamn': foretagsnamn,
-                    'FtgStat': parts[col_idx['FtgStat']],
-                    'JEStat': parts[col_idx['JEStat']],
-                    'JurForm': parts[col_idx['JurForm']],
-                    'Gatuadress': parts[col_idx['Gatuadress']].strip(),
-                    'PostNr': parts[col_idx['PostNr']].strip(),
-                    'PostOrt': parts[col_idx['PostOrt']].strip(),
-                    'COAdress': parts[col_idx['COAdress']].strip(),
-                    'RegDatKtid': parts[col_idx['RegDatKtid']],
-                    'Ng1': parts[col_idx['Ng1']],
-                    'Ng2': parts[col_idx['Ng2']],
-                    'Ng3': parts[col_idx['Ng3']],
-                    'Ng4': parts[col_idx['Ng4']],
-                    'Ng5': parts[col_idx['Ng5']],
-                    'Reklamsparrtyp': parts[col_idx['Reklamsparrtyp']]
-                }
-
-                # Index 1: org.nr (ta bort 16-prefix för juridiska personer)
-                orgnr_10 = peorgnr[2:] if peorgnr.startswith('16') else peorgnr
-                self.orgnr_index[orgnr_10] = company_data
-
-                # Index 2: Första 3 bokstäver i namnet (för snabbare fuzzy search)
-                name_normalized = company_name.upper().strip()
-                if len(name_normalized) >= 3:
-                    prefix = name_normalized[:3]
-                    if prefix not in self.name_index:
-                        self.name_index[prefix] = []
-                    self.name_index[prefix].append({
-                        'name': name_normalized,
-                        'data': company_data
-                    })
-
-            print(f"✅ Läst {line_count:,} rader")
-            print(f"   Org.nr index: {len(self.orgnr_index):,} företag")
-            print(f"   Namn prefix index: {len(self.name_index):,} prefix")
+    def load_bulk_file(self, workers=1):
+        """Ladda registret från snapshot om den är aktuell, annars parsa bulk-filen och kompilera en ny."""
+        if self.use_snapshot and scb_register.snapshot_is_current(self.snapshot_path, self.bulk_file_path):
+            self.open_snapshot()
+            return
+
+        self.set_store(scb_register.parse_bulk_file(self.bulk_file_path, workers=workers))
+
+        if self.use_snapshot:
+            self.write_snapshot()
+
+    def compile_snapshot(self, force=False, workers=1):
+        """Engångssteg: parsa bulk-filen och skriv snapshot (utan matchning)."""
+        if not force and scb_register.snapshot_is_current(self.snapshot_path, self.bulk_file_path):
+            print(f"✅ Snapshot är redan aktuell: {self.snapshot_path}")
+            return
+        self.set_store(scb_register.parse_bulk_file(self.bulk_file_path, workers=workers))
+        self.write_snapshot()
+
+    def set_store(self, store):
+        """Använd ett kolumnbaserat register (RegisterStore) med färdiga index."""
+        self.store = store
+        self.orgnr_index = store.orgnr_index      # org.nr -> rad-id
+        self.exact_index = store.exact_index      # name_key -> rad-id (hashtabell)
+        self.name_index = store.name_index        # first_3_chars -> [rad-id]
+        self.trigram_index = store.trigram_index  # trigram -> [rad-id]
+
+    def open_snapshot(self):
+        """Minnesmappa snapshoten. Endast de buckets som används läses från disk."""
+        start = time.time()
+        self.snapshot = scb_register.RegisterSnapshot(self.snapshot_path)
+        self.set_store(self.snapshot.store)
+
+        print(f"⚡ Öppnade snapshot: {self.snapshot_path} ({time.time() - start:.2f}s)")
+        print(f"   Org.nr index: {len(self.orgnr_index):,} företag")
+        print(f"   Namn prefix index: {len(self.name_index):,} prefix")
+        print(f"   Trigram index: {len(self.trigram_index):,} trigram")
+
+    def open_previous_snapshot(self, path=None):
+        """
+        Öppna föregående leverans snapshot för --delta. Måste göras innan
+        load_bulk_file() eftersom en ny kompilering ersätter filen (den
+        öppnade mappningen fortsätter peka på den gamla versionen).
+        """
+        path = path or self.snapshot_path
+        try:
+            previous = scb_register.RegisterSnapshot(path)
+        except (OSError, ValueError) as e:
+            raise SystemExit(f"❌ Kan inte läsa föregående snapshot {path}: {e}") from e
+        print(f"📂 Föregående snapshot: {path} ({len(previous.store):,} rader)")
+        return previous
+
+    def diff_against(self, previous):
+        """Jämför det laddade registret med föregående snapshot (PeOrgNr + radhash)."""
+        delta = scb_register.diff_registers(previous.store, self.store)
+        print(f"🔄 Delta mot föregående leverans:")
+        print(f"   Tillagda: {len(delta.added):,} | Borttagna: {len(delta.removed):,} | Ändrade: {len(delta.changed_new):,}")
+        return delta
+
+    def write_snapshot(self):
+        """Skriv registret + index till snapshot-filen."""
+        print(f"💾 Kompilerar snapshot: {self.snapshot_path}")
+        start = time.time()
+        source = scb_register.source_fingerprint(self.bulk_file_path)
+        source['path'] = str(self.bulk_file_path)
+        scb_register.write_snapshot(self.snapshot_path, self.store, source)
+        print(f"✅ Snapshot skriven ({len(self.store):,} rader, {time.time() - start:.1f}s)")
 
     def extract_orgnr_from_text(self, text):
         """Försök extrahera org.nr från text."""
@@ -144,50 +162,301 @@ class BulkSCBMatcher:
 
         return name
 
+    def get_candidates(self, normalized_name):
+        """
+        Rad-id att fuzzy-scora för ett normaliserat namn.
+
+        trigram: de MAX_CANDIDATES namn som delar flest trigram (count-filtrerat
+                 mot MIN_FUZZY_SCORE), oberoende av namnets första tecken
+        prefix:  namn med samma 3 första tecken (gamla beteendet), begränsat
+                 till de längder som kan nå MIN_FUZZY_SCORE, i radordning
+        """
+        if self.retrieval == 'prefix':
+            min_length, max_length = scb_register.length_window(len(normalized_name), MIN_FUZZY_SCORE)
+            return sorted(self.name_index.window(normalized_name[:3], min_length, max_length))
+        return self.trigram_index.candidates(normalized_name, MIN_FUZZY_SCORE, self.max_candidates)
+
     def find_bulk_match(self, company_name, website=None):
         """Hitta matchning i bulk-filen."""
 
         # 1. Försök hitta org.nr i website eller namn
         orgnr = self.extract_orgnr_from_text(website)
-        if orgnr and orgnr in self.orgnr_index:
-            return self.orgnr_index[orgnr], 100, 'orgnr'
+        row_id = self.orgnr_index.get(orgnr) if orgnr else None
+        if row_id is not None:
+            return self.store.record(row_id), 100, 'orgnr'
 
         # 2. Normalisera söknamnet
         normalized_name = self.normalize_name(company_name)
         if not normalized_name or len(normalized_name) < 3:
             return None, 0, 'no_name'
 
-        # 3. Sök i prefix-index (endast företag med samma 3 första bokstäver)
-        prefix = normalized_name[:3]
+        # 3. Exakt matchning (hashtabell, ingen kandidatsökning)
+        row_id = self.exact_index.get(normalized_name)
+        if row_id is not None:
+            return self.store.record(row_id), 100, 'exact_name'
 
-        if prefix not in self.name_index:
+        # 4. Hämta kandidater
+        candidates = self.get_candidates(normalized_name)
+        if not candidates:
             return None, 0, 'no_match'
 
-        # 4. Fuzzy match endast mot företag med samma prefix
-        candidates = self.name_index[prefix]
-        best_match = None
+        # 5. Fuzzy match endast mot kandidaterna
+        name_keys = self.store.name_keys
+        best_row = None
         best_score = 0
 
-        for candidate in candidates:
-            candidate_name = candidate['name']
-
-            # Exakt matchning
-            if normalized_name == candidate_name:
-                return candidate['data'], 100, 'exact_name'
-
-            # Fuzzy matchning
-            score = fuzz.ratio(normalized_name, candidate_name)
-            if score > best_score and score >= 85:
+        for row_id in candidates:
+            score = fuzz.ratio(normalized_name, name_keys[row_id])
+            if score > best_score and score >= MIN_FUZZY_SCORE:
                 best_score = score
-                best_match = candidate['data']
+                best_row = row_id
+                if score == 100:
+                    break   # kan inte slås av en senare kandidat
 
-        if best_match:
-            return best_match, best_score, 'fuzzy'
+        # Bygg dict endast för vinnaren
+        if best_row is not None:
+            return self.store.record(best_row), best_score, 'fuzzy'
 
         return None, 0, 'no_match'
 
-    def process_companies(self, dry_run=False, limit=None):
-        """Bearbeta alla företag utan SCB-matchning."""
+    def score_batch(self, names, top_k=BATCH_TOP_K):
+        """
+        Vektoriserad fuzzy-scoring av många normaliserade namn mot sina kandidater.
+
+        Alla (namn, kandidat)-par scoras i C++ med rapidfuzz.process.cpdist
+        (score_cutoff, alla kärnor) i stället för ett fuzz.ratio-anrop per par.
+        Scoren avrundas som fuzz.ratio och rangordnas som i find_bulk_match():
+        exakt namn först, sedan högst score, sedan kandidatordning.
+
+        Returnerar (rows, scores): matriser [len(names) x top_k] med rad-id och
+        score, bäst först. Tomma platser har rad-id -1 och score 0.
+        """
+        import numpy as np
+        try:
+            from rapidfuzz import fuzz as rapid_fuzz
+            from rapidfuzz.process import cpdist
+        except ImportError as e:
+            raise SystemExit("Saknar 'rapidfuzz'. Installera: pip install rapidfuzz") from e
+
+        rows = np.full((len(names), top_k), -1, dtype=np.int64)
+        scores = np.zeros((len(names), top_k), dtype=np.int16)
+        name_keys = self.store.name_keys
+        query_names = np.array(names, dtype=object)
+
+        def score_chunk(query_ids, row_ids, ranks):
+            query_ids = np.concatenate(query_ids)
+            row_ids = np.concatenate(row_ids)
+            ranks = np.concatenate(ranks)
+
+            # Avkoda varje registernamn en gång, även om det är kandidat till flera företag
+            unique_rows, inverse = np.unique(row_ids, return_inverse=True)
+            unique_names = np.array([name_keys[row_id] for row_id in unique_rows.tolist()], dtype=object)
+            queries = query_names[query_ids]
+            choices = unique_names[inverse]
+
+            raw = cpdist(queries, choices, scorer=rapid_fuzz.ratio,
+                         score_cutoff=MIN_FUZZY_SCORE - 0.5, dtype=np.float64,
+                         workers=self.score_workers)
+            pair_scores = np.rint(raw).astype(np.int16)   # samma avrundning som fuzz.ratio
+
+            keep = np.flatnonzero(pair_scores >= MIN_FUZZY_SCORE)
+            if not keep.size:
+                return
+            query_ids, row_ids, ranks, pair_scores = query_ids[keep], row_ids[keep], ranks[keep], pair_scores[keep]
+            queries, choices = queries[keep], choices[keep]
+
+            # Exakt namn slår en fuzzy-100 (endast par med score 100 kan vara exakta)
+            exact = np.zeros(len(keep), dtype=bool)
+            perfect = np.flatnonzero(pair_scores == 100)
+            exact[perfect] = queries[perfect] == choices[perfect]
+
+            order = np.lexsort((ranks, -pair_scores, ~exact, query_ids))
+            query_ids, row_ids, pair_scores = query_ids[order], row_ids[order], pair_scores[order]
+
+            # Position inom varje företags grupp -> kolumn i top-k-matrisen
+            starts = np.flatnonzero(np.r_[True, query_ids[1:] != query_ids[:-1]])
+            sizes = np.diff(np.r_[starts, len(query_ids)])
+            position = np.arange(len(query_ids)) - np.repeat(starts, sizes)
+            top = position < top_k
+            rows[query_ids[top], position[top]] = row_ids[top]
+            scores[query_ids[top], position[top]] = pair_scores[top]
+
+        query_ids, row_ids, ranks = [], [], []
+        pending = 0
+        for i, name in enumerate(names):
+            candidates = np.asarray(self.get_candidates(name), dtype=np.int64)
+            if not candidates.size:
+                continue
+            query_ids.append(np.full(candidates.size, i, dtype=np.int64))
+            row_ids.append(candidates)
+            ranks.append(np.arange(candidates.size))
+            pending += candidates.size
+            if pending >= BATCH_PAIRS:
+                score_chunk(query_ids, row_ids, ranks)
+                query_ids, row_ids, ranks = [], [], []
+                pending = 0
+        if pending:
+            score_chunk(query_ids, row_ids, ranks)
+
+        return rows, scores
+
+    def match_companies_batch(self, companies):
+        """
+        Matcha en hel lista av (namn, website) i ett svep.
+
+        Ger samma (match_data, score, match_type) per företag som find_bulk_match(),
+        men fuzzy-scoringen görs vektoriserat via score_batch().
+        """
+        results = [None] * len(companies)
+        names = []
+        positions = []
+
+        for i, (company_name, website) in enumerate(companies):
+            orgnr = self.extract_orgnr_from_text(website)
+            row_id = self.orgnr_index.get(orgnr) if orgnr else None
+            if row_id is not None:
+                results[i] = (self.store.record(row_id), 100, 'orgnr')
+                continue
+
+            normalized_name = self.normalize_name(company_name)
+            if not normalized_name or len(normalized_name) < 3:
+                results[i] = (None, 0, 'no_name')
+                continue
+
+            row_id = self.exact_index.get(normalized_name)
+            if row_id is not None:
+                results[i] = (self.store.record(row_id), 100, 'exact_name')
+                continue
+
+            names.append(normalized_name)
+            positions.append(i)
+
+        rows, scores = self.score_batch(names)
+
+        for j, i in enumerate(positions):
+            row_id = int(rows[j, 0])
+            if row_id < 0:
+                results[i] = (None, 0, 'no_match')
+            elif self.store.name_keys[row_id] == names[j]:
+                results[i] = (self.store.record(row_id), 100, 'exact_name')
+            else:
+                results[i] = (self.store.record(row_id), int(scores[j, 0]), 'fuzzy')
+
+        return results
+
+    def match_companies_parallel(self, companies, workers, batch=False):
+        """
+        Matcha (namn, website)-listan i en processpool.
+
+        Företagen delas i sammanhängande shards. Varje process minnesmappar
+        samma snapshot (registret kopieras/picklas inte) och returnerar
+        sina resultat, som slås ihop i ursprunglig ordning.
+        """
+        shard_count = min(len(companies), workers * SHARDS_PER_WORKER)
+        if not shard_count:
+            return []
+        size = -(-len(companies) // shard_count)
+        shards = [companies[start:start + size] for start in range(0, len(companies), size)]
+
+        print(f"🧵 Matchar {len(companies)} företag i {len(shards)} shards på {workers} processer...")
+        initargs = (self.bulk_file_path, self.snapshot_path, self.retrieval, self.max_candidates)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+            results = []
+            for shard_results in pool.map(_match_shard, shards, [batch] * len(shards)):
+                results.extend(shard_results)
+        return results
+
+    def touched_companies(self, companies, delta):
+        """
+        Företag som kan ha fått en ny matchning av deltat: ett org.nr i
+        website som är nytt/ändrat, eller ett namn som delar tillräckligt
+        många trigram med ett nytt/ändrat registernamn för att kunna nå
+        MIN_FUZZY_SCORE (samma förlustfria count-filter som kandidatsökningen).
+        """
+        touched_names = scb_register.StringColumn()
+        touched_orgnr = set()
+        peorgnr = self.store.columns['PeOrgNr']
+        for row_id in delta.touched_rows().tolist():
+            touched_names.append(self.store.name_keys[row_id])
+            touched_orgnr.add(scb_register.orgnr_key(peorgnr[row_id]))
+        if not touched_orgnr:
+            return []
+        touched_index = scb_register.TrigramIndex.from_names(touched_names)
+
+        touched = []
+        for company in companies:
+            _, name, website, _ = company
+            if self.extract_orgnr_from_text(website) in touched_orgnr:
+                touched.append(company)
+                continue
+            normalized_name = self.normalize_name(name)
+            if len(normalized_name) >= 3 and touched_index.candidates(normalized_name, MIN_FUZZY_SCORE, 1):
+                touched.append(company)
+        return touched
+
+    def export_enrichment_drift(self, conn, delta):
+        """
+        Flagga scb_enrichment-rader vars org.nr ändrats eller försvunnit i nya
+        leveransen och där status/adress skiljer sig från registret.
+        Exporteras till results/scb_enrichment_drift_*.csv för uppföljning.
+        """
+        import pandas as pd
+        import os
+
+        changed = {}
+        new_peorgnr = delta.new.columns['PeOrgNr']
+        for row_id in delta.changed_new.tolist():
+            changed[scb_register.orgnr_key(new_peorgnr[row_id])] = row_id
+        old_peorgnr = delta.old.columns['PeOrgNr']
+        removed = {scb_register.orgnr_key(old_peorgnr[row_id]) for row_id in delta.removed.tolist()}
+
+        columns = ', '.join(field for field, _ in DRIFT_FIELDS)
+        rows = conn.execute(f'SELECT company_id, organization_number, {columns} FROM scb_enrichment').fetchall()
+
+        def clean(value):
+            return ''.join(str(value or '').upper().split())
+
+        drift = []
+        for company_id, orgnr, *values in rows:
+            orgnr = (orgnr or '').replace('-', '')
+            if orgnr in changed:
+                record = delta.new.record(changed[orgnr])
+                for (field, bulk_column), value in zip(DRIFT_FIELDS, values):
+                    if clean(value) != clean(record[bulk_column]):
+                        drift.append({
+                            'company_id': company_id,
+                            'orgnr': orgnr,
+                            'change': 'changed',
+                            'field': field,
+                            'enrichment_value': value,
+                            'register_value': record[bulk_column]
+                        })
+            elif orgnr in removed and self.orgnr_index.get(orgnr) is None:
+                drift.append({
+                    'company_id': company_id,
+                    'orgnr': orgnr,
+                    'change': 'removed',
+                    'field': '',
+                    'enrichment_value': '',
+                    'register_value': ''
+                })
+
+        print(f"\n🔎 scb_enrichment: {len(rows)} rader kontrollerade, "
+              f"{len({d['company_id'] for d in drift})} företag med avvikelser")
+        if drift:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            csv_path = f'results/scb_enrichment_drift_{timestamp}.csv'
+            os.makedirs('results', exist_ok=True)
+            pd.DataFrame(drift).to_csv(csv_path, index=False, encoding='utf-8', quoting=1)
+            print(f"   Avvikelser exporterade till: {csv_path}")
+
+    def process_companies(self, dry_run=False, limit=None, batch=False, workers=1, delta=None):
+        """
+        Bearbeta alla företag utan SCB-matchning.
+
+        Med delta (RegisterDelta) matchas bara de företag vars kandidater
+        berörs av ändringarna, och scb_enrichment kontrolleras mot deltat.
+        """
         import pandas as pd
         import os
 
@@ -208,6 +477,11 @@ class BulkSCBMatcher:
         cursor.execute(query)
         companies = cursor.fetchall()
 
+        if delta is not None:
+            all_count = len(companies)
+            companies = self.touched_companies(companies, delta)
+            print(f"\n🔄 Delta: {len(companies)} av {all_count} omatchade företag berörs av ändringarna")
+
         self.stats['total_companies'] = len(companies)
 
         print(f"\n🔍 Bearbetar {len(companies)} företag...")
@@ -216,6 +490,17 @@ class BulkSCBMatcher:
         perfect_matches = []  # 100% score - läggs direkt i DB
         fuzzy_matches = []    # 85-99% score - exporteras till CSV
 
+        precomputed = None
+        if batch or workers > 1:
+            # Matcha alla svenska företag i förväg innan resultaten skrivs ut
+            start = time.time()
+            to_match = [(name, website) for _, name, website, is_swedish in companies if is_swedish]
+            if workers > 1:
+                precomputed = iter(self.match_companies_parallel(to_match, workers, batch))
+            else:
+                precomputed = iter(self.match_companies_batch(to_match))
+            print(f"⚡ Matchning klar ({time.time() - start:.1f}s)\n")
+
         for i, (company_id, name, website, is_swedish) in enumerate(companies, 1):
             # Skip icke-svenska företag
             if not is_swedish:
@@ -223,9 +508,12 @@ class BulkSCBMatcher:
                 continue
 
             # Hitta matchning
-            match_data, score, match_type = self.find_bulk_match(name, website)
+            if precomputed is not None:
+                match_data, score, match_type = next(precomputed)
+            else:
+                match_data, score, match_type = self.find_bulk_match(name, website)
 
-            if match_data and score >= 85:
+            if match_data and score >= MIN_FUZZY_SCORE:
                 # Vi har en matchning!
                 if score == 100:
                     # PERFEKT matchning - lägg direkt i databasen
@@ -319,6 +607,9 @@ class BulkSCBMatcher:
             print(f"\n⚠️  VIKTIGT: Granska dessa manuellt innan import!")
             print(f"   Använd sedan: tools/import_manual_matches_direct.py")
 
+        if delta is not None:
+            self.export_enrichment_drift(conn, delta)
+
         if dry_run:
             print("\n🔍 DRY RUN - Ingen data sparad till databasen")
             if fuzzy_matches:
@@ -327,25 +618,84 @@ class BulkSCBMatcher:
         conn.close()
 
 
+# ============================================================================
+# PROCESSPOOL (--workers)
+# ============================================================================
+
+_worker_matcher = None
+
+
+def _init_worker(bulk_file_path, snapshot_path, retrieval, max_candidates):
+    """Körs en gång per process: minnesmappa snapshoten (delas via OS:ets page cache)."""
+    global _worker_matcher
+    matcher = BulkSCBMatcher(bulk_file_path, None, snapshot_path=snapshot_path,
+                             retrieval=retrieval, max_candidates=max_candidates)
+    matcher.snapshot = scb_register.RegisterSnapshot(snapshot_path)
+    matcher.set_store(matcher.snapshot.store)
+    matcher.score_workers = 1   # en tråd per process, processerna fyller kärnorna
+    _worker_matcher = matcher
+
+
+def _match_shard(companies, batch):
+    """Matcha en shard av (namn, website) i en worker-process."""
+    if batch:
+        return _worker_matcher.match_companies_batch(companies)
+    return [_worker_matcher.find_bulk_match(name, website) for name, website in companies]
+
+
 def main():
     parser = argparse.ArgumentParser(description='Match companies against SCB bulk file')
-    parser.add_argument('--bulk', required=True, help='Path to SCB bulk file')
+    parser.add_argument('--bulk', required=True, help='Path to SCB bulk file (.txt, or compressed .gz/.bz2/.zst)')
     parser.add_argument('--db', default='ai_companies.db', help='Path to database')
     parser.add_argument('--dry-run', action='store_true', help='Do not write to database')
     parser.add_argument('--limit', type=int, help='Limit number of companies to process')
+    parser.add_argument('--snapshot', help='Path to compiled snapshot (default: <bulk>.scbsnap)')
+    parser.add_argument('--no-snapshot', action='store_true', help='Always parse the bulk file, do not read/write snapshot')
+    parser.add_argument('--compile-only', action='store_true', help='Compile snapshot and exit without matching')
+    parser.add_argument('--force-compile', action='store_true', help='Rebuild snapshot even if it is current')
+    parser.add_argument('--retrieval', choices=['trigram', 'prefix'], default='trigram',
+                        help='Candidate retrieval for fuzzy matching (default: trigram)')
+    parser.add_argument('--max-candidates', type=int, default=MAX_CANDIDATES,
+                        help=f'Max trigram candidates scored per company (default: {MAX_CANDIDATES})')
+    parser.add_argument('--batch', action='store_true',
+                        help='Score all companies in one vectorized pass (requires rapidfuzz)')
+    parser.add_argument('--delta', action='store_true',
+                        help='Only re-match companies touched by changes since the previous snapshot, '
+                             'and flag drifted scb_enrichment rows')
+    parser.add_argument('--previous-snapshot',
+                        help='Snapshot of the previous bulk release for --delta (default: --snapshot path)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Parse the bulk file and match in N processes (default: 1)')
 
     args = parser.parse_args()
+    if args.delta and args.no_snapshot and not args.previous_snapshot:
+        parser.error('--delta with --no-snapshot requires --previous-snapshot')
+    if args.workers > 1 and args.no_snapshot:
+        parser.error('--workers requires the snapshot (remove --no-snapshot)')
 
     print("🚀 Bulk SCB Matcher")
     print("=" * 70)
 
-    matcher = BulkSCBMatcher(args.bulk, args.db)
+    matcher = BulkSCBMatcher(args.bulk, args.db, snapshot_path=args.snapshot,
+                             use_snapshot=not args.no_snapshot, retrieval=args.retrieval,
+                             max_candidates=args.max_candidates)
+
+    if args.compile_only or args.force_compile:
+        matcher.compile_snapshot(force=args.force_compile, workers=args.workers)
+        if args.compile_only:
+            print("\n✅ Klart!")
+            return
+
+    # Föregående leverans öppnas innan en ny snapshot kompileras över den
+    previous = matcher.open_previous_snapshot(args.previous_snapshot) if args.delta else None
 
     # Ladda bulk-filen
-    matcher.load_bulk_file()
+    matcher.load_bulk_file(workers=args.workers)
+    delta = matcher.diff_against(previous) if previous else None
 
     # Bearbeta företag
-    matcher.process_companies(dry_run=args.dry_run, limit=args.limit)
+    matcher.process_companies(dry_run=args.dry_run, limit=args.limit, batch=args.batch,
+                              workers=args.workers, delta=delta)
 
     print("\n✅ Klart!")
 
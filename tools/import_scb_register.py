@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Importerar SCB:s bulk-fil (1.8M företag) till en egen SQLite-databas
+med FTS5 trigram-index på namn och unikt index på org.nr.
+
+Databasen används av scb_client.local_register, så att skripten kan söka
+kandidater på namn lokalt och bara gå mot SCB API:et när registret saknar
+träff. Registret har bara bulk-filens fält – en accepterad träff hämtas om
+på org.nr från API:et innan den sparas.
+Sätt sökvägen i config.ini:
+
+    [SCB]
+    register_db_path = databases/scb_register.db
+
+Usage:
+    python3 tools/import_scb_register.py --bulk /path/to/scb_bulk.txt
+    python3 tools/import_scb_register.py --bulk /path/to/scb_bulk.txt --out databases/scb_register.db --force
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import scb_register
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from scb_client import local_register
+
+BATCH_SIZE = 50_000
+DEFAULT_OUT = 'databases/scb_register.db'
+
+
+def register_is_current(db_path, bulk_file_path):
+    """True om databasen redan är importerad från just den här bulk-filen."""
+    if not Path(db_path).exists():
+        return False
+    try:
+        register = local_register.LocalRegister(db_path)
+    except sqlite3.Error:
+        return False
+    try:
+        if register.meta.get('schema_version') != str(local_register.SCHEMA_VERSION):
+            return False
+        source = json.loads(register.meta.get('source', '{}'))
+    finally:
+        register.close()
+
+    current = scb_register.source_fingerprint(bulk_file_path, with_hash=False)
+    if current['size'] != source.get('size'):
+        return False
+    return current['mtime_ns'] == source.get('mtime_ns') or scb_register.file_hash(bulk_file_path) == source.get('hash')
+
+
+def import_register(bulk_file_path, db_path):
+    """Läs bulk-filen strömmande och skriv register-databasen (via en temporär fil)."""
+    print(f"📂 Läser bulk-fil: {bulk_file_path}")
+    start = time.time()
+
+    tmp_path = f'{db_path}.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    local_register.create_schema(conn)
+
+    columns = ['orgnr', 'name', 'name_norm'] + local_register.REGISTER_COLUMNS
+    insert_sql = f"""
+        INSERT OR REPLACE INTO register ({', '.join(columns)})
+        VALUES ({', '.join('?' for _ in columns)})
+    """
+
+    stats = scb_register.parse_stats()
+    batch = []
+    for values in scb_register.iter_bulk_records(bulk_file_path, stats, progress=True):
+        name = values[2] or values[1]   # Företagsnamn om det finns, annars Namn
+        batch.append((scb_register.orgnr_key(values[0]), name, local_register.normalize_name(name), *values))
+        if len(batch) >= BATCH_SIZE:
+            conn.executemany(insert_sql, batch)
+            batch = []
+    if batch:
+        conn.executemany(insert_sql, batch)
+
+    row_count = conn.execute('SELECT COUNT(*) FROM register').fetchone()[0]
+    print(f"✅ Läst {stats['lines']:,} rader, {row_count:,} unika org.nr")
+    scb_register.report_skipped(stats)
+
+    print("🔤 Bygger FTS5 trigram-index...")
+    local_register.rebuild_fts(conn)
+
+    source = scb_register.source_fingerprint(bulk_file_path)
+    source['path'] = str(bulk_file_path)
+    conn.executemany('INSERT INTO meta (key, value) VALUES (?, ?)', [
+        ('schema_version', str(local_register.SCHEMA_VERSION)),
+        ('row_count', str(row_count)),
+        ('source', json.dumps(source)),
+        ('imported_at', datetime.now().isoformat()),
+    ])
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, db_path)
+
+    size_mb = os.path.getsize(db_path) / 1024 / 1024
+    print(f"💾 Sparat: {db_path} ({size_mb:,.0f} MB, {time.time() - start:.1f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import SCB bulk file into a local SQLite register (FTS5 trigram)')
+    parser.add_argument('--bulk', required=True, help='Path to SCB bulk file (.txt, or compressed .gz/.bz2/.zst)')
+    parser.add_argument('--out', default=DEFAULT_OUT, help=f'Register database to create (default: {DEFAULT_OUT})')
+    parser.add_argument('--force', action='store_true', help='Re-import even if the register is current')
+    args = parser.parse_args()
+
+    print("🚀 Import av SCB-register")
+    print("=" * 70)
+
+    if not args.force and register_is_current(args.out, args.bulk):
+        print(f"✅ Registret är redan aktuellt: {args.out}")
+        return
+
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    import_register(args.bulk, args.out)
+
+    print("\n✅ Klart!")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1104 @@
+#!/usr/bin/env python3
+"""
+SCB Register Store & Snapshot
+Kolumnbaserad lagring av SCB:s bulk-fil (1.8M företag) för bulk_scb_matcher.py.
+
+Varje kolumn lagras kompakt i stället för en dict per rad:
+- PeOrgNr som 64-bitars heltal + antal siffror (inledande nollor behålls)
+- Fritextkolumner (namn, adresser) som en utf-8-blob + offsets
+- Kolumner med få unika värden (PostOrt, JurForm, FtgStat, JEStat, Ng1-Ng5 ...)
+  som internerade kategorier (ett heltal per rad + en värdelista)
+
+Index (org.nr, exakt namn, namnprefix och namn-trigram) pekar på rad-id, och en
+fullständig dict byggs endast för de rader som faktiskt matchar
+(RegisterStore.record()).
+
+Varje rad har en 64-bitars hash av sina värden, så att en ny leverans kan
+diffas mot föregående snapshot (diff_registers): tillagda, borttagna och
+ändrade PeOrgNr.
+
+Registret kan kompileras till en versionerad snapshot-fil som minnesmappas
+(mmap). Den är nycklad på bulk-filens storlek/mtime/hash, så en ny
+SCB-leverans ger automatiskt en ny kompilering. Vid läsning läses endast de
+sektioner/buckets som faktiskt används från disk.
+
+Bulk-filen kan vara okomprimerad eller komprimerad (.gz, .bz2, .zst); komprimerade
+filer dekomprimeras strömmande och behöver aldrig packas upp på disk.
+
+Snapshoten byggs via bulk_scb_matcher.py (automatiskt första gången, eller
+med --compile-only).
+"""
+
+import bisect
+import bz2
+import gzip
+import hashlib
+import io
+import json
+import math
+import mmap
+import os
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+SNAPSHOT_MAGIC = b'SCBSNAP\0'
+SNAPSHOT_VERSION = 7
+SNAPSHOT_SUFFIX = '.scbsnap'
+
+# Kolumner från bulk-filen som sparas per företag (samma som i BulkSCBMatcher)
+BULK_COLUMNS = [
+    'PeOrgNr', 'Namn', 'Foretagsnamn', 'FtgStat', 'JEStat', 'JurForm',
+    'Gatuadress', 'PostNr', 'PostOrt', 'COAdress', 'RegDatKtid',
+    'Ng1', 'Ng2', 'Ng3', 'Ng4', 'Ng5', 'Reklamsparrtyp'
+]
+
+# Fritext (i princip unik per rad)
+TEXT_COLUMNS = {'Namn', 'Foretagsnamn', 'Gatuadress', 'COAdress'}
+
+# Kolumner som trimmas vid inläsning
+STRIPPED_COLUMNS = {'Namn', 'Foretagsnamn', 'Gatuadress', 'PostNr', 'PostOrt', 'COAdress'}
+
+_HASH_CHUNK = 8 * 1024 * 1024
+_READ_BUFFER = 8 * 1024 * 1024    # läsbuffert för komprimerade bulk-filer
+COMPRESSED_SUFFIXES = ('.gz', '.bz2', '.zst')
+_ALIGN = 8
+SKIPPED_EXAMPLES = 5             # ogiltiga PeOrgNr som visas i sammanfattningen
+
+
+# ============================================================================
+# NYCKLAR
+# ============================================================================
+
+def orgnr_key(peorgnr):
+    """10-siffrigt org.nr (tar bort 16-prefix för juridiska personer)."""
+    return peorgnr[2:] if peorgnr.startswith('16') else peorgnr
+
+
+def name_key(namn, foretagsnamn):
+    """Namnet som används i namnindexet (Företagsnamn om det finns, annars Namn)."""
+    return (foretagsnamn or namn).upper().strip()
+
+
+def row_hash(values):
+    """64-bitars hash av en rads värden (BULK_COLUMNS-ordning)."""
+    digest = hashlib.blake2b('\x1f'.join(values).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little', signed=True)
+
+
+def name_hash(name):
+    """Deterministisk 64-bitars hash av ett namn (Pythons hash() slumpas per process)."""
+    digest = hashlib.blake2b(name.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little', signed=True)
+
+
+def length_window(length, min_score):
+    """
+    Intervall [lo, hi] av kandidatlängder som kan nå min_score med fuzz.ratio.
+
+    fuzz.ratio = 100 * 2M / (a + b) där M <= min(a, b), så kandidater vars
+    längd skiljer för mycket från söknamnets kan aldrig nå tröskeln.
+    En score som avrundas upp till min_score är minst min_score - 0.5.
+    """
+    cutoff = min_score - 0.5
+    return math.floor(length * cutoff / (200 - cutoff)), math.ceil(length * (200 - cutoff) / cutoff)
+
+
+def trigrams(name):
+    """Unika tecken-trigram för ett (versaliserat) namn, med ett blanksteg som utfyllnad i båda ändar."""
+    padded = f' {name} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def min_shared_trigrams(name_length, gram_count, min_score):
+    """
+    Minsta antal gemensamma trigram som en kandidat måste ha för att kunna nå
+    min_score med fuzz.ratio.
+
+    fuzz.ratio = (L + M - D) / (L + M), där D är indel-avståndet. Värsta fallet
+    är rena borttagningar (varje borttaget tecken förstör högst 3 trigram), och
+    ratio >= c ger då D <= 2(1 - c)L / (2 - c). Filtret tar alltså aldrig bort
+    en kandidat som hade klarat cutoffen.
+    """
+    c = (min_score - 0.5) / 100  # fuzz.ratio avrundar till heltal
+    max_deletions = math.floor(2 * (1 - c) * name_length / (2 - c))
+    return max(1, gram_count - 3 * max_deletions)
+
+
+# ============================================================================
+# KOLUMNER
+# ============================================================================
+
+class OrgnrColumn:
+    """
+    PeOrgNr som heltal (8 byte per rad i stället för en str) plus radens
+    antal siffror, så att inledande nollor kommer tillbaka vid läsning.
+    """
+
+    def __init__(self, values=None, widths=None):
+        self.values = array('q') if values is None else values
+        self.widths = array('B') if widths is None else widths
+
+    def append(self, value):
+        self.values.append(int(value))
+        self.widths.append(len(value))
+
+    def extend(self, other):
+        self.values.extend(other.values)
+        self.widths.extend(other.widths)
+
+    def __getitem__(self, row_id):
+        return f"{self.values[row_id]:0{self.widths[row_id]}d}"
+
+    def __len__(self):
+        return len(self.values)
+
+    def nbytes(self):
+        return len(self.values) * (self.values.itemsize + 1)
+
+    def sections(self, name):
+        return [(name, self.values), (f'{name}.widths', self.widths)]
+
+
+class StringColumn:
+    """Fritextkolumn: alla värden i en utf-8-blob, radens värde = blob[offsets[i]:offsets[i+1]]."""
+
+    def __init__(self, blob=None, offsets=None):
+        self.blob = bytearray() if blob is None else blob
+        self.offsets = array('I', [0]) if offsets is None else offsets
+
+    def append(self, value):
+        self.blob += value.encode('utf-8')
+        end = len(self.blob)
+        if end > 0xFFFFFFFF and self.offsets.typecode == 'I':
+            self.offsets = array('q', self.offsets)
+        self.offsets.append(end)
+
+    def extend(self, other):
+        base = len(self.blob)
+        self.blob += other.blob
+        if len(self.blob) > 0xFFFFFFFF and self.offsets.typecode == 'I':
+            self.offsets = array('q', self.offsets)
+        shifted = _as_numpy(other.offsets)[1:].astype(np.int64) + base
+        self.offsets.frombytes(shifted.astype(self.offsets.typecode).tobytes())
+
+    def __getitem__(self, row_id):
+        return str(self.blob[self.offsets[row_id]:self.offsets[row_id + 1]], 'utf-8')
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def nbytes(self):
+        return len(self.blob) + len(self.offsets) * self.offsets.itemsize
+
+    def sections(self, name):
+        return [(f'{name}.blob', self.blob), (f'{name}.offsets', self.offsets)]
+
+
+class CategoricalColumn:
+    """Internerad kolumn: varje unikt värde lagras en gång, raderna lagrar en kod."""
+
+    def __init__(self, codes=None, values=None):
+        self.codes = array('H') if codes is None else codes
+        self.values = [] if values is None else values
+        self._lookup = {value: code for code, value in enumerate(self.values)}
+
+    def append(self, value):
+        code = self._lookup.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self._lookup[value] = code
+            if code > 0xFFFF and self.codes.typecode == 'H':
+                self.codes = array('I', self.codes)
+        self.codes.append(code)
+
+    def extend(self, other):
+        """Lägg till en annan kolumns rader; dess koder mappas om till denna kolumns värdelista."""
+        for value in other.values:
+            if value not in self._lookup:
+                self._lookup[value] = len(self.values)
+                self.values.append(value)
+        if len(self.values) > 0x10000 and self.codes.typecode == 'H':
+            self.codes = array('I', self.codes)
+        remap = np.array([self._lookup[value] for value in other.values], dtype=self.codes.typecode)
+        self.codes.frombytes(remap[_as_numpy(other.codes)].tobytes())
+
+    def __getitem__(self, row_id):
+        return self.values[self.codes[row_id]]
+
+    def __len__(self):
+        return len(self.codes)
+
+    def nbytes(self):
+        return len(self.codes) * self.codes.itemsize
+
+    def sections(self, name):
+        return [(f'{name}.codes', self.codes)]
+
+
+def char_lengths(column):
+    """Antal tecken (inte bytes) per rad i en StringColumn, utan att avkoda strängarna."""
+    blob = np.frombuffer(column.blob, dtype=np.uint8)
+    # utf-8: fortsättningsbytes (10xxxxxx) räknas inte som egna tecken
+    continuation = np.concatenate(([0], np.cumsum((blob & 0xC0) == 0x80)))
+    offsets = _as_numpy(column.offsets).astype(np.int64)
+    return np.diff(offsets) - np.diff(continuation[offsets])
+
+
+def char_length_array(column):
+    """char_lengths() som array('H') (längder över 65535 tecken kapas), t.ex. för en snapshot-sektion."""
+    lengths = array('H')
+    lengths.frombytes(np.minimum(char_lengths(column), 0xFFFF).astype(np.dtype('H')).tobytes())
+    return lengths
+
+
+def _as_numpy(buffer):
+    """numpy-vy över en array.array eller en (mmap-)memoryview utan kopiering."""
+    typecode = buffer.typecode if isinstance(buffer, array) else buffer.format
+    return np.frombuffer(buffer, dtype=np.dtype(typecode))
+
+
+def _new_column(name):
+    if name == 'PeOrgNr':
+        return OrgnrColumn()
+    if name in TEXT_COLUMNS:
+        return StringColumn()
+    return CategoricalColumn()
+
+
+# ============================================================================
+# REGISTER
+# ============================================================================
+
+class RegisterStore:
+    """
+    Kolumnbaserat SCB-register.
+
+    Rader läggs till med append() (värden i BULK_COLUMNS-ordning) och läses
+    med record(row_id), som bygger samma dict som den gamla bulk-parsningen.
+    name_keys innehåller det versaliserade namnet som namnindexet bygger på,
+    row_hashes en hash per rad (se row_hash).
+    """
+
+    def __init__(self, columns=None, name_keys=None, row_hashes=None):
+        self.columns = columns or {name: _new_column(name) for name in BULK_COLUMNS}
+        self.name_keys = StringColumn() if name_keys is None else name_keys
+        self.row_hashes = array('q') if row_hashes is None else row_hashes
+        self._ordered = [self.columns[name] for name in BULK_COLUMNS]
+        self.orgnr_index = None
+        self.exact_index = None
+        self.name_index = None
+        self.trigram_index = None
+
+    def __len__(self):
+        return len(self.name_keys)
+
+    def append(self, values):
+        for column, value in zip(self._ordered, values):
+            column.append(value)
+        self.name_keys.append(name_key(values[1], values[2]))
+        self.row_hashes.append(row_hash(values))
+
+    def extend(self, other):
+        """Lägg till alla rader från ett annat (index-löst) RegisterStore."""
+        for column, other_column in zip(self._ordered, other._ordered):
+            column.extend(other_column)
+        self.name_keys.extend(other.name_keys)
+        self.row_hashes.extend(other.row_hashes)
+
+    def record(self, row_id):
+        """Bygg företagsdict för en rad (endast för rader som faktiskt används)."""
+        return {name: column[row_id] for name, column in zip(BULK_COLUMNS, self._ordered)}
+
+    def build_indexes(self):
+        """Bygg org.nr-, exakt namn-, namnprefix- och trigram-index (rad-id) över hela registret."""
+        self.orgnr_index = OrgnrIndex.build(self)
+        self.exact_index = ExactNameIndex.build(self)
+        self.name_index = NameIndex.build(self)
+        self.trigram_index = TrigramIndex.build(self)
+
+    def merge_indexes(self, name_parts, trigram_parts):
+        """
+        Bygg index från delindex som parsats parallellt (se parse_bulk_file).
+
+        name_parts/trigram_parts: (nycklar, offsets, rad-id, bas) per radintervall,
+        i filordning. Org.nr- och exakt namn-indexen byggs om över hela registret.
+        """
+        self.orgnr_index = OrgnrIndex.build(self)
+        self.exact_index = ExactNameIndex.build(self)
+        self.name_index = NameIndex.from_postings(*_merge_postings(name_parts), self.name_keys)
+        self.trigram_index = TrigramIndex(*_merge_postings(trigram_parts), char_length_array(self.name_keys))
+
+    def nbytes(self):
+        """Ungefärlig minnesanvändning för kolumner + index (bytes)."""
+        total = sum(column.nbytes() for column in self._ordered) + self.name_keys.nbytes()
+        total += len(self.row_hashes) * self.row_hashes.itemsize
+        for index in (self.orgnr_index, self.exact_index, self.name_index, self.trigram_index):
+            if index is not None:
+                total += index.nbytes()
+        return total
+
+
+def _merge_postings(parts):
+    """
+    Slå ihop postlistor (nycklar, offsets, rad-id, bas) byggda över på varandra
+    följande radintervall. Resultatet blir identiskt med ett index byggt över
+    hela registret: sorterade nycklar, stigande rad-id per nyckel.
+    """
+    keys = sorted(set().union(*(part_keys for part_keys, _, _, _ in parts)))
+    key_pos = {key: pos for pos, key in enumerate(keys)}
+
+    key_ids, row_ids = [], []
+    for part_keys, part_offsets, part_rows, base in parts:
+        ids = np.fromiter((key_pos[key] for key in part_keys), dtype=np.int32, count=len(part_keys))
+        key_ids.append(np.repeat(ids, np.diff(_as_numpy(part_offsets))))
+        row_ids.append(_as_numpy(part_rows).astype(np.int64) + base)
+    key_ids = np.concatenate(key_ids)
+    row_ids = np.concatenate(row_ids)
+
+    # Stabil sortering: delarna ligger i filordning, så rad-id förblir stigande per nyckel
+    order = np.argsort(key_ids, kind='stable')
+    rows = array('I')
+    rows.frombytes(row_ids[order].astype(np.dtype('I')).tobytes())
+    offsets = array('q', [0])
+    offsets.frombytes(np.cumsum(np.bincount(key_ids, minlength=len(keys)), dtype=np.int64).tobytes())
+    return keys, offsets, rows
+
+
+class OrgnrIndex:
+    """10-siffrigt org.nr -> rad-id. Sorterad nyckelarray + binärsökning."""
+
+    def __init__(self, keys, rows):
+        self.keys = keys
+        self.rows = rows
+
+    @classmethod
+    def build(cls, store):
+        peorgnr = store.columns['PeOrgNr']
+        keys10 = array('q', (int(orgnr_key(peorgnr[row_id])) for row_id in range(len(store))))
+        # Stabil sortering: vid dubbletter vinner senaste raden (som i det gamla dict-indexet)
+        order = sorted(range(len(keys10)), key=keys10.__getitem__)
+        keys, rows = array('q'), array('I')
+        for row_id in order:
+            key = keys10[row_id]
+            if keys and keys[-1] == key:
+                rows[-1] = row_id
+            else:
+                keys.append(key)
+                rows.append(row_id)
+        return cls(keys, rows)
+
+    def get(self, orgnr):
+        """Rad-id för ett 10-siffrigt org.nr, eller None."""
+        if not orgnr or not orgnr.isdigit():
+            return None
+        key = int(orgnr)
+        pos = bisect.bisect_left(self.keys, key)
+        if pos < len(self.keys) and self.keys[pos] == key:
+            return self.rows[pos]
+        return None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def nbytes(self):
+        return len(self.keys) * self.keys.itemsize + len(self.rows) * self.rows.itemsize
+
+    def sections(self):
+        return [('orgnr_keys', self.keys), ('orgnr_rows', self.rows)]
+
+
+class ExactNameIndex:
+    """
+    Exakt name_key -> lägsta rad-id med det namnet, i O(1).
+
+    Hashtabell med öppen adressering (linjär probning) över 64-bitars
+    namnhashar; tabellen är minst dubbelt så stor som antalet rader.
+    Tomma platser har rad-id EMPTY.
+    """
+
+    EMPTY = 0xFFFFFFFF
+
+    def __init__(self, hashes, rows, name_keys):
+        self.hashes = hashes
+        self.rows = rows
+        self.name_keys = name_keys
+        self._mask = len(rows) - 1
+
+    @classmethod
+    def build(cls, store):
+        name_keys = store.name_keys
+        count = len(name_keys)
+        name_hashes = np.fromiter((name_hash(name_keys[row_id]) for row_id in range(count)),
+                                  dtype=np.int64, count=count)
+        size = 1 << max(1, (2 * count - 1).bit_length())
+        mask = size - 1
+
+        table_hashes = np.zeros(size, dtype=np.int64)
+        table_rows = np.full(size, cls.EMPTY, dtype=np.uint32)
+
+        # Placera alla rader parallellt, en probe-runda i taget. pending är
+        # sorterad på rad-id, så vid krock vinner lägsta rad-id den tidigaste
+        # platsen (det är den get() hittar först för dubblettnamn).
+        pending = np.arange(count, dtype=np.int64)
+        probe = 0
+        while pending.size:
+            slots = (name_hashes[pending] + probe) & mask
+            free = table_rows[slots] == cls.EMPTY
+            slots_free, first = np.unique(slots[free], return_index=True)
+            placed = pending[free][first]
+            table_rows[slots_free] = placed
+            table_hashes[slots_free] = name_hashes[placed]
+            keep = np.ones(pending.size, dtype=bool)
+            keep[np.flatnonzero(free)[first]] = False
+            pending = pending[keep]
+            probe += 1
+
+        hashes, rows = array('q'), array('I')
+        hashes.frombytes(table_hashes.tobytes())
+        rows.frombytes(table_rows.astype(np.dtype('I')).tobytes())
+        return cls(hashes, rows, name_keys)
+
+    def get(self, name):
+        """Lägsta rad-id vars name_key är exakt name, eller None."""
+        key = name_hash(name)
+        slot = key & self._mask
+        while True:
+            row_id = self.rows[slot]
+            if row_id == self.EMPTY:
+                return None
+            if self.hashes[slot] == key and self.name_keys[row_id] == name:
+                return row_id
+            slot = (slot + 1) & self._mask
+
+    def nbytes(self):
+        return len(self.hashes) * self.hashes.itemsize + len(self.rows) * self.rows.itemsize
+
+    def sections(self):
+        return [('exact_hashes', self.hashes), ('exact_rows', self.rows)]
+
+
+def _prefix_postings(name_keys):
+    """Första 3 tecknen -> rad-id i radordning: (prefix, offsets, rad-id)."""
+    buckets = {}
+    for row_id in range(len(name_keys)):
+        key = name_keys[row_id]
+        if len(key) >= 3:
+            buckets.setdefault(key[:3], array('I')).append(row_id)
+    prefixes = sorted(buckets)
+    offsets, rows = array('q', [0]), array('I')
+    for prefix in prefixes:
+        rows.extend(buckets.pop(prefix))
+        offsets.append(len(rows))
+    return prefixes, offsets, rows
+
+
+class NameIndex:
+    """
+    Första 3 tecknen i namnet -> rad-id (platt lista med bucket-offsets).
+
+    Varje bucket är sorterad på namnlängd (tecken), sedan rad-id, och
+    lengths ligger parallellt med rows. window() hämtar därför bara de
+    kandidater vars längd kan nå tröskeln (se length_window) med binärsökning.
+    """
+
+    def __init__(self, prefixes, offsets, rows, lengths):
+        self.prefixes = prefixes
+        self.offsets = offsets
+        self.rows = rows
+        self.lengths = lengths
+        self._prefix_pos = {prefix: pos for pos, prefix in enumerate(prefixes)}
+
+    @classmethod
+    def build(cls, store):
+        return cls.from_postings(*_prefix_postings(store.name_keys), store.name_keys)
+
+    @classmethod
+    def from_postings(cls, prefixes, offsets, rows, name_keys):
+        """Sortera buckets (i radordning) på namnlängd och spara längderna."""
+        row_ids = _as_numpy(rows).astype(np.int64)
+        row_lengths = np.minimum(char_lengths(name_keys)[row_ids], 0xFFFF)
+        bucket_ids = np.repeat(np.arange(len(prefixes)), np.diff(_as_numpy(offsets)))
+        order = np.lexsort((row_ids, row_lengths, bucket_ids))
+
+        sorted_rows, lengths = array('I'), array('H')
+        sorted_rows.frombytes(row_ids[order].astype(np.dtype('I')).tobytes())
+        lengths.frombytes(row_lengths[order].astype(np.dtype('H')).tobytes())
+        return cls(prefixes, offsets, sorted_rows, lengths)
+
+    def bucket(self, prefix):
+        """Rad-id för alla namn med prefixet, kortast först (tom om prefixet saknas)."""
+        pos = self._prefix_pos.get(prefix)
+        if pos is None:
+            return ()
+        return self.rows[self.offsets[pos]:self.offsets[pos + 1]]
+
+    def window(self, prefix, min_length, max_length):
+        """Rad-id för namn med prefixet och längd inom [min_length, max_length]."""
+        pos = self._prefix_pos.get(prefix)
+        if pos is None:
+            return ()
+        start = bisect.bisect_left(self.lengths, min_length, self.offsets[pos], self.offsets[pos + 1])
+        end = bisect.bisect_right(self.lengths, max_length, start, self.offsets[pos + 1])
+        return self.rows[start:end]
+
+    def __contains__(self, prefix):
+        return prefix in self._prefix_pos
+
+    def __len__(self):
+        return len(self.prefixes)
+
+    def nbytes(self):
+        return (len(self.offsets) * self.offsets.itemsize + len(self.rows) * self.rows.itemsize
+                + len(self.lengths) * self.lengths.itemsize)
+
+    def sections(self):
+        return [('bucket_offsets', self.offsets), ('bucket_rows', self.rows), ('bucket_lengths', self.lengths)]
+
+
+class TrigramIndex:
+    """
+    Inverterat index: namn-trigram -> sorterad lista av rad-id.
+
+    Används för att hämta fuzzy-kandidater oberoende av namnets första tecken.
+    candidates() räknar gemensamma trigram och returnerar bara de bästa
+    kandidaterna, så att den dyra scorern körs mot ett fåtal namn oavsett
+    hur vanligt prefixet är.
+    """
+
+    def __init__(self, grams, offsets, rows, name_lengths):
+        self.grams = grams
+        self.offsets = offsets
+        self.rows = rows
+        self.name_lengths = name_lengths        # Tecken per rad (char_length_array), inte bytes
+        self._gram_pos = {gram: pos for pos, gram in enumerate(grams)}
+        # numpy-vyer (ingen kopiering) för räkning av postlistor
+        self._rows_np = _as_numpy(rows)
+        self._name_lengths = _as_numpy(name_lengths)
+
+    @classmethod
+    def build(cls, store):
+        return cls.from_names(store.name_keys)
+
+    @classmethod
+    def from_names(cls, name_keys):
+        """Bygg indexet över en StringColumn med namn (rad-id = position i kolumnen)."""
+        postings = {}
+        for row_id in range(len(name_keys)):
+            for gram in trigrams(name_keys[row_id]):
+                posting = postings.get(gram)
+                if posting is None:
+                    posting = postings[gram] = array('I')
+                posting.append(row_id)
+        grams = sorted(postings)
+        offsets, rows = array('q', [0]), array('I')
+        for gram in grams:
+            rows.extend(postings.pop(gram))
+            offsets.append(len(rows))
+        return cls(grams, offsets, rows, char_length_array(name_keys))
+
+    def posting(self, gram):
+        pos = self._gram_pos.get(gram)
+        if pos is None:
+            return self._rows_np[:0]
+        return self._rows_np[self.offsets[pos]:self.offsets[pos + 1]]
+
+    def candidates(self, name, min_score, limit):
+        """
+        Rad-id för de (högst limit) namn som liknar name mest på trigramnivå.
+
+        Count-filter: kandidater med färre gemensamma trigram än
+        min_shared_trigrams() kan inte nå min_score och tas bort. Övriga
+        rangordnas på Dice-likhet (gemensamma trigram relativt båda namnens
+        trigramantal, ungefär namnlängden), lägst rad-id vid lika.
+        """
+        grams = trigrams(name)
+        threshold = min_shared_trigrams(len(name), len(grams), min_score)
+        postings = [posting for posting in map(self.posting, grams) if len(posting)]
+        if len(postings) < threshold:
+            return []
+
+        counts = np.bincount(np.concatenate(postings))
+        rows = np.flatnonzero(counts >= threshold)
+        if not rows.size:
+            return []
+
+        dice = 2 * counts[rows] / (len(grams) + self._name_lengths[rows].astype(np.int64))
+        if rows.size > limit:
+            top = np.argpartition(-dice, limit - 1)[:limit]
+            rows, dice = rows[top], dice[top]
+        order = np.lexsort((rows, -dice))
+        return rows[order].tolist()
+
+    def __len__(self):
+        return len(self.grams)
+
+    def nbytes(self):
+        return (len(self.offsets) * self.offsets.itemsize + len(self.rows) * self.rows.itemsize
+                + len(self.name_lengths) * self.name_lengths.itemsize)
+
+    def sections(self):
+        return [('trigram_offsets', self.offsets), ('trigram_rows', self.rows),
+                ('trigram_name_lengths', self.name_lengths)]
+
+
+# ============================================================================
+# PARSNING AV BULK-FILEN
+# ============================================================================
+
+def is_compressed(bulk_file_path):
+    """True för .gz/.bz2/.zst-filer."""
+    return str(bulk_file_path).lower().endswith(COMPRESSED_SUFFIXES)
+
+
+def open_bulk_file(bulk_file_path):
+    """
+    Öppna bulk-filen binärt. Komprimerade filer (.gz, .bz2, .zst) dekomprimeras
+    strömmande med stor läsbuffert; positioner avser då den okomprimerade
+    strömmen.
+    """
+    suffix = os.path.splitext(str(bulk_file_path))[1].lower()
+    if suffix == '.gz':
+        return io.BufferedReader(gzip.GzipFile(bulk_file_path, 'rb'), buffer_size=_READ_BUFFER)
+    if suffix == '.bz2':
+        return io.BufferedReader(bz2.BZ2File(bulk_file_path, 'rb'), buffer_size=_READ_BUFFER)
+    if suffix == '.zst':
+        try:
+            import zstandard
+        except ImportError as e:
+            raise SystemExit("Saknar 'zstandard'. Installera: pip install zstandard") from e
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            open(bulk_file_path, 'rb'), read_size=_READ_BUFFER, closefd=True)
+        return io.BufferedReader(reader, buffer_size=_READ_BUFFER)
+    return open(bulk_file_path, 'rb')
+
+
+def _read_header(bulk_file_path):
+    """Header-kolumner och headerns längd i bytes."""
+    with open_bulk_file(bulk_file_path) as f:
+        raw = f.readline()
+    return raw.decode('latin-1').strip().split('\t'), len(raw)
+
+
+def _byte_ranges(bulk_file_path, start, parts):
+    """
+    Dela [start, filslut) i upp till `parts` byte-intervall som börjar direkt efter ett radslut.
+    Komprimerade filer kan inte delas: ett intervall (start, None) = till strömmens slut.
+    """
+    if is_compressed(bulk_file_path):
+        return [(start, None)]
+    size = os.path.getsize(bulk_file_path)
+    bounds = [start]
+    with open(bulk_file_path, 'rb') as f:
+        for k in range(1, parts):
+            offset = max(start + (size - start) * k // parts, bounds[-1])
+            f.seek(offset)
+            f.readline()          # fortsätt till nästa radslut
+            bounds.append(min(f.tell(), size))
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+def _iter_lines(bulk_file_path, start, end=None):
+    """
+    Rader (latin-1, universella radslut som i textläge) inom byte-intervallet
+    [start, end). end=None läser till filens/strömmens slut.
+    """
+    with open_bulk_file(bulk_file_path) as f:
+        if f.seekable():
+            f.seek(start)
+        else:
+            f.read(start)                 # zstd-strömmen kan inte sökas
+        while end is None or f.tell() < end:
+            block = f.read(_HASH_CHUNK if end is None else min(_HASH_CHUNK, end - f.tell()))
+            if not block:
+                break
+            if end is None or f.tell() < end:
+                block += f.readline()     # blocket slutar alltid på ett radslut
+            yield from io.StringIO(block.decode('latin-1'), newline=None)
+
+
+def parse_stats():
+    """Räknare för _iter_records: lästa rader och rader med ogiltigt PeOrgNr (med några exempel)."""
+    return {'lines': 0, 'skipped_orgnr': 0, 'skipped_examples': []}
+
+
+def report_skipped(stats):
+    """Skriv ut antalet rader med ogiltigt PeOrgNr och några exempel (inget om alla var giltiga)."""
+    if stats['skipped_orgnr']:
+        examples = ', '.join(repr(value) for value in stats['skipped_examples'])
+        print(f"   ⚠️  Hoppade över {stats['skipped_orgnr']:,} rader med ogiltigt PeOrgNr (t.ex. {examples})")
+
+
+def _iter_records(lines, header_len, wanted, stripped, stats, progress=False):
+    """
+    Värden (BULK_COLUMNS-ordning) för giltiga rader. stats (se parse_stats)
+    räknar 'lines' och 'skipped_orgnr'; PeOrgNr med bindestreck/blanksteg
+    normaliseras, övriga ogiltiga sparas i 'skipped_examples'.
+    """
+    for line in lines:
+        stats['lines'] += 1
+        if progress and stats['lines'] % 100000 == 0:
+            print(f"   Läst {stats['lines']:,} rader...")
+
+        parts = line.strip().split('\t')
+        if len(parts) < header_len:
+            continue
+
+        values = [parts[i].strip() if strip else parts[i] for i, strip in zip(wanted, stripped)]
+
+        # Skip om inget namn (Namn, Foretagsnamn)
+        if not values[1] and not values[2]:
+            continue
+        orgnr = values[0].replace('-', '').replace(' ', '')
+        if not orgnr.isdigit() or len(orgnr) > 18:    # Måste rymmas i ett int64
+            stats['skipped_orgnr'] += 1
+            if len(stats['skipped_examples']) < SKIPPED_EXAMPLES:
+                stats['skipped_examples'].append(values[0])
+            continue
+        values[0] = orgnr
+
+        yield values
+
+
+def _column_layout(header):
+    """Kolumnindex för BULK_COLUMNS i filens header, och vilka som ska trimmas."""
+    col_idx = {col_name: i for i, col_name in enumerate(header)}
+    wanted = [col_idx[name] for name in BULK_COLUMNS]
+    stripped = [name in STRIPPED_COLUMNS for name in BULK_COLUMNS]
+    return wanted, stripped
+
+
+def iter_bulk_records(bulk_file_path, stats=None, progress=False):
+    """
+    Strömma bulk-filens giltiga rader som värdelistor i BULK_COLUMNS-ordning,
+    utan att bygga något register (t.ex. för import till en annan databas).
+    """
+    stats = parse_stats() if stats is None else stats
+    header, header_bytes = _read_header(bulk_file_path)
+    wanted, stripped = _column_layout(header)
+    lines = _iter_lines(bulk_file_path, header_bytes)
+    yield from _iter_records(lines, len(header), wanted, stripped, stats, progress)
+
+
+def _parse_range(bulk_file_path, start, end, header_len, wanted, stripped, progress=False):
+    """Parsa ett byte-intervall av bulk-filen till ett RegisterStore (utan index), plus räknarna (parse_stats)."""
+    store = RegisterStore()
+    stats = parse_stats()
+    lines = _iter_lines(bulk_file_path, start, end)
+    for values in _iter_records(lines, header_len, wanted, stripped, stats, progress):
+        store.append(values)
+    return store, stats
+
+
+def _parse_range_with_indexes(*args):
+    """Worker: parsa ett byte-intervall och bygg dess del av namn- och trigramindexen."""
+    store, stats = _parse_range(*args)
+    trigram_index = TrigramIndex.build(store)
+    return (store, stats,
+            _prefix_postings(store.name_keys),
+            (trigram_index.grams, trigram_index.offsets, trigram_index.rows))
+
+
+def parse_bulk_file(bulk_file_path, workers=1):
+    """
+    Läs bulk-filen (latin-1, tab-separerad) till ett RegisterStore med index.
+
+    Med workers > 1 delas filen i radjusterade byte-intervall som parsas
+    (och namn-/trigramindexeras) i varsin process. Delregistren och
+    delindexen slås ihop i filordning, med samma rad-id och index som
+    seriell parsning. Komprimerade filer (.gz, .bz2, .zst) läses alltid
+    som en ström i en process.
+    """
+    print(f"📂 Läser bulk-fil: {bulk_file_path}")
+    print("   Detta kan ta någon minut för 1.8M rader...")
+
+    header, header_bytes = _read_header(bulk_file_path)
+    wanted, stripped = _column_layout(header)
+
+    print(f"   Kolumner: {len(header)}")
+
+    ranges = _byte_ranges(bulk_file_path, header_bytes, max(1, workers))
+    if len(ranges) <= 1:
+        if is_compressed(bulk_file_path):
+            print("   Komprimerad fil – dekomprimeras strömmande")
+        store, stats = _parse_range(
+            bulk_file_path, header_bytes, None, len(header), wanted, stripped, progress=True)
+        store.build_indexes()
+    else:
+        print(f"   Parsar {len(ranges)} delar parallellt...")
+        store = RegisterStore()
+        stats = parse_stats()
+        name_parts, trigram_parts = [], []
+        with ProcessPoolExecutor(max_workers=len(ranges)) as pool:
+            futures = [pool.submit(_parse_range_with_indexes, bulk_file_path, start, end,
+                                   len(header), wanted, stripped)
+                       for start, end in ranges]
+            for future in futures:
+                part, part_stats, name_part, trigram_part = future.result()
+                base = len(store)
+                name_parts.append((*name_part, base))
+                trigram_parts.append((*trigram_part, base))
+                store.extend(part)
+                stats['lines'] += part_stats['lines']
+                stats['skipped_orgnr'] += part_stats['skipped_orgnr']
+                stats['skipped_examples'].extend(part_stats['skipped_examples'])
+                del stats['skipped_examples'][SKIPPED_EXAMPLES:]
+                print(f"   Läst {stats['lines']:,} rader...")
+        store.merge_indexes(name_parts, trigram_parts)
+
+    print(f"✅ Läst {stats['lines']:,} rader")
+    report_skipped(stats)
+    print(f"   Org.nr index: {len(store.orgnr_index):,} företag")
+    print(f"   Namn prefix index: {len(store.name_index):,} prefix")
+    print(f"   Trigram index: {len(store.trigram_index):,} trigram")
+    print(f"   Minne (kolumner + index): {store.nbytes() / 1024 / 1024:,.0f} MB")
+    return store
+
+
+# ============================================================================
+# FINGERPRINT AV BULK-FILEN
+# ============================================================================
+
+def file_hash(path):
+    """blake2b-hash av hela filen (läses i block om 8 MB)."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(_HASH_CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def source_fingerprint(path, with_hash=True):
+    """Storlek, mtime och (valfritt) hash för bulk-filen."""
+    st = os.stat(path)
+    fingerprint = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    if with_hash:
+        fingerprint['hash'] = file_hash(path)
+    return fingerprint
+
+
+def default_snapshot_path(bulk_file_path):
+    return str(bulk_file_path) + SNAPSHOT_SUFFIX
+
+
+# ============================================================================
+# SKRIVNING
+# ============================================================================
+
+def _pad(f):
+    pos = f.tell()
+    if pos % _ALIGN:
+        f.write(b'\0' * (_ALIGN - pos % _ALIGN))
+
+
+def write_snapshot(path, store, source):
+    """
+    Skriv registret (kolumner + index) till en snapshot-fil.
+
+    Layout: magic | sektioner (8-byte-alignade) | header (JSON) | header-offset | header-längd
+    Kategorikolumnernas värdelistor och namnprefixen ligger i headern.
+    """
+    sections = []
+    for name in BULK_COLUMNS:
+        sections.extend(store.columns[name].sections(name))
+    sections.extend(store.name_keys.sections('name_keys'))
+    sections.append(('row_hashes', store.row_hashes))
+    sections.extend(store.orgnr_index.sections())
+    sections.extend(store.exact_index.sections())
+    sections.extend(store.name_index.sections())
+    sections.extend(store.trigram_index.sections())
+
+    header = {
+        'version': SNAPSHOT_VERSION,
+        'byteorder': sys.byteorder,
+        'source': source,
+        'columns': BULK_COLUMNS,
+        'row_count': len(store),
+        'categories': {
+            name: column.values
+            for name, column in store.columns.items()
+            if isinstance(column, CategoricalColumn)
+        },
+        'prefixes': store.name_index.prefixes,
+        'trigrams': store.trigram_index.grams,
+        'sections': {},
+    }
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC)
+        for name, data in sections:
+            _pad(f)
+            is_array = isinstance(data, array)
+            offset = f.tell()
+            f.write(data.tobytes() if is_array else data)
+            header['sections'][name] = [offset, f.tell() - offset, data.typecode if is_array else 'B']
+        header_offset = f.tell()
+        header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+        f.write(header_bytes)
+        f.write(header_offset.to_bytes(8, 'little'))
+        f.write(len(header_bytes).to_bytes(8, 'little'))
+    os.replace(tmp_path, path)
+
+
+# ============================================================================
+# LÄSNING
+# ============================================================================
+
+def read_snapshot_header(path):
+    """Läs endast headern (används för att kontrollera om snapshoten är aktuell)."""
+    with open(path, 'rb') as f:
+        if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            raise ValueError(f'Inte en SCB-snapshot: {path}')
+        f.seek(-16, os.SEEK_END)
+        header_offset = int.from_bytes(f.read(8), 'little')
+        header_len = int.from_bytes(f.read(8), 'little')
+        f.seek(header_offset)
+        return json.loads(f.read(header_len).decode('utf-8'))
+
+
+def snapshot_is_current(snapshot_path, bulk_file_path):
+    """
+    Kontrollera att snapshoten är byggd från just den här bulk-filen.
+
+    Snabb väg: storlek + mtime stämmer. Om bara mtime skiljer (t.ex. filen
+    har kopierats) jämförs hashen innan snapshoten underkänns.
+    """
+    if not os.path.exists(snapshot_path):
+        return False
+    try:
+        header = read_snapshot_header(snapshot_path)
+    except (ValueError, OSError, json.JSONDecodeError):
+        return False
+
+    if header.get('version') != SNAPSHOT_VERSION or header.get('byteorder') != sys.byteorder:
+        return False
+
+    source = header.get('source', {})
+    current = source_fingerprint(bulk_file_path, with_hash=False)
+    if current['size'] != source.get('size'):
+        return False
+    if current['mtime_ns'] == source.get('mtime_ns'):
+        return True
+    return file_hash(bulk_file_path) == source.get('hash')
+
+
+class RegisterSnapshot:
+    """
+    Minnesmappad snapshot. Kolumner och index är memoryviews direkt mot
+    filen, så OS:et läser bara in de sidor som faktiskt används.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.header = read_snapshot_header(path)
+        if self.header.get('version') != SNAPSHOT_VERSION:
+            raise ValueError(f"Snapshot-version {self.header.get('version')} stöds inte (förväntade {SNAPSHOT_VERSION})")
+
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        self._sections = []
+
+        categories = self.header['categories']
+        columns = {}
+        for name in BULK_COLUMNS:
+            if name == 'PeOrgNr':
+                columns[name] = OrgnrColumn(self.section(name), self.section(f'{name}.widths'))
+            elif name in TEXT_COLUMNS:
+                columns[name] = StringColumn(self.section(f'{name}.blob'), self.section(f'{name}.offsets'))
+            else:
+                columns[name] = CategoricalColumn(self.section(f'{name}.codes'), categories[name])
+
+        self.store = RegisterStore(
+            columns,
+            StringColumn(self.section('name_keys.blob'), self.section('name_keys.offsets')),
+            self.section('row_hashes'),
+        )
+        self.store.orgnr_index = OrgnrIndex(self.section('orgnr_keys'), self.section('orgnr_rows'))
+        self.store.exact_index = ExactNameIndex(
+            self.section('exact_hashes'), self.section('exact_rows'), self.store.name_keys
+        )
+        self.store.name_index = NameIndex(
+            self.header['prefixes'], self.section('bucket_offsets'), self.section('bucket_rows'),
+            self.section('bucket_lengths'),
+        )
+        self.store.trigram_index = TrigramIndex(
+            self.header['trigrams'], self.section('trigram_offsets'), self.section('trigram_rows'),
+            self.section('trigram_name_lengths'),
+        )
+
+    def section(self, name):
+        offset, nbytes, typecode = self.header['sections'][name]
+        view = self._view[offset:offset + nbytes]
+        if typecode != 'B':
+            view = view.cast(typecode)
+        self._sections.append(view)
+        return view
+
+    def close(self):
+        self.store = None
+        for view in self._sections:
+            view.release()
+        self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+
+# ============================================================================
+# DELTA MELLAN LEVERANSER
+# ============================================================================
+
+class RegisterDelta:
+    """
+    Skillnaden mellan två leveranser av registret, nycklad på PeOrgNr.
+
+    added:   rad-id i nya registret vars PeOrgNr saknas i det gamla
+    removed: rad-id i gamla registret vars PeOrgNr saknas i det nya
+    changed_old/changed_new: samma PeOrgNr men olika radhash (parvis)
+    old/new: de jämförda registren
+    """
+
+    def __init__(self, old, new, added, removed, changed_old, changed_new):
+        self.old = old
+        self.new = new
+        self.added = added
+        self.removed = removed
+        self.changed_old = changed_old
+        self.changed_new = changed_new
+
+    def touched_rows(self):
+        """Rad-id i nya registret som är nya eller ändrade."""
+        return np.union1d(self.added, self.changed_new)
+
+    def __len__(self):
+        return len(self.added) + len(self.removed) + len(self.changed_new)
+
+
+def _rows_by_peorgnr(store):
+    """Sorterade PeOrgNr och deras rad-id. Vid dubbletter gäller sista raden (som i OrgnrIndex)."""
+    peorgnr = _as_numpy(store.columns['PeOrgNr'].values)
+    keys, first_reversed = np.unique(peorgnr[::-1], return_index=True)
+    return keys, len(peorgnr) - 1 - first_reversed
+
+
+def diff_registers(old, new):
+    """Jämför två RegisterStore på PeOrgNr + radhash och returnera en RegisterDelta."""
+    old_keys, old_rows = _rows_by_peorgnr(old)
+    new_keys, new_rows = _rows_by_peorgnr(new)
+    _, old_pos, new_pos = np.intersect1d(old_keys, new_keys, assume_unique=True, return_indices=True)
+
+    added = np.sort(np.delete(new_rows, new_pos))
+    removed = np.sort(np.delete(old_rows, old_pos))
+
+    old_common = old_rows[old_pos]
+    new_common = new_rows[new_pos]
+    differs = _as_numpy(old.row_hashes)[old_common] != _as_numpy(new.row_hashes)[new_common]
+    return RegisterDelta(old, new, added, removed, old_common[differs], new_common[differs])
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Lokal stand-in för SCB:s HamtaForetag-API (offline-test av genomströmning)
+
+Implementerar samma POST-kontrakt som skripten använder (scb_client), utan
+mTLS och utan nätverk, så att klientens takt, retry-beteende och cache kan
+mätas lokalt:
+
+- Data från det lokala registret (--register-db), en bulk-fil (--bulk,
+  importeras till registret första gången) eller en JSON-fixture (--fixture,
+  lista med API-rader)
+- Operatorer: Innehaller, ArLikaMed, BorjarPa på Namn, PostOrt och
+  OrgNr (10 siffror); Företagsstatus "1" ger bara verksamma företag
+- Latens: fast, uniform, exponentiell eller lognormal fördelning
+- Felinjektion: slumpade 5xx (--error-rate), slumpade 429 (--p429) och en
+  serverside token bucket (--max-rate) som svarar 429 med Retry-After
+- GET /stats ger räknare som JSON; sammanfattning skrivs ut vid Ctrl-C
+
+Peka skripten mot servern i config.ini:
+
+    [SCB]
+    api_url = http://127.0.0.1:8089/HamtaForetag
+
+Usage:
+    python3 tools/scb_stub_server.py --register-db databases/scb_register.db
+    python3 tools/scb_stub_server.py --bulk /path/to/scb_bulk.txt --latency-ms 300 --latency-dist lognormal
+    python3 tools/scb_stub_server.py --fixture fixtures.json --max-rate 2 --retry-after 3 --error-rate 0.02
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from scb_client.local_register import MAX_ROWS, LocalRegister
+
+DEFAULT_PORT = 8089
+DEFAULT_REGISTER_DB = 'databases/scb_register.db'
+
+# Variabel i payloaden -> fält i API-raden
+VARIABLE_FIELDS = {
+    'Namn': 'Företagsnamn',
+    'PostOrt': 'PostOrt',
+    'OrgNr (10 siffror)': 'OrgNr',
+    'OrgNr': 'OrgNr',
+}
+OPERATORS = ('Innehaller', 'ArLikaMed', 'BorjarPa')
+
+
+class BadRequest(Exception):
+    """Payload som det riktiga API:et skulle svara 400 på."""
+
+
+# =============================================================================
+# DATA
+# =============================================================================
+
+def _normalize(variable, value):
+    value = ' '.join(str(value or '').split()).casefold()
+    return value.replace('-', '') if VARIABLE_FIELDS.get(variable) == 'OrgNr' else value
+
+
+def parse_conditions(payload):
+    """[(variabel, operator, normaliserat värde)] ur payloaden. BadRequest om något inte stöds."""
+    variables = payload.get('variabler')
+    if not isinstance(variables, list) or not variables:
+        raise BadRequest("'variabler' saknas")
+    conditions = []
+    for variable in variables:
+        name, operator = variable.get('Variabel'), variable.get('Operator')
+        if name not in VARIABLE_FIELDS:
+            raise BadRequest(f"Variabel stöds inte: {name}")
+        if operator not in OPERATORS:
+            raise BadRequest(f"Operator stöds inte: {operator}")
+        conditions.append((name, operator, _normalize(name, variable.get('Varde1'))))
+    return conditions
+
+
+def row_matches(row, conditions):
+    for variable, operator, value in conditions:
+        field = _normalize(variable, row.get(VARIABLE_FIELDS[variable], ''))
+        if operator == 'Innehaller' and value not in field:
+            return False
+        if operator == 'ArLikaMed' and field != value:
+            return False
+        if operator == 'BorjarPa' and not field.startswith(value):
+            return False
+    return True
+
+
+def is_active(row):
+    return str(row.get('Företagsstatus, kod', '1')).strip() in ('', '1')
+
+
+class FixtureBackend:
+    """API-rader i minnet (JSON-lista). Linjär sökning – för små testdata."""
+
+    def __init__(self, path):
+        with open(path, encoding='utf-8') as f:
+            self.rows = [row for row in json.load(f) if isinstance(row, dict)]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def search(self, conditions, limit, active_only):
+        hits = []
+        for row in self.rows:
+            if (not active_only or is_active(row)) and row_matches(row, conditions):
+                hits.append(row)
+                if len(hits) >= limit:
+                    break
+        return hits
+
+
+class RegisterBackend:
+    """Det lokala registret (scb_client.local_register): org.nr-index och FTS5 trigram."""
+
+    def __init__(self, path):
+        self.register = LocalRegister(path)
+        self.lock = threading.Lock()        # En sqlite-anslutning delas av alla trådar
+
+    def __len__(self):
+        return len(self.register)
+
+    def search(self, conditions, limit, active_only):
+        with self.lock:
+            orgnr = [value for variable, operator, value in conditions
+                     if VARIABLE_FIELDS[variable] == 'OrgNr' and operator == 'ArLikaMed']
+            names = [value for variable, operator, value in conditions
+                     if variable == 'Namn' and operator == 'Innehaller']
+            if orgnr:
+                rows = self.register.lookup_orgnr(orgnr[0])
+            elif names:
+                rows = self.register.search(names[0], limit=MAX_ROWS, active_only=active_only)
+            else:
+                raise BadRequest("Stand-in kräver Namn/Innehaller eller OrgNr/ArLikaMed mot registret")
+        rows = [row for row in rows if (not active_only or is_active(row)) and row_matches(row, conditions)]
+        return rows[:limit]
+
+
+def open_backend(args):
+    if args.fixture:
+        return FixtureBackend(args.fixture)
+    if args.bulk:
+        import import_scb_register
+        if not import_scb_register.register_is_current(args.register_db, args.bulk):
+            Path(args.register_db).parent.mkdir(parents=True, exist_ok=True)
+            import_scb_register.import_register(args.bulk, args.register_db)
+    if not Path(args.register_db).exists():
+        raise SystemExit(f"❌ Register saknas: {args.register_db} (ange --bulk, --register-db eller --fixture)")
+    return RegisterBackend(args.register_db)
+
+
+# =============================================================================
+# LATENS OCH FELINJEKTION
+# =============================================================================
+
+class Behaviour:
+    """Latensfördelning, felinjektion och serverside rate limit (delas av alla trådar)."""
+
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.lock = threading.Lock()
+        self.tokens = float(args.burst)
+        self.updated = time.monotonic()
+
+    def latency(self):
+        a = self.args
+        mean = a.latency_ms / 1000
+        with self.lock:
+            if a.latency_dist == 'uniform':
+                return max(0.0, self.rng.uniform(mean * (1 - a.latency_spread), mean * (1 + a.latency_spread)))
+            if a.latency_dist == 'exponential':
+                return self.rng.expovariate(1 / mean) if mean > 0 else 0.0
+            if a.latency_dist == 'lognormal':
+                # Median = latency_ms, spridning = sigma i log-skala
+                return self.rng.lognormvariate(math.log(mean), a.latency_spread) if mean > 0 else 0.0
+        return mean
+
+    def rate_limited(self):
+        """True om anropet ska få 429 (token bucket över --max-rate, eller slumpat --p429)."""
+        with self.lock:
+            if self.args.max_rate:
+                now = time.monotonic()
+                self.tokens = min(self.args.burst, self.tokens + (now - self.updated) * self.args.max_rate)
+                self.updated = now
+                if self.tokens < 1:
+                    return True
+                self.tokens -= 1
+            return self.rng.random() < self.args.p429
+
+    def server_error(self):
+        with self.lock:
+            if self.rng.random() < self.args.error_rate:
+                return self.rng.choice((500, 502, 503))
+        return None
+
+    def retry_after(self):
+        """Retry-After-headern (sekunder eller HTTP-datum), eller None."""
+        a = self.args
+        if a.retry_after_format == 'none':
+            return None
+        if a.retry_after_format == 'date':
+            return formatdate(time.time() + a.retry_after, usegmt=True)
+        return f"{a.retry_after:g}"
+
+
+# =============================================================================
+# HTTP
+# =============================================================================
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {'requests': 0, 'ok': 0, 'rate_limited': 0, 'server_errors': 0,
+                       'bad_requests': 0, 'rows': 0, 'latency_sec': 0.0}
+        self.started = time.time()
+
+    def add(self, **counts):
+        with self.lock:
+            for key, value in counts.items():
+                self.counts[key] += value
+
+    def snapshot(self):
+        with self.lock:
+            counts = dict(self.counts)
+        elapsed = time.time() - self.started
+        counts['uptime_sec'] = round(elapsed, 1)
+        counts['requests_per_sec'] = round(counts['requests'] / elapsed, 2) if elapsed else 0.0
+        counts['latency_sec'] = round(counts['latency_sec'], 3)
+        return counts
+
+
+def make_handler(backend, behaviour, stats, quiet):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'       # Keep-alive, som det riktiga API:et
+
+        def log_message(self, format, *args):
+            if not quiet:
+                super().log_message(format, *args)
+
+        def _send(self, status, body=None, headers=None):
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8') if body is not None else b''
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip('/') == '/stats':
+                self._send(200, stats.snapshot())
+            else:
+                self._send(404, {'error': 'not found'})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length)
+            stats.add(requests=1)
+            if not self.path.rstrip('/').endswith('HamtaForetag'):
+                self._send(404, {'error': 'not found'})
+                return
+
+            delay = behaviour.latency()
+            time.sleep(delay)
+            stats.add(latency_sec=delay)
+
+            if behaviour.rate_limited():
+                stats.add(rate_limited=1)
+                retry_after = behaviour.retry_after()
+                self._send(429, {'error': 'Too Many Requests'},
+                           {'Retry-After': retry_after} if retry_after else None)
+                return
+            status = behaviour.server_error()
+            if status:
+                stats.add(server_errors=1)
+                self._send(status, {'error': 'injected'})
+                return
+
+            try:
+                payload = json.loads(body or b'{}')
+                conditions = parse_conditions(payload)
+                limit = int(payload.get('MaxRowLimit') or MAX_ROWS)
+                rows = backend.search(conditions, min(limit, MAX_ROWS), str(payload.get('Företagsstatus', '')) == '1')
+            except (ValueError, BadRequest) as e:
+                stats.add(bad_requests=1)
+                self._send(400, {'error': str(e)})
+                return
+            stats.add(ok=1, rows=len(rows))
+            self._send(200, rows)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the SCB HamtaForetag API (offline testing)')
+    source = parser.add_argument_group('data')
+    source.add_argument('--register-db', default=DEFAULT_REGISTER_DB,
+                        help=f'Local register database from tools/import_scb_register.py (default: {DEFAULT_REGISTER_DB})')
+    source.add_argument('--bulk', help='SCB bulk file; imported into --register-db unless it is already current')
+    source.add_argument('--fixture', help='JSON list of API result rows (served from memory)')
+
+    server = parser.add_argument_group('server')
+    server.add_argument('--host', default='127.0.0.1', help='Bind address (default: 127.0.0.1)')
+    server.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'Port (default: {DEFAULT_PORT})')
+    server.add_argument('--quiet', action='store_true', help='Do not log every request')
+
+    latency = parser.add_argument_group('latency')
+    latency.add_argument('--latency-ms', type=float, default=0.0, help='Mean (median for lognormal) latency in ms')
+    latency.add_argument('--latency-dist', choices=('fixed', 'uniform', 'exponential', 'lognormal'), default='fixed',
+                         help='Latency distribution (default: fixed)')
+    latency.add_argument('--latency-spread', type=float, default=0.5,
+                         help='Relative spread for uniform, sigma for lognormal (default: 0.5)')
+
+    faults = parser.add_argument_group('fault injection')
+    faults.add_argument('--max-rate', type=float, default=0.0,
+                        help='Server-side token bucket in requests/s; excess requests get 429 (0 = off)')
+    faults.add_argument('--burst', type=float, default=1.0, help='Token bucket capacity for --max-rate (default: 1)')
+    faults.add_argument('--p429', type=float, default=0.0, help='Probability of a random 429')
+    faults.add_argument('--error-rate', type=float, default=0.0, help='Probability of a random 500/502/503')
+    faults.add_argument('--retry-after', type=float, default=1.0, help='Retry-After value in seconds (default: 1)')
+    faults.add_argument('--retry-after-format', choices=('seconds', 'date', 'none'), default='seconds',
+                        help='Send Retry-After as seconds, as an HTTP date, or not at all')
+    faults.add_argument('--seed', type=int, default=None, help='Random seed for latency and fault injection')
+    args = parser.parse_args()
+
+    print("🧪 SCB stand-in (HamtaForetag)")
+    print("=" * 70)
+    backend = open_backend(args)
+    stats = Stats()
+    handler = make_handler(backend, Behaviour(args), stats, args.quiet)
+    httpd = ThreadingHTTPServer((args.host, args.port), handler)
+    httpd.daemon_threads = True
+
+    print(f"📚 {len(backend):,} företag ({'fixture ' + args.fixture if args.fixture else args.register_db})")
+    print(f"⏱️  Latens: {args.latency_dist} {args.latency_ms:g} ms"
+          f"{f' (spridning {args.latency_spread:g})' if args.latency_dist != 'fixed' else ''}")
+    print(f"🚦 Max takt: {f'{args.max_rate:g}/s (burst {args.burst:g})' if args.max_rate else 'obegränsad'}, "
+          f"429: {args.p429:.0%}, 5xx: {args.error_rate:.0%}, Retry-After: {args.retry_after_format}")
+    print(f"🌐 api_url = http://{args.host}:{args.port}/HamtaForetag   (statistik: GET /stats)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        print(f"\n📊 {json.dumps(stats.snapshot(), ensure_ascii=False)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,19 @@
+"""
+web_scraper - delad kod för att skrapa företagshemsidor
+
+- fetcher: parallell hämtning (trådpool, delad session med anslutningspool)
+  med artighet per värd
+- http_cache: villkorlig GET-cache (ETag/Last-Modified + extraherad text per URL)
+- html_store: zstd-komprimerat, innehållsadresserat lager för rå-HTML
+- extract: meta description och huvudtext ur HTML (selectolax, lxml eller bs4)
+"""
+
+from .extract import extract_page, resolve_backend
+from .fetcher import HostThrottle, PoliteFetcher, host_key
+from .html_store import HtmlStore, open_html_store
+from .http_cache import PageCache, open_page_cache
+
+__all__ = [
+    'HostThrottle', 'HtmlStore', 'PageCache', 'PoliteFetcher', 'extract_page', 'host_key',
+    'open_html_store', 'open_page_cache', 'resolve_backend',
+]
@@ -0,0 +1,294 @@
+"""
+Extraktion av meta description och huvudtext ur HTML – utbytbara backends
+
+Tidigare byggde scrape_website() ett fullt BeautifulSoup-träd med den rena
+Python-parsern (html.parser), sökte meta-taggar i hela dokumentet,
+decompose():ade åtta taggtyper och körde get_text() över hela body innan
+texten klipptes till 5000 tecken. Nu:
+
+- Backends: selectolax (lexbor, C), lxml (libxml2, C) och bs4 (html.parser,
+  det gamla beteendet). Standard är den första som finns installerad
+- Meta description hämtas bara ur <head>
+- Huvudtexten (main/article, annars body, annars hela dokumentet som i
+  bs4-vägen) samlas i ett enda pass i dokumentordning; script/style/nav/...
+  hoppas över utan att trädet ändras, och passet avbryts så fort max_chars
+  tecken är fyllda
+
+Alla backends ger samma format: clean_text:ad text, klippt till max_chars +
+'...'. extract_page(content, max_chars, backend) tar bytes eller str.
+
+Kända skillnader mot bs4 (det gamla beteendet):
+- Teckenkodning: utan charset i <meta> avkodar selectolax/lxml med
+  decode_html() (UTF-8, annars cp1252), medan bs4 gissar själv – för
+  odeklarerade cp1252-sidor kan bs4 gissa fel kodning och ge annan text
+- Trasig HTML: lexbor och libxml2 bygger trädet som en webbläsare, html.parser
+  gör det inte, så t.ex. taggar efter </html> kan hamna på olika ställen
+"""
+
+import re
+from functools import lru_cache
+
+MAX_TEXT_CHARS = 5000
+SKIP_TAGS = frozenset(['script', 'style', 'nav', 'footer', 'header', 'aside', 'iframe', 'noscript'])
+META_KEYS = (('name', 'description'), ('property', 'og:description'), ('name', 'twitter:description'))
+BACKEND_ORDER = ('selectolax', 'lxml', 'bs4')   # Snabbast först
+
+_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([a-zA-Z0-9_:.-]+)', re.IGNORECASE)
+_XML_DECLARATION_RE = re.compile(r'^\s*<\?xml[^>]*\?>')
+_BODY_TAG_RE = re.compile(r'<body[\s/>]', re.IGNORECASE)
+
+
+def clean_text(text):
+    """
+    Rensa och normalisera text.
+    """
+    # Ta bort extra whitespace
+    text = re.sub(r'\s+', ' ', text)
+    # Ta bort extra newlines
+    text = re.sub(r'\n+', '\n', text)
+    return text.strip()
+
+
+def decode_html(content):
+    """HTML som str: charset från <meta> om den finns, annars UTF-8 och till sist cp1252."""
+    if isinstance(content, str):
+        return content
+    match = _CHARSET_RE.search(content[:4096])
+    if match:
+        try:
+            return content.decode(match.group(1).decode('ascii'), errors='replace')
+        except LookupError:
+            pass
+    try:
+        return content.decode('utf-8')
+    except UnicodeDecodeError:
+        return content.decode('cp1252', errors='replace')
+
+
+class _TextBudget:
+    """Samlar textbitar (whitespace-normaliserade) tills max_chars tecken är fyllda."""
+
+    def __init__(self, max_chars):
+        self.max_chars = max_chars
+        self.parts = []
+        self.length = -1        # ' '.join: en mellanslag färre än antalet delar
+
+    def add(self, text):
+        """Lägg till en textnod. Returnerar True när budgeten är fylld."""
+        words = text.split()
+        if words:
+            chunk = ' '.join(words)
+            self.parts.append(chunk)
+            self.length += len(chunk) + 1
+        return self.length > self.max_chars
+
+    def text(self):
+        text = ' '.join(self.parts)
+        if len(text) > self.max_chars:
+            text = text[:self.max_chars] + '...'
+        return text
+
+
+def _meta_from_attrs(metas):
+    """Första meta description enligt META_KEYS ur en lista av attribut-dicts."""
+    for key, value in META_KEYS:
+        for attrs in metas:
+            if attrs.get(key) == value:
+                content = attrs.get('content')
+                if content:
+                    return clean_text(content)
+                break
+    return None
+
+
+def _has_body(text):
+    """
+    True om dokumentet har en egen <body>-tagg. selectolax/lxml skapar en body
+    ändå, men bs4 (html.parser) tar då hela dokumentet – inklusive <title>.
+    """
+    return _BODY_TAG_RE.search(text) is not None
+
+
+def _main_content(mains, articles, parents):
+    """
+    Första <main>, annars första <article>, som inte ligger inuti en
+    SKIP_TAGS-tagg (som bs4-vägen efter decompose). None om ingen finns.
+    """
+    for candidates in (mains, articles):
+        for candidate in candidates:
+            if not any(tag in SKIP_TAGS for tag in parents(candidate)):
+                return candidate
+    return None
+
+
+# ============================================================================
+# SELECTOLAX (lexbor)
+# ============================================================================
+
+def _extract_selectolax(content, max_chars):
+    from selectolax.lexbor import LexborHTMLParser
+
+    text = decode_html(content)
+    tree = LexborHTMLParser(text)
+    head = tree.head
+    meta = _meta_from_attrs([node.attributes for node in head.css('meta')]) if head is not None else None
+
+    root = _main_content(tree.css('main'), tree.css('article'), _selectolax_parents)
+    if root is None:
+        root = tree.body if tree.body is not None and _has_body(text) else tree.root
+    budget = _TextBudget(max_chars)
+    if root is not None:
+        _selectolax_text(root, budget)
+    return meta, budget.text()
+
+
+def _selectolax_parents(node):
+    node = node.parent
+    while node is not None:
+        yield node.tag
+        node = node.parent
+
+
+def _selectolax_text(root, budget):
+    """Textnoder under root i dokumentordning, utan SKIP_TAGS-delträd. Avbryts vid full budget."""
+    node = root.child
+    depth = 1                   # Nivåer under root – 0 betyder tillbaka vid root
+    while node is not None:
+        tag = node.tag
+        if tag == '-text':
+            if budget.add(node.text_content or ''):
+                return
+        elif node.child is not None and tag not in SKIP_TAGS and not tag.startswith('-'):
+            node = node.child
+            depth += 1
+            continue
+        # Nästa syskon, annars uppåt tills ett syskon finns (men inte förbi root)
+        while node.next is None:
+            node = node.parent
+            depth -= 1
+            if node is None or depth == 0:
+                return
+        node = node.next
+
+
+# ============================================================================
+# LXML (libxml2)
+# ============================================================================
+
+def _extract_lxml(content, max_chars):
+    import lxml.html
+    from lxml.etree import ParserError
+
+    text = _XML_DECLARATION_RE.sub('', decode_html(content), count=1)
+    try:
+        doc = lxml.html.document_fromstring(text)
+    except ParserError:         # Tomt dokument
+        return None, ''
+    head = doc.find('head')
+    meta = _meta_from_attrs([dict(tag.attrib) for tag in head.iter('meta')]) if head is not None else None
+
+    root = _main_content(doc.iter('main'), doc.iter('article'), _lxml_parents)
+    if root is None and _has_body(text):
+        root = doc.find('body')
+    if root is None:
+        root = doc
+    budget = _TextBudget(max_chars)
+    _lxml_text(root, budget)
+    return meta, budget.text()
+
+
+# <template> är inert innehåll: lexbor lägger det i ett eget fragment och bs4
+# räknar det inte som text, men libxml2 har det som vanliga barn
+_LXML_SKIP_TAGS = SKIP_TAGS | {'template'}
+
+
+def _lxml_parents(element):
+    return (parent.tag for parent in element.iterancestors())
+
+
+def _lxml_text(root, budget):
+    """text/tail i dokumentordning, utan SKIP_TAGS-delträd och kommentarer. Avbryts vid full budget."""
+    if root.text and budget.add(root.text):
+        return
+    stack = [(root, iter(root))]
+    while stack:
+        element, children = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            if stack and element.tail and budget.add(element.tail):
+                return
+            continue
+        if isinstance(child.tag, str) and child.tag not in _LXML_SKIP_TAGS:
+            if child.text and budget.add(child.text):
+                return
+            stack.append((child, iter(child)))
+        elif child.tail and budget.add(child.tail):     # Kommentar/överhoppad tagg: bara texten efter
+            return
+
+
+# ============================================================================
+# BS4 (html.parser, tidigare beteende)
+# ============================================================================
+
+def _extract_bs4(content, max_chars):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, 'html.parser')
+    head = soup.head
+    meta = _meta_from_attrs([tag.attrs for tag in head.find_all('meta')]) if head is not None else None
+
+    # Ta bort script, style, nav, footer
+    for tag in soup(list(SKIP_TAGS)):
+        tag.decompose()
+
+    # Prioritera main-taggar eller article-taggar, annars body
+    root = soup.find('main') or soup.find('article') or soup.find('body') or soup
+    text = clean_text(root.get_text(separator=' ', strip=True))
+    if len(text) > max_chars:
+        text = text[:max_chars] + '...'
+    return meta, text
+
+
+# namn -> (modul, pip-paket, funktion)
+BACKENDS = {
+    'selectolax': ('selectolax', 'selectolax', _extract_selectolax),
+    'lxml': ('lxml', 'lxml', _extract_lxml),
+    'bs4': ('bs4', 'beautifulsoup4', _extract_bs4),
+}
+
+
+@lru_cache(maxsize=None)
+def backend_available(name):
+    """True om backendens paket går att importera."""
+    module = BACKENDS[name][0]
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+    return True
+
+
+def default_backend():
+    """Första installerade backenden i BACKEND_ORDER."""
+    for name in BACKEND_ORDER:
+        if backend_available(name):
+            return name
+    raise SystemExit("Saknar HTML-parser. Installera: pip install selectolax")
+
+
+def resolve_backend(name=None):
+    """Backendens namn: name om den är installerad, annars default_backend() för None/'auto'."""
+    if name in (None, 'auto'):
+        return default_backend()
+    if name not in BACKENDS:
+        raise ValueError(f"Okänd HTML-backend: {name} (välj {', '.join(BACKENDS)})")
+    if not backend_available(name):
+        package = BACKENDS[name][1]
+        raise SystemExit(f"Saknar '{package}'. Installera: pip install {package}")
+    return name
+
+
+def extract_page(content, max_chars=MAX_TEXT_CHARS, backend=None):
+    """(meta description eller None, huvudtext) ur HTML (bytes eller str)."""
+    return BACKENDS[resolve_backend(backend)][2](content, max_chars)
@@ -0,0 +1,107 @@
+"""
+Parallell hämtning av hemsidor med artighet per värd
+
+Tidigare hämtade scrape_company_websites.py en sida i taget och sov --delay
+sekunder efter varje företag, trots att nästan varje företag har en egen
+värd. Nu:
+
+- En gemensam requests.Session med en anslutningspool stor nog för alla
+  trådar (keep-alive per värd, HEADERS sätts en gång)
+- Global gräns: högst `concurrency` hämtningar samtidigt (trådpool)
+- Artighet per värd: två anrop till samma värd (www. räknas bort) startar
+  minst `host_delay` sekunder isär; olika värdar väntar inte på varandra
+- run() lämnar resultaten i den ordning de blir klara, så anroparen kan
+  skriva CSV löpande
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_CONCURRENCY = 16    # Samtidiga hämtningar totalt
+DEFAULT_HOST_DELAY = 1.0    # Sekunder mellan två anrop till samma värd
+HTTP_TIMEOUT = 15
+
+
+def host_key(url):
+    """Värden för artighetsgränsen: gemener, utan port och utan www."""
+    host = (urlparse(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+class HostThrottle:
+    """Trådsäker väntetid per värd. wait(url) blockerar tills värden får ett nytt anrop."""
+
+    def __init__(self, delay=DEFAULT_HOST_DELAY):
+        self.delay = delay
+        self.next_slot = {}         # värd -> tidigaste start (monotonic)
+        self.waited_sec = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        host = host_key(url)
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self.next_slot.get(host, 0.0))
+            self.next_slot[host] = start + self.delay
+            self.waited_sec += start - now
+        if start > now:
+            time.sleep(start - now)
+
+
+class PoliteFetcher:
+    """
+    Delad session + trådpool. get() är trådsäker och respekterar
+    värdgränsen; run() kör en funktion över alla poster parallellt.
+    """
+
+    def __init__(self, headers=None, concurrency=DEFAULT_CONCURRENCY,
+                 host_delay=DEFAULT_HOST_DELAY, timeout=HTTP_TIMEOUT):
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.throttle = HostThrottle(host_delay)
+        self.session = requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=self.concurrency * 2, pool_maxsize=self.concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.stats = {'requests': 0}
+        self._stats_lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        """GET via den delade sessionen, efter värdens väntetid."""
+        self.throttle.wait(url)
+        with self._stats_lock:
+            self.stats['requests'] += 1
+        kwargs.setdefault('timeout', self.timeout)
+        kwargs.setdefault('allow_redirects', True)
+        return self.session.get(url, **kwargs)
+
+    def run(self, items, work):
+        """
+        Kör work(item) för alla items med högst `concurrency` samtidigt.
+        Ger (item, resultat) i den ordning de blir klara. Undantag från work
+        skickas vidare till anroparen. Vid avbrott (Ctrl-C) stryks de
+        hämtningar som inte hunnit starta.
+        """
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            futures = {executor.submit(work, item): item for item in items}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,148 @@
+"""
+Komprimerat, innehållsadresserat lager för hämtad HTML (SQLite + zstd)
+
+scrape_website() behöll bara de första 5000 tecknen av huvudtexten och meta
+description – rå-HTML:en kastades. Varje förbättring av extraktionen (eller
+en annan trunkering för generate_descriptions.py) krävde en ny skrapning av
+webben. Nu sparas varje hämtad sida:
+
+- blobs: sha256(innehåll) -> zstd-komprimerade bytes. Samma innehåll (samma
+  sida under två URL:er, eller oförändrad sida nästa körning) lagras en gång
+- pages: URL -> hash, hämtningstid, HTTP-status och Content-Type (senaste
+  hämtningen per URL)
+
+scrape_company_websites.py --reextract kör extraktionen igen över lagret,
+parallellt på alla kärnor och utan nätverk.
+
+Kräver zstandard (pip install zstandard). Säker att använda från flera
+trådar (en anslutning bakom ett lås, WAL); read_only=True för läsning från
+worker-processer.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_STORE_PATH = Path(__file__).resolve().parents[1] / 'databases' / 'scrape_html.db'
+ZSTD_LEVEL = 10     # HTML komprimeras ca 5-10x; högre nivåer ger lite mer för mycket CPU
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise SystemExit("Saknar 'zstandard'. Installera: pip install zstandard") from e
+    return zstandard
+
+
+def content_hash(body):
+    """Innehållsadress: sha256 av de okomprimerade bytes."""
+    return hashlib.sha256(body).hexdigest()
+
+
+class HtmlStore:
+    """URL -> hash -> komprimerad HTML."""
+
+    def __init__(self, path=DEFAULT_STORE_PATH, level=ZSTD_LEVEL, read_only=False):
+        self.path = str(path)
+        self.level = level
+        self.stats = {'stored': 0, 'deduplicated': 0, 'bytes_in': 0, 'bytes_stored': 0}
+        self._zstd = _zstandard()
+        self._lock = threading.Lock()
+
+        if read_only:
+            self.conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False)
+            return
+
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                stored_size INTEGER NOT NULL,
+                data BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                hash TEXT NOT NULL REFERENCES blobs(hash),
+                fetched_at REAL NOT NULL,
+                status_code INTEGER,
+                content_type TEXT
+            );
+        """)
+        self.conn.commit()
+
+    def put(self, url, body, status_code=None, content_type=None):
+        """Spara body (bytes) för URL:en. Returnerar innehållets hash."""
+        digest = content_hash(body)
+        with self._lock:
+            known = self.conn.execute('SELECT 1 FROM blobs WHERE hash = ?', (digest,)).fetchone()
+        # Komprimera utanför låset så trådarna inte väntar på varandra
+        data = None if known else self._zstd.ZstdCompressor(level=self.level).compress(body)
+
+        with self._lock:
+            # rowcount 0: en annan tråd hann spara samma innehåll efter kontrollen ovan
+            inserted = data is not None and self.conn.execute(
+                'INSERT OR IGNORE INTO blobs (hash, size, stored_size, data) VALUES (?, ?, ?, ?)',
+                (digest, len(body), len(data), data)
+            ).rowcount > 0
+            if inserted:
+                self.stats['stored'] += 1
+                self.stats['bytes_in'] += len(body)
+                self.stats['bytes_stored'] += len(data)
+            else:
+                self.stats['deduplicated'] += 1
+            self.conn.execute(
+                'INSERT OR REPLACE INTO pages (url, hash, fetched_at, status_code, content_type) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (url, digest, time.time(), status_code, content_type)
+            )
+            self.conn.commit()
+        return digest
+
+    def hash_for(self, url):
+        """Hash för URL:ens senaste hämtning, eller None."""
+        with self._lock:
+            row = self.conn.execute('SELECT hash FROM pages WHERE url = ?', (url,)).fetchone()
+        return row[0] if row else None
+
+    def get_blob(self, digest):
+        """Okomprimerade bytes för en hash, eller None."""
+        with self._lock:
+            row = self.conn.execute('SELECT data FROM blobs WHERE hash = ?', (digest,)).fetchone()
+        if row is None:
+            return None
+        return self._zstd.ZstdDecompressor().decompress(row[0])
+
+    def get(self, url):
+        """Senast hämtade HTML (bytes) för URL:en, eller None."""
+        digest = self.hash_for(url)
+        return self.get_blob(digest) if digest else None
+
+    def index(self):
+        """Hela indexet: {url: (hash, fetched_at, status_code)}."""
+        with self._lock:
+            rows = self.conn.execute('SELECT url, hash, fetched_at, status_code FROM pages').fetchall()
+        return {url: (digest, fetched_at, status_code) for url, digest, fetched_at, status_code in rows}
+
+    def summary(self):
+        """En rad med körningens lagringsstatistik."""
+        s = self.stats
+        ratio = s['bytes_in'] / s['bytes_stored'] if s['bytes_stored'] else 0
+        return (f"HTML-lager: {s['stored']} nya sidor ({s['bytes_in'] / 1e6:.1f} MB -> "
+                f"{s['bytes_stored'] / 1e6:.1f} MB, {ratio:.1f}x), {s['deduplicated']} redan lagrade")
+
+    def close(self):
+        self.conn.close()
+
+
+def open_html_store(path=None, enabled=True):
+    """Öppna lagret (path=None -> DEFAULT_STORE_PATH). enabled=False ger None."""
+    if not enabled:
+        return None
+    return HtmlStore(path or DEFAULT_STORE_PATH)
@@ -0,0 +1,134 @@
+"""
+Villkorlig GET-cache för skrapade hemsidor (SQLite)
+
+De flesta företagssidor ändras inte mellan veckokörningarna, men skrapan
+laddade ändå ned varje sida i sin helhet. PageCache sparar per URL serverns
+validerare (ETag / Last-Modified) tillsammans med den extraherade texten:
+
+- Nästa körning skickar If-None-Match / If-Modified-Since
+- 304 Not Modified -> den sparade texten och meta description återanvänds
+  utan att sidan laddas ned eller tolkas
+- Bara lyckade sidor (status success/success_http) med minst en validerare
+  sparas – utan validerare finns inget att fråga servern om
+- Varje post minns vilken HTML-backend (web_scraper.extract) som tog fram
+  texten; med en annan backend räknas posten som saknad och sidan hämtas och
+  tolkas om (--reextract gör samma sak utan nätverk)
+- PageCache.stats räknar körningens träffar; summary() ger träffandelen
+
+Säker att använda från flera trådar (en anslutning bakom ett lås, WAL).
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parents[1] / 'databases' / 'scrape_cache.db'
+
+
+class PageCache:
+    """URL -> validerare + extraherad text."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, backend=None):
+        self.path = str(path)
+        self.backend = backend      # None = återanvänd text oavsett backend
+        self.stats = {'hits': 0, 'changed': 0, 'misses': 0, 'stores': 0}
+        self._lock = threading.Lock()
+
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                status TEXT NOT NULL,
+                status_code INTEGER,
+                scraped_text TEXT NOT NULL,
+                meta_description TEXT,
+                fetched_at REAL NOT NULL,
+                validated_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                backend TEXT
+            )
+        """)
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(pages)')}
+        if 'backend' not in columns:
+            # Äldre cache: posternas backend är okänd (NULL) och gäller inte för en vald backend
+            self.conn.execute('ALTER TABLE pages ADD COLUMN backend TEXT')
+        self.conn.commit()
+
+    def lookup(self, url):
+        """Sparad post för URL:en (dict), eller None om den saknas eller kommer från en annan backend."""
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT etag, last_modified, status, status_code, scraped_text, meta_description, backend '
+                'FROM pages WHERE url = ?', (url,)
+            ).fetchone()
+        if row is None or (self.backend is not None and row[-1] != self.backend):
+            return None
+        keys = ('etag', 'last_modified', 'status', 'status_code', 'scraped_text', 'meta_description', 'backend')
+        return dict(zip(keys, row))
+
+    @staticmethod
+    def conditional_headers(entry):
+        """If-None-Match / If-Modified-Since för en post från lookup() (tom dict för None)."""
+        headers = {}
+        if entry:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def hit(self, url):
+        """Servern svarade 304: posten gäller fortfarande."""
+        with self._lock:
+            self.conn.execute(
+                'UPDATE pages SET validated_at = ?, hits = hits + 1 WHERE url = ?', (time.time(), url)
+            )
+            self.conn.commit()
+            self.stats['hits'] += 1
+
+    def miss(self, entry):
+        """Sidan hämtades i sin helhet (entry = posten som skickades som villkor, eller None)."""
+        with self._lock:
+            self.stats['changed' if entry else 'misses'] += 1
+
+    def store(self, url, response, result):
+        """Spara validerare och extraherad text från ett lyckat svar. Returnerar True om sparad."""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not (etag or last_modified) or result['status'] not in ('success', 'success_http'):
+            return False
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO pages (url, etag, last_modified, status, status_code, scraped_text, '
+                'meta_description, fetched_at, validated_at, hits, backend) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?)',
+                (url, etag, last_modified, result['status'], result['status_code'], result['scraped_text'],
+                 result['meta_description'], now, now, self.backend)
+            )
+            self.conn.commit()
+            self.stats['stores'] += 1
+        return True
+
+    def summary(self):
+        """En rad med körningens cache-statistik."""
+        s = self.stats
+        lookups = s['hits'] + s['changed'] + s['misses']
+        rate = 100 * s['hits'] / lookups if lookups else 0
+        return (f"HTTP-cache: {s['hits']} oförändrade (304), {s['changed']} ändrade, "
+                f"{s['misses']} utan sparad post, {s['stores']} sparade – {rate:.0f}% träffandel")
+
+    def close(self):
+        self.conn.close()
+
+
+def open_page_cache(path=None, enabled=True, backend=None):
+    """Öppna cachen (path=None -> DEFAULT_CACHE_PATH) för en HTML-backend. enabled=False ger None."""
+    if not enabled:
+        return None
+    return PageCache(path or DEFAULT_CACHE_PATH, backend)